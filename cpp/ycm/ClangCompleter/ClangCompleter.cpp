@@ -18,6 +18,7 @@
 #include "ClangCompleter.h"
 #include "Candidate.h"
 #include "CandidateRepository.h"
+#include "ClangHelpers.h"
 #include "ClangUtils.h"
 #include "CompletionData.h"
 #include "Result.h"
@@ -80,8 +81,10 @@ std::vector< Diagnostic > ClangCompleter::UpdateTranslationUnit(
                                          flags,
                                          translation_unit_created );
 
+  std::vector< Diagnostic > diagnostics;
+
   try {
-    return unit->Reparse( unsaved_files );
+    diagnostics = unit->Reparse( unsaved_files );
   } catch ( const ClangParseError & ) {
     // If unit->Reparse fails, then the underlying TranslationUnit object is not
     // valid anymore and needs to be destroyed and removed from the filename ->
@@ -89,6 +92,10 @@ std::vector< Diagnostic > ClangCompleter::UpdateTranslationUnit(
     translation_unit_store_.Remove( translation_unit );
     throw;
   }
+
+  // The TU may use more memory after being reparsed.
+  translation_unit_store_.EnforceLimits( translation_unit );
+  return diagnostics;
 }
 
 
@@ -276,9 +283,77 @@ DocumentationData ClangCompleter::GetDocsForLocationInFile(
   return unit->GetDocsForLocation( location, unsaved_files, false );
 }
 
+std::vector< CompletionData > ClangCompleter::FilterAndSortCandidates(
+  const std::vector< CompletionData > &candidates,
+  std::string query,
+  size_t max_candidates ) {
+  std::vector< std::string > candidate_strings;
+  candidate_strings.reserve( candidates.size() );
+
+  for ( const CompletionData &candidate : candidates ) {
+    candidate_strings.push_back( candidate.TextToInsertInBuffer() );
+  }
+
+  std::vector< const Candidate * > repository_candidates =
+    CandidateRepository::Instance().GetCandidatesForStrings(
+      std::move( candidate_strings ) );
+
+  Word query_object( std::move( query ) );
+  std::vector< ResultAnd< size_t > > result_and_indexes;
+
+  for ( size_t i = 0; i < repository_candidates.size(); ++i ) {
+    const Candidate *candidate = repository_candidates[ i ];
+
+    if ( candidate->IsEmpty() || !candidate->ContainsBytes( query_object ) ) {
+      continue;
+    }
+
+    Result result = candidate->QueryMatchResult( query_object );
+
+    if ( result.IsSubsequence() ) {
+      result_and_indexes.emplace_back( result, i );
+    }
+  }
+
+  PartialSort( result_and_indexes, max_candidates );
+
+  std::vector< CompletionData > filtered_candidates;
+  filtered_candidates.reserve( result_and_indexes.size() );
+
+  for ( const ResultAnd< size_t > &result_and_index : result_and_indexes ) {
+    filtered_candidates.push_back(
+      candidates[ result_and_index.extra_object_ ] );
+  }
+
+  return filtered_candidates;
+}
+
+
 void ClangCompleter::DeleteCachesForFile( const std::string &filename ) {
   translation_unit_store_.Remove( filename );
 }
 
 
+std::vector< std::string > ClangCompleter::BuildPrecompiledHeader(
+  const std::string &header_filename,
+  const std::string &pch_filename,
+  const std::vector< std::string > &flags ) {
+  return YouCompleteMe::BuildPrecompiledHeader( clang_index_,
+                                                header_filename,
+                                                pch_filename,
+                                                flags );
+}
+
+
+void ClangCompleter::SetTranslationUnitLimits( size_t max_translation_units,
+                                               size_t max_memory_usage ) {
+  translation_unit_store_.SetLimits( max_translation_units, max_memory_usage );
+}
+
+
+TranslationUnitStoreStatistics ClangCompleter::TranslationUnitStatistics() {
+  return translation_unit_store_.Statistics();
+}
+
+
 } // namespace YouCompleteMe
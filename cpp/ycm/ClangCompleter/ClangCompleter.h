@@ -122,8 +122,29 @@ public:
     const std::vector< std::string > &flags,
     bool reparse = true );
 
+  // Returns the |max_candidates| candidates whose text to insert best matches
+  // |query|, sorted like the results of FilterAndSortCandidates. Doing this on
+  // the raw CompletionData avoids converting all candidates to Python objects.
+  YCM_EXPORT std::vector< CompletionData > FilterAndSortCandidates(
+    const std::vector< CompletionData > &candidates,
+    std::string query,
+    size_t max_candidates );
+
   void DeleteCachesForFile( const std::string &filename );
 
+  // Saves |header_filename| parsed with |flags| as a precompiled header to
+  // |pch_filename| and returns the files it includes. See
+  // BuildPrecompiledHeader in ClangHelpers.h.
+  YCM_EXPORT std::vector< std::string > BuildPrecompiledHeader(
+    const std::string &header_filename,
+    const std::string &pch_filename,
+    const std::vector< std::string > &flags );
+
+  YCM_EXPORT void SetTranslationUnitLimits( size_t max_translation_units,
+                                            size_t max_memory_usage );
+
+  YCM_EXPORT TranslationUnitStoreStatistics TranslationUnitStatistics();
+
 private:
 
   /////////////////////////////
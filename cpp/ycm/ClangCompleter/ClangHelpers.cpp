@@ -23,6 +23,7 @@
 #include "UnsavedFile.h"
 #include "Utils.h"
 
+#include <functional>
 #include <unordered_map>
 #include <utility>
 
@@ -31,6 +32,15 @@ using std::unordered_map;
 namespace YouCompleteMe {
 namespace {
 
+std::size_t HashCombine( std::size_t seed, const std::string &value ) {
+  // The algorithm has been taken straight from a TR1:
+  // "Library Extension Technical Report - Issue List" section 6.18.
+  // This is also the way Boost implements it.
+  return seed ^ ( std::hash< std::string >()( value ) +
+                  ( seed << 6 ) + ( seed >> 2 ) );
+}
+
+
 DiagnosticKind DiagnosticSeverityToType( CXDiagnosticSeverity severity ) {
   switch ( severity ) {
     case CXDiagnostic_Ignored:
@@ -188,15 +198,101 @@ Range GetLocationExtent( CXSourceLocation source_location,
 }
 
 
+struct Inclusions {
+  std::vector< std::string > filenames;
+  std::vector< CXFile > direct_files;
+};
+
+
+void CollectInclusion( CXFile included_file,
+                       CXSourceLocation* /*inclusion_stack*/,
+                       unsigned include_len,
+                       CXClientData client_data ) {
+  // The main file is visited with an empty inclusion stack.
+  if ( include_len == 0 ) {
+    return;
+  }
+
+  Inclusions *inclusions = static_cast< Inclusions * >( client_data );
+  inclusions->filenames.push_back( CXFileToFilepath( included_file ) );
+  if ( include_len == 1 ) {
+    inclusions->direct_files.push_back( included_file );
+  }
+}
+
+
 } // unnamed namespace
 
+void EnsureCompilerNamePresent( std::vector< const char * > &flags ) {
+  bool no_compiler_name_set = !flags.empty() && flags.front()[ 0 ] == '-';
+
+  if ( flags.empty() || no_compiler_name_set ) {
+    flags.insert( flags.begin(), "clang" );
+  }
+}
+
+
+std::vector< std::string > BuildPrecompiledHeader(
+  CXIndex clang_index,
+  const std::string &header_filename,
+  const std::string &pch_filename,
+  const std::vector< std::string > &flags ) {
+  std::vector< const char * > pointer_flags;
+  pointer_flags.reserve( flags.size() );
+
+  for ( const std::string & flag : flags ) {
+    pointer_flags.push_back( flag.c_str() );
+  }
+
+  EnsureCompilerNamePresent( pointer_flags );
+
+  CXTranslationUnit unit = nullptr;
+  CXErrorCode failure = clang_parseTranslationUnit2FullArgv(
+                          clang_index,
+                          header_filename.c_str(),
+                          &pointer_flags[ 0 ],
+                          pointer_flags.size(),
+                          nullptr,
+                          0,
+                          CXTranslationUnit_Incomplete |
+                          CXTranslationUnit_ForSerialization,
+                          &unit );
+  if ( failure != CXError_Success ) {
+    throw ClangParseError( failure );
+  }
+
+  std::shared_ptr< CXTranslationUnitImpl > unit_wrap(
+    unit, clang_disposeTranslationUnit );
+
+  Inclusions inclusions;
+  clang_getInclusions( unit, CollectInclusion, &inclusions );
+
+  for ( CXFile file : inclusions.direct_files ) {
+    if ( !clang_isFileMultipleIncludeGuarded( unit, file ) ) {
+      std::string message = CXFileToFilepath( file ) +
+                            " is not guarded against multiple inclusion.";
+      throw ClangParseError( message.c_str() );
+    }
+  }
+
+  if ( clang_saveTranslationUnit( unit,
+                                  pch_filename.c_str(),
+                                  clang_defaultSaveOptions( unit ) ) !=
+       CXSaveError_None ) {
+    throw ClangParseError( "Could not save the precompiled header." );
+  }
+
+  return inclusions.filenames;
+}
+
+
 std::vector< CXUnsavedFile > ToCXUnsavedFiles(
   const std::vector< UnsavedFile > &unsaved_files ) {
   std::vector< CXUnsavedFile > clang_unsaved_files( unsaved_files.size() );
 
   for ( size_t i = 0; i < unsaved_files.size(); ++i ) {
     clang_unsaved_files[ i ].Filename = unsaved_files[ i ].filename_.c_str();
-    clang_unsaved_files[ i ].Contents = unsaved_files[ i ].contents_.c_str();
+    clang_unsaved_files[ i ].Contents = unsaved_files[ i ].contents_->c_str();
     clang_unsaved_files[ i ].Length   = unsaved_files[ i ].length_;
   }
 
@@ -204,6 +300,26 @@ std::vector< CXUnsavedFile > ToCXUnsavedFiles(
 }
 
 
+std::size_t HashForFlags( const std::vector< std::string > &flags ) {
+  size_t seed = 0;
+  for ( const auto &flag : flags )  {
+    seed = HashCombine( seed, flag );
+  }
+  return seed;
+}
+
+
+std::size_t HashForUnsavedFiles(
+  const std::vector< UnsavedFile > &unsaved_files,
+  std::size_t seed ) {
+  for ( const auto &unsaved_file : unsaved_files ) {
+    seed = HashCombine( seed, unsaved_file.filename_ );
+    seed = HashCombine( seed, *unsaved_file.contents_ );
+  }
+  return seed;
+}
+
+
 std::vector< CompletionData > ToCompletionDataVector(
   CXCodeCompleteResults *results ) {
   std::vector< CompletionData > completions;
@@ -24,6 +24,7 @@
 
 #include <clang-c/Index.h>
 #include <memory>
+#include <string>
 #include <vector>
 
 namespace YouCompleteMe {
@@ -39,6 +40,28 @@ std::vector< CompletionData > ToCompletionDataVector(
 std::vector< CXUnsavedFile > ToCXUnsavedFiles(
   const std::vector< UnsavedFile > &unsaved_files );
 
+// Inserts a compiler name in front of |flags| if they don't start with one, as
+// libclang expects.
+void EnsureCompilerNamePresent( std::vector< const char * > &flags );
+
+// Parses |header_filename| with |flags| and saves it as a precompiled header
+// to |pch_filename|. Returns the files included by the header. Throws
+// ClangParseError if the header can't be parsed or saved, or if a file it
+// directly includes isn't guarded against multiple inclusion, since sources
+// using the precompiled header would then include that file twice.
+std::vector< std::string > BuildPrecompiledHeader(
+  CXIndex clang_index,
+  const std::string &header_filename,
+  const std::string &pch_filename,
+  const std::vector< std::string > &flags );
+
+std::size_t HashForFlags( const std::vector< std::string > &flags );
+
+// Hashes the names and contents of |unsaved_files|, combined with |seed|.
+std::size_t HashForUnsavedFiles(
+  const std::vector< UnsavedFile > &unsaved_files,
+  std::size_t seed = 0 );
+
 Diagnostic BuildDiagnostic( const DiagnosticWrap &diagnostic_wrap,
                             CXTranslationUnit translation_unit );
 
@@ -56,21 +56,16 @@ unsigned CompletionOptions() {
          CXCodeComplete_IncludeCompletionsWithFixIts;
 }
 
-void EnsureCompilerNamePresent( std::vector< const char * > &flags ) {
-  bool no_compiler_name_set = !flags.empty() && flags.front()[ 0 ] == '-';
-
-  if ( flags.empty() || no_compiler_name_set ) {
-    flags.insert( flags.begin(), "clang" );
-  }
-}
-
 }  // unnamed namespace
 
 using CodeCompleteResultsWrap =
   shared_ptr< remove_pointer< CXCodeCompleteResults >::type >;
 
 TranslationUnit::TranslationUnit()
-  : clang_translation_unit_( nullptr ) {
+  : clang_translation_unit_( nullptr ),
+    flags_hash_( 0 ),
+    last_parse_hash_( 0 ),
+    memory_usage_( 0 ) {
 }
 
 TranslationUnit::TranslationUnit(
@@ -78,7 +73,10 @@ TranslationUnit::TranslationUnit(
   const std::vector< UnsavedFile > &unsaved_files,
   const std::vector< std::string > &flags,
   CXIndex clang_index )
-  : clang_translation_unit_( nullptr ) {
+  : clang_translation_unit_( nullptr ),
+    flags_hash_( HashForFlags( flags ) ),
+    last_parse_hash_( HashForUnsavedFiles( unsaved_files, flags_hash_ ) ),
+    memory_usage_( 0 ) {
   std::vector< const char * > pointer_flags;
   pointer_flags.reserve( flags.size() );
 
@@ -106,6 +104,8 @@ TranslationUnit::TranslationUnit(
   if ( failure != CXError_Success ) {
     throw ClangParseError( failure );
   }
+
+  UpdateMemoryUsage();
 }
 
 
@@ -119,6 +119,7 @@ void TranslationUnit::Destroy() {
   if ( clang_translation_unit_ ) {
     clang_disposeTranslationUnit( clang_translation_unit_ );
     clang_translation_unit_ = nullptr;
+    memory_usage_ = 0;
   }
 }
 
@@ -135,12 +136,18 @@ bool TranslationUnit::IsCurrentlyUpdating() const {
 }
 
 
+size_t TranslationUnit::MemoryUsage() const {
+  return memory_usage_;
+}
+
+
 std::vector< Diagnostic > TranslationUnit::Reparse(
   const std::vector< UnsavedFile > &unsaved_files ) {
   std::vector< CXUnsavedFile > cxunsaved_files =
     ToCXUnsavedFiles( unsaved_files );
 
-  Reparse( cxunsaved_files );
+  Reparse( cxunsaved_files,
+           HashForUnsavedFiles( unsaved_files, flags_hash_ ) );
 
   unique_lock< mutex > lock( diagnostics_mutex_ );
   return latest_diagnostics_;
@@ -211,7 +218,7 @@ Location TranslationUnit::GetDeclarationLocation(
   const std::vector< UnsavedFile > &unsaved_files,
   bool reparse ) {
   if ( reparse ) {
-    Reparse( unsaved_files );
+    ReparseIfChanged( unsaved_files );
   }
 
   unique_lock< mutex > lock( clang_access_mutex_ );
@@ -246,7 +253,7 @@ Location TranslationUnit::GetDefinitionLocation(
   const std::vector< UnsavedFile > &unsaved_files,
   bool reparse ) {
   if ( reparse ) {
-    Reparse( unsaved_files );
+    ReparseIfChanged( unsaved_files );
   }
 
   unique_lock< mutex > lock( clang_access_mutex_ );
@@ -271,7 +278,7 @@ Location TranslationUnit::GetDefinitionOrDeclarationLocation(
   const std::vector< UnsavedFile > &unsaved_files,
   bool reparse ) {
   if ( reparse ) {
-    Reparse( unsaved_files );
+    ReparseIfChanged( unsaved_files );
   }
 
   unique_lock< mutex > lock( clang_access_mutex_ );
@@ -313,7 +320,7 @@ std::string TranslationUnit::GetTypeAtLocation(
   bool reparse ) {
 
   if ( reparse ) {
-    Reparse( unsaved_files );
+    ReparseIfChanged( unsaved_files );
   }
 
   unique_lock< mutex > lock( clang_access_mutex_ );
@@ -393,7 +400,7 @@ std::string TranslationUnit::GetEnclosingFunctionAtLocation(
   bool reparse ) {
 
   if ( reparse ) {
-    Reparse( unsaved_files );
+    ReparseIfChanged( unsaved_files );
   }
 
   unique_lock< mutex > lock( clang_access_mutex_ );
@@ -420,16 +427,34 @@ std::string TranslationUnit::GetEnclosingFunctionAtLocation(
   return parent_str;
 }
 
+void TranslationUnit::ReparseIfChanged(
+  const std::vector< UnsavedFile > &unsaved_files ) {
+  size_t parse_hash = HashForUnsavedFiles( unsaved_files, flags_hash_ );
+  {
+    unique_lock< mutex > lock( clang_access_mutex_ );
+
+    if ( parse_hash == last_parse_hash_ ) {
+      return;
+    }
+  }
+
+  std::vector< CXUnsavedFile > cxunsaved_files =
+    ToCXUnsavedFiles( unsaved_files );
+
+  Reparse( cxunsaved_files, parse_hash );
+}
+
+
 // Argument taken as non-const ref because we need to be able to pass a
 // non-const pointer to clang. This function (and clang too) will not modify the
 // param though.
-void TranslationUnit::Reparse(
-  std::vector< CXUnsavedFile > &unsaved_files ) {
+void TranslationUnit::Reparse( std::vector< CXUnsavedFile > &unsaved_files,
+                               size_t parse_hash ) {
   unsigned options = ( clang_translation_unit_
                        ? ReparseOptions( clang_translation_unit_ )
                        : static_cast<unsigned>( CXReparse_None ) );
 
-  Reparse( unsaved_files, options );
+  Reparse( unsaved_files, options, parse_hash );
 }
 
 
@@ -437,7 +462,8 @@ void TranslationUnit::Reparse(
 // non-const pointer to clang. This function (and clang too) will not modify the
 // param though.
 void TranslationUnit::Reparse( std::vector< CXUnsavedFile > &unsaved_files,
-                               size_t parse_options ) {
+                               unsigned parse_options,
+                               size_t parse_hash ) {
   CXErrorCode failure;
   {
     unique_lock< mutex > lock( clang_access_mutex_ );
@@ -456,6 +482,11 @@ void TranslationUnit::Reparse( std::vector< CXUnsavedFile > &unsaved_files,
                                     unsaved_files.size(),
                                     unsaved,
                                     parse_options ) );
+
+    if ( failure == CXError_Success ) {
+      last_parse_hash_ = parse_hash;
+      UpdateMemoryUsage();
+    }
   }
 
   if ( failure != CXError_Success ) {
@@ -490,6 +521,19 @@ void TranslationUnit::UpdateLatestDiagnostics() {
     });
 }
 
+void TranslationUnit::UpdateMemoryUsage() {
+  CXTUResourceUsage usage =
+    clang_getCXTUResourceUsage( clang_translation_unit_ );
+
+  size_t memory_usage = 0;
+  for ( unsigned i = 0; i < usage.numEntries; ++i ) {
+    memory_usage += usage.entries[ i ].amount;
+  }
+  clang_disposeCXTUResourceUsage( usage );
+
+  memory_usage_ = memory_usage;
+}
+
 namespace {
 
 /// Sort a FixIt container by its location's distance from a given column
@@ -520,7 +564,7 @@ std::vector< FixIt > TranslationUnit::GetFixItsForLocationInFile(
   bool reparse ) {
 
   if ( reparse ) {
-    Reparse( unsaved_files );
+    ReparseIfChanged( unsaved_files );
   }
 
   std::vector< FixIt > fixits;
@@ -563,7 +607,7 @@ DocumentationData TranslationUnit::GetDocsForLocation(
   bool reparse ) {
 
   if ( reparse ) {
-    Reparse( unsaved_files );
+    ReparseIfChanged( unsaved_files );
   }
 
   unique_lock< mutex > lock( clang_access_mutex_ );
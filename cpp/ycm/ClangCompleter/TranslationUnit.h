@@ -25,6 +25,7 @@
 
 #include <clang-c/Index.h>
 
+#include <atomic>
 #include <mutex>
 #include <string>
 #include <vector>
@@ -55,6 +56,10 @@ public:
 
   YCM_EXPORT bool IsCurrentlyUpdating() const;
 
+  // Estimated memory used by libclang for this TU, in bytes. Updated after
+  // each parse and reparse.
+  YCM_EXPORT size_t MemoryUsage() const;
+
   YCM_EXPORT std::vector< Diagnostic > Reparse(
     const std::vector< UnsavedFile > &unsaved_files );
 
@@ -114,13 +119,22 @@ public:
   bool LocationIsInSystemHeader( const Location &location );
 
 private:
-  void Reparse( std::vector< CXUnsavedFile > &unsaved_files );
+  // Only reparses the TU if |unsaved_files| changed since the last parse.
+  // Changes to files on disk are not detected.
+  void ReparseIfChanged( const std::vector< UnsavedFile > &unsaved_files );
+
+  void Reparse( std::vector< CXUnsavedFile > &unsaved_files,
+                size_t parse_hash );
 
   void Reparse( std::vector< CXUnsavedFile > &unsaved_files,
-                size_t parse_options );
+                unsigned parse_options,
+                size_t parse_hash );
 
   void UpdateLatestDiagnostics();
 
+  // Must be called under the clang_access_mutex_ lock.
+  void UpdateMemoryUsage();
+
   // These four methods must be called under the clang_access_mutex_ lock.
   CXSourceLocation GetSourceLocation( const std::string& filename,
                                       int line,
@@ -141,6 +155,14 @@ private:
 
   mutable std::mutex clang_access_mutex_;
   CXTranslationUnit clang_translation_unit_;
+
+  // Hash of the flags the TU was created with, and of these flags combined
+  // with the unsaved files of the last successful (re)parse. The latter is
+  // protected by clang_access_mutex_.
+  size_t flags_hash_;
+  size_t last_parse_hash_;
+
+  std::atomic< size_t > memory_usage_;
 };
 
 } // namespace YouCompleteMe
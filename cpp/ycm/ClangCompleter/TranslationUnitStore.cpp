@@ -16,10 +16,11 @@
 // along with ycmd.  If not, see <http://www.gnu.org/licenses/>.
 
 #include "TranslationUnitStore.h"
+#include "ClangHelpers.h"
 #include "TranslationUnit.h"
 #include "Utils.h"
 
-#include <functional>
+#include <limits>
 
 using std::lock_guard;
 using std::shared_ptr;
@@ -28,24 +29,13 @@ using std::mutex;
 
 namespace YouCompleteMe {
 
-namespace {
-
-std::size_t HashForFlags( const std::vector< std::string > &flags ) {
-  // The algorithm has been taken straight from a TR1:
-  // "Library Extension Technical Report - Issue List" section 6.18.
-  // This is also the way Boost implements it.
-  size_t seed = 0;
-  for ( const auto &flag : flags )  {
-    seed ^= std::hash< std::string >()( flag ) + ( seed << 6 ) + ( seed >> 2 );
-  }
-  return seed;
-}
-
-}  // unnamed namespace
-
-
 TranslationUnitStore::TranslationUnitStore( CXIndex clang_index )
-  : clang_index_( clang_index ) {
+  : clang_index_( clang_index ),
+    use_counter_( 0 ),
+    max_translation_units_( 0 ),
+    max_memory_usage_( 0 ),
+    evictions_( 0 ),
+    recreations_( 0 ) {
 }
 
 
@@ -72,12 +62,17 @@ shared_ptr< TranslationUnit > TranslationUnitStore::GetOrCreate(
   {
     lock_guard< mutex > lock( filename_to_translation_unit_and_flags_mutex_ );
     shared_ptr< TranslationUnit > current_unit = GetNoLock( filename );
+    MarkUsedNoLock( filename );
 
     if ( current_unit &&
          HashForFlags( flags ) == filename_to_flags_hash_[ filename ] ) {
       return current_unit;
     }
 
+    if ( Erase( evicted_filenames_, filename ) ) {
+      ++recreations_;
+    }
+
     // We create and store an invalid, sentinel TU so that other threads don't
     // try to create a TU for the same file while we are trying to create this
     // TU object. When we are done creating the TU, we will overwrite this value
@@ -108,6 +103,8 @@ shared_ptr< TranslationUnit > TranslationUnitStore::GetOrCreate(
     // Flags have already been stored.
   }
 
+  EnforceLimits( filename );
+
   translation_unit_created = true;
   return unit;
 }
@@ -116,13 +113,19 @@ shared_ptr< TranslationUnit > TranslationUnitStore::GetOrCreate(
 shared_ptr< TranslationUnit > TranslationUnitStore::Get(
   const std::string &filename ) {
   lock_guard< mutex > lock( filename_to_translation_unit_and_flags_mutex_ );
-  return GetNoLock( filename );
+  shared_ptr< TranslationUnit > unit = GetNoLock( filename );
+  if ( unit ) {
+    MarkUsedNoLock( filename );
+  }
+  return unit;
 }
 
 
 bool TranslationUnitStore::Remove( const std::string &filename ) {
   lock_guard< mutex > lock( filename_to_translation_unit_and_flags_mutex_ );
   Erase( filename_to_flags_hash_, filename );
+  Erase( filename_to_last_use_, filename );
+  Erase( evicted_filenames_, filename );
   return Erase( filename_to_translation_unit_, filename );
 }
 
@@ -131,6 +134,75 @@ void TranslationUnitStore::RemoveAll() {
   lock_guard< mutex > lock( filename_to_translation_unit_and_flags_mutex_ );
   filename_to_translation_unit_.clear();
   filename_to_flags_hash_.clear();
+  filename_to_last_use_.clear();
+  evicted_filenames_.clear();
+}
+
+
+void TranslationUnitStore::SetLimits( size_t max_translation_units,
+                                      size_t max_memory_usage ) {
+  {
+    lock_guard< mutex > lock( filename_to_translation_unit_and_flags_mutex_ );
+    max_translation_units_ = max_translation_units;
+    max_memory_usage_ = max_memory_usage;
+  }
+  EnforceLimits( std::string() );
+}
+
+
+void TranslationUnitStore::EnforceLimits(
+  const std::string &filename_to_keep ) {
+  // Evicted TUs are destroyed once we release the lock since disposing a
+  // libclang TU can take a while.
+  std::vector< shared_ptr< TranslationUnit > > evicted_units;
+
+  lock_guard< mutex > lock( filename_to_translation_unit_and_flags_mutex_ );
+
+  while ( LimitsExceededNoLock() ) {
+    auto least_recently_used = filename_to_translation_unit_.end();
+    size_t oldest_use = std::numeric_limits< size_t >::max();
+
+    for ( auto it = filename_to_translation_unit_.begin();
+          it != filename_to_translation_unit_.end(); ++it ) {
+      // Only the store holds a reference to an idle TU. Sentinel TUs are
+      // always considered as being updated.
+      if ( it->first == filename_to_keep ||
+           it->second.use_count() > 1 ||
+           it->second->IsCurrentlyUpdating() ) {
+        continue;
+      }
+
+      size_t last_use = filename_to_last_use_[ it->first ];
+      if ( last_use < oldest_use ) {
+        oldest_use = last_use;
+        least_recently_used = it;
+      }
+    }
+
+    if ( least_recently_used == filename_to_translation_unit_.end() ) {
+      // All remaining TUs are in use.
+      break;
+    }
+
+    const std::string &filename = least_recently_used->first;
+    evicted_units.push_back( least_recently_used->second );
+    evicted_filenames_.insert( filename );
+    Erase( filename_to_flags_hash_, filename );
+    Erase( filename_to_last_use_, filename );
+    filename_to_translation_unit_.erase( least_recently_used );
+    ++evictions_;
+  }
+}
+
+
+TranslationUnitStoreStatistics TranslationUnitStore::Statistics() {
+  lock_guard< mutex > lock( filename_to_translation_unit_and_flags_mutex_ );
+  TranslationUnitStoreStatistics statistics;
+  statistics.translation_units = filename_to_translation_unit_.size();
+  statistics.memory_usage = MemoryUsageNoLock();
+  statistics.evictions = evictions_;
+  statistics.recreations = recreations_;
+  return statistics;
 }
 
 
@@ -141,4 +213,25 @@ shared_ptr< TranslationUnit > TranslationUnitStore::GetNoLock(
                           shared_ptr< TranslationUnit >() );
 }
 
+
+void TranslationUnitStore::MarkUsedNoLock( const std::string &filename ) {
+  filename_to_last_use_[ filename ] = ++use_counter_;
+}
+
+
+size_t TranslationUnitStore::MemoryUsageNoLock() {
+  size_t memory_usage = 0;
+  for ( const auto &filename_and_unit : filename_to_translation_unit_ ) {
+    memory_usage += filename_and_unit.second->MemoryUsage();
+  }
+  return memory_usage;
+}
+
+
+bool TranslationUnitStore::LimitsExceededNoLock() {
+  return ( max_translation_units_ &&
+           filename_to_translation_unit_.size() > max_translation_units_ ) ||
+         ( max_memory_usage_ && MemoryUsageNoLock() > max_memory_usage_ );
+}
+
 } // namespace YouCompleteMe
@@ -25,12 +25,23 @@
 #include <mutex>
 #include <string>
 #include <unordered_map>
+#include <unordered_set>
 #include <vector>
 
 using CXIndex = void*;
 
 namespace YouCompleteMe {
 
+struct TranslationUnitStoreStatistics {
+  size_t translation_units;
+  // Estimated memory used by all stored TUs, in bytes.
+  size_t memory_usage;
+  size_t evictions;
+  // Number of TUs created for a file whose TU was previously evicted.
+  size_t recreations;
+};
+
+
 class TranslationUnitStore {
 public:
   YCM_EXPORT explicit TranslationUnitStore( CXIndex clang_index );
@@ -61,20 +72,49 @@ public:
 
   void RemoveAll();
 
+  // Caps the number of stored TUs and their estimated memory usage (in bytes).
+  // A value of 0 means no limit.
+  YCM_EXPORT void SetLimits( size_t max_translation_units,
+                             size_t max_memory_usage );
+
+  // Evicts the least recently used idle TUs until the store is within its
+  // limits. A TU is idle if it isn't being updated and nobody outside the
+  // store holds a reference to it. The TU for |filename_to_keep| is never
+  // evicted.
+  YCM_EXPORT void EnforceLimits( const std::string &filename_to_keep );
+
+  YCM_EXPORT TranslationUnitStoreStatistics Statistics();
+
 private:
 
   // WARNING: This accesses filename_to_translation_unit_ without a lock!
   std::shared_ptr< TranslationUnit > GetNoLock( const std::string &filename );
 
+  // WARNING: These must be called under the store lock!
+  void MarkUsedNoLock( const std::string &filename );
+
+  size_t MemoryUsageNoLock();
+
+  bool LimitsExceededNoLock();
+
 
   using TranslationUnitForFilename =
     std::unordered_map< std::string, std::shared_ptr< TranslationUnit > >;
 
   using FlagsHashForFilename = std::unordered_map< std::string, std::size_t >;
 
+  using LastUseForFilename = std::unordered_map< std::string, std::size_t >;
+
   CXIndex clang_index_;
   TranslationUnitForFilename filename_to_translation_unit_;
   FlagsHashForFilename filename_to_flags_hash_;
+  LastUseForFilename filename_to_last_use_;
+  std::unordered_set< std::string > evicted_filenames_;
+  std::size_t use_counter_;
+  std::size_t max_translation_units_;
+  std::size_t max_memory_usage_;
+  std::size_t evictions_;
+  std::size_t recreations_;
   std::mutex filename_to_translation_unit_and_flags_mutex_;
 };
 
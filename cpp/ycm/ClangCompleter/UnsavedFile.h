@@ -18,13 +18,19 @@
 #ifndef UNSAVEDFILE_H_0GIYZQL4
 #define UNSAVEDFILE_H_0GIYZQL4
 
+#include <memory>
 #include <string>
 
 struct UnsavedFile {
-  UnsavedFile() : filename_( "" ), contents_( "" ), length_( 0 ) {}
+  UnsavedFile()
+    : filename_( "" ),
+      contents_( std::make_shared< const std::string >() ),
+      length_( 0 ) {}
 
   std::string filename_;
-  std::string contents_;
+  // Shared so that copying an UnsavedFile, e.g. when appending it to the
+  // UnsavedFileVector of a request, doesn't copy the buffer contents.
+  std::shared_ptr< const std::string > contents_;
   unsigned long length_;
 };
 
@@ -73,6 +73,30 @@ TEST( ClangCompleterTest, BufferTextNoParens ) {
 }
 
 
+TEST( ClangCompleterTest, FilterAndSortCandidates ) {
+  ClangCompleter completer;
+  std::vector< CompletionData > candidates( 3 );
+  candidates[ 0 ].original_string_ = "foobar";
+  candidates[ 1 ].original_string_ = "fbr";
+  candidates[ 2 ].original_string_ = "baz";
+
+  EXPECT_THAT( completer.FilterAndSortCandidates( candidates, "fbr", 0 ),
+               ElementsAre(
+                 Property( &CompletionData::TextToInsertInBuffer,
+                           StrEq( "fbr" ) ),
+                 Property( &CompletionData::TextToInsertInBuffer,
+                           StrEq( "foobar" ) ) ) );
+
+  EXPECT_THAT( completer.FilterAndSortCandidates( candidates, "fbr", 1 ),
+               ElementsAre(
+                 Property( &CompletionData::TextToInsertInBuffer,
+                           StrEq( "fbr" ) ) ) );
+
+  EXPECT_TRUE( completer.FilterAndSortCandidates( candidates, "x", 0 )
+               .empty() );
+}
+
+
 TEST( ClangCompleterTest, MemberFunctionWithDefaults ) {
   ClangCompleter completer;
   std::vector< CompletionData > completions =
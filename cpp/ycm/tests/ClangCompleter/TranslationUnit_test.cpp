@@ -165,6 +165,30 @@ TEST_F( TranslationUnitTest, GoToWorks ) {
 }
 
 
+TEST_F( TranslationUnitTest, GetTypeReparsesOnlyChangedFiles ) {
+  auto test_file = PathToTestFile( "unsaved_file.cpp" ).string();
+  UnsavedFile unsaved_file;
+  unsaved_file.filename_ = test_file;
+  unsaved_file.contents_ = std::make_shared< const std::string >( "int foo;" );
+  unsaved_file.length_ = unsaved_file.contents_->size();
+  std::vector< UnsavedFile > unsaved_files{ unsaved_file };
+
+  TranslationUnit unit( test_file,
+                        unsaved_files,
+                        std::vector< std::string >{ "-x", "c++" },
+                        clang_index_ );
+
+  EXPECT_EQ( "int", unit.GetTypeAtLocation( test_file, 1, 5, unsaved_files ) );
+  EXPECT_EQ( "int", unit.GetTypeAtLocation( test_file, 1, 5, unsaved_files ) );
+
+  unsaved_files[ 0 ].contents_ =
+    std::make_shared< const std::string >( "double foo;" );
+  unsaved_files[ 0 ].length_ = unsaved_files[ 0 ].contents_->size();
+  EXPECT_EQ( "double",
+             unit.GetTypeAtLocation( test_file, 1, 8, unsaved_files ) );
+}
+
+
 TEST_F( TranslationUnitTest, InvalidTranslationUnitStore ) {
   // libclang fails to parse a file with no extension and no language flag -x
   // given.
@@ -185,6 +209,65 @@ TEST_F( TranslationUnitTest, InvalidTranslationUnitStore ) {
 }
 
 
+TEST_F( TranslationUnitTest, TranslationUnitStoreEvictsLeastRecentlyUsed ) {
+  auto basic_file = PathToTestFile( "basic.cpp" ).string();
+  auto goto_file = PathToTestFile( "goto.cpp" ).string();
+  TranslationUnitStore translation_unit_store{ clang_index_ };
+  translation_unit_store.SetLimits( 1, 0 );
+
+  translation_unit_store.GetOrCreate( basic_file,
+                                      std::vector< UnsavedFile >(),
+                                      std::vector< std::string >() );
+  EXPECT_LT( 0U, translation_unit_store.Statistics().memory_usage );
+
+  translation_unit_store.GetOrCreate( goto_file,
+                                      std::vector< UnsavedFile >(),
+                                      std::vector< std::string >() );
+  EXPECT_FALSE( translation_unit_store.Get( basic_file ) );
+  EXPECT_TRUE( translation_unit_store.Get( goto_file ) );
+
+  TranslationUnitStoreStatistics statistics =
+    translation_unit_store.Statistics();
+  EXPECT_EQ( 1U, statistics.translation_units );
+  EXPECT_EQ( 1U, statistics.evictions );
+  EXPECT_EQ( 0U, statistics.recreations );
+
+  translation_unit_store.GetOrCreate( basic_file,
+                                      std::vector< UnsavedFile >(),
+                                      std::vector< std::string >() );
+
+  statistics = translation_unit_store.Statistics();
+  EXPECT_EQ( 1U, statistics.translation_units );
+  EXPECT_EQ( 2U, statistics.evictions );
+  EXPECT_EQ( 1U, statistics.recreations );
+}
+
+
+TEST_F( TranslationUnitTest, TranslationUnitStoreKeepsUnitsInUse ) {
+  auto basic_file = PathToTestFile( "basic.cpp" ).string();
+  auto goto_file = PathToTestFile( "goto.cpp" ).string();
+  TranslationUnitStore translation_unit_store{ clang_index_ };
+  translation_unit_store.SetLimits( 1, 0 );
+
+  std::shared_ptr< TranslationUnit > unit = translation_unit_store.GetOrCreate(
+    basic_file,
+    std::vector< UnsavedFile >(),
+    std::vector< std::string >() );
+  translation_unit_store.GetOrCreate( goto_file,
+                                      std::vector< UnsavedFile >(),
+                                      std::vector< std::string >() );
+
+  EXPECT_EQ( unit, translation_unit_store.Get( basic_file ) );
+  EXPECT_TRUE( translation_unit_store.Get( goto_file ) );
+  EXPECT_EQ( 0U, translation_unit_store.Statistics().evictions );
+
+  unit.reset();
+  translation_unit_store.EnforceLimits( goto_file );
+  EXPECT_FALSE( translation_unit_store.Get( basic_file ) );
+  EXPECT_EQ( 1U, translation_unit_store.Statistics().evictions );
+}
+
+
 TEST_F( TranslationUnitTest, InvalidTranslationUnit ) {
 
   TranslationUnit unit;
@@ -107,7 +107,15 @@ PYBIND11_MODULE( ycm_core, mod )
   py::class_< UnsavedFile >( mod, "UnsavedFile" )
     .def( py::init<>() )
     .def_readwrite( "filename_", &UnsavedFile::filename_ )
-    .def_readwrite( "contents_", &UnsavedFile::contents_ )
+    .def_property( "contents_",
+                   []( const UnsavedFile &unsaved_file ) {
+                     return *unsaved_file.contents_;
+                   },
+                   []( UnsavedFile &unsaved_file, std::string contents ) {
+                     unsaved_file.contents_ =
+                       std::make_shared< const std::string >(
+                         std::move( contents ) );
+                   } )
     .def_readwrite( "length_", &UnsavedFile::length_ );
 
   py::bind_vector< std::vector< UnsavedFile > >( mod, "UnsavedFileVector" );
@@ -126,6 +134,12 @@ PYBIND11_MODULE( ycm_core, mod )
     .def( "DeleteCachesForFile",
           &ClangCompleter::DeleteCachesForFile,
           py::call_guard< py::gil_scoped_release >() )
+    .def( "BuildPrecompiledHeader",
+          &ClangCompleter::BuildPrecompiledHeader,
+          py::call_guard< py::gil_scoped_release >() )
+    .def( "FilterAndSortCandidates",
+          &ClangCompleter::FilterAndSortCandidates,
+          py::call_guard< py::gil_scoped_release >() )
     .def( "UpdatingTranslationUnit",
           &ClangCompleter::UpdatingTranslationUnit,
           py::call_guard< py::gil_scoped_release >() )
@@ -146,8 +160,24 @@ PYBIND11_MODULE( ycm_core, mod )
           py::call_guard< py::gil_scoped_release >() )
     .def( "GetDocsForLocationInFile",
           &ClangCompleter::GetDocsForLocationInFile,
+          py::call_guard< py::gil_scoped_release >() )
+    .def( "SetTranslationUnitLimits",
+          &ClangCompleter::SetTranslationUnitLimits,
+          py::call_guard< py::gil_scoped_release >() )
+    .def( "TranslationUnitStatistics",
+          &ClangCompleter::TranslationUnitStatistics,
           py::call_guard< py::gil_scoped_release >() );
 
+  py::class_< TranslationUnitStoreStatistics >(
+      mod, "TranslationUnitStoreStatistics" )
+    .def_readonly( "translation_units",
+                   &TranslationUnitStoreStatistics::translation_units )
+    .def_readonly( "memory_usage",
+                   &TranslationUnitStoreStatistics::memory_usage )
+    .def_readonly( "evictions", &TranslationUnitStoreStatistics::evictions )
+    .def_readonly( "recreations",
+                   &TranslationUnitStoreStatistics::recreations );
+
   py::enum_< CompletionKind >( mod, "CompletionKind" )
     .value( "STRUCT", CompletionKind::STRUCT )
     .value( "CLASS", CompletionKind::CLASS )
@@ -0,0 +1,122 @@
+# Copyright (C) 2020 ycmd contributors
+#
+# This file is part of ycmd.
+#
+# ycmd is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ycmd is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ycmd.  If not, see <http://www.gnu.org/licenses/>.
+
+# NOTE: This module is used as a Singleton
+
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+# Not installing aliases from python-future; it's unreliable and slow.
+from builtins import *  # noqa
+
+import itertools
+from threading import Lock
+
+from future.utils import iteritems
+
+from ycmd.utils import SplitLines, ToBytes, ToUnicode
+
+
+class Buffer( object ):
+  """Contents of a file supplied by the client in the file_data of a request.
+  A Buffer is never modified: new contents for a file give a new Buffer with a
+  greater version, so completers can keep the Buffers they have seen and
+  compare their versions. The lines, the UTF-8 encoded contents and the byte
+  offsets of the lines are only computed when first needed and are then shared
+  by all the completers."""
+
+  def __init__( self, filepath, contents, version ):
+    self.filepath = filepath
+    self.contents = contents
+    self.version = version
+    self._lines = None
+    self._contents_bytes = None
+    self._line_byte_offsets = None
+
+
+  @property
+  def lines( self ):
+    """List of the lines of the contents, as returned by utils.SplitLines. It
+    must not be modified."""
+    if self._lines is None:
+      self._lines = SplitLines( self.contents )
+    return self._lines
+
+
+  @property
+  def contents_bytes( self ):
+    """The contents encoded as UTF-8."""
+    if self._contents_bytes is None:
+      self._contents_bytes = ToBytes( self.contents )
+    return self._contents_bytes
+
+
+  def LineByteOffset( self, line_num ):
+    """Returns the 0-based offset in contents_bytes of the start of the 1-based
+    line |line_num|. Lines past the end start at the end of the contents."""
+    if self._line_byte_offsets is None:
+      offsets = [ 0 ]
+      for line in self.contents_bytes.split( b'\n' )[ : -1 ]:
+        offsets.append( offsets[ -1 ] + len( line ) + 1 )
+      self._line_byte_offsets = offsets
+
+    if line_num > len( self._line_byte_offsets ):
+      return len( self.contents_bytes )
+    return self._line_byte_offsets[ max( line_num, 1 ) - 1 ]
+
+
+# Singleton variables
+_buffers = {}
+_buffers_lock = Lock()
+_versions = itertools.count( 1 )
+
+
+def UpdateBuffers( file_data ):
+  """Updates the store with the contents of the files in the |file_data| of a
+  request and returns a dict of filepath -> Buffer for these files. Files whose
+  contents didn't change keep their Buffer, so their contents are the same
+  object for all the requests and completers, and comparing them with previous
+  contents is immediate."""
+  buffers = {}
+  with _buffers_lock:
+    for filepath, data in iteritems( file_data ):
+      contents = ToUnicode( data[ 'contents' ] )
+      file_buffer = _buffers.get( filepath )
+      if file_buffer is None or file_buffer.contents != contents:
+        file_buffer = Buffer( filepath, contents, next( _versions ) )
+        _buffers[ filepath ] = file_buffer
+      buffers[ filepath ] = file_buffer
+  return buffers
+
+
+def GetBuffer( filepath ):
+  """Returns the latest Buffer for |filepath|, or None if the file isn't open in
+  the client."""
+  with _buffers_lock:
+    return _buffers.get( filepath )
+
+
+def RemoveBuffer( filepath ):
+  """Forgets about |filepath|, which was closed in the client."""
+  with _buffers_lock:
+    _buffers.pop( filepath, None )
+
+
+def Reset():
+  with _buffers_lock:
+    _buffers.clear()
@@ -107,7 +107,7 @@ class IdentifierCompleter( GeneralCompleter ):
 
     collect_from_comments_and_strings = bool( self.user_options[
       'collect_identifiers_from_comments_and_strings' ] )
-    text = request_data[ 'file_data' ][ filepath ][ 'contents' ]
+    text = request_data[ 'buffers' ][ filepath ].contents
     LOGGER.info( 'Adding buffer identifiers for file: %s', filepath )
     self._completer.ClearForFileAndAddIdentifiersToDatabase(
         _IdentifiersFromBuffer( text,
@@ -192,13 +192,10 @@ def _PreviousIdentifier( min_num_candidate_size_chars,
 
   line_num = request_data[ 'line_num' ] - 1
   column_num = request_data[ 'column_codepoint' ] - 1
-  filepath = request_data[ 'filepath' ]
   filetype = request_data[ 'first_filetype' ]
 
-  contents = request_data[ 'file_data' ][ filepath ][ 'contents' ]
-  if not collect_from_comments_and_strings:
-    contents = identifier_utils.RemoveIdentifierFreeText( contents, filetype )
-  contents_per_line = SplitLines( contents )
+  contents_per_line = _BufferLines( collect_from_comments_and_strings,
+                                   request_data )
 
   ident = PreviousIdentifierOnLine( contents_per_line[ line_num ],
                                     column_num,
@@ -229,17 +226,25 @@ def _RemoveSmallCandidates( candidates, min_num_candidate_size_chars ):
 
 def _GetCursorIdentifier( collect_from_comments_and_strings,
                           request_data ):
-  filepath = request_data[ 'filepath' ]
-  contents = request_data[ 'file_data' ][ filepath ][ 'contents' ]
-  filetype = request_data[ 'first_filetype' ]
-  if not collect_from_comments_and_strings:
-    contents = identifier_utils.RemoveIdentifierFreeText( contents, filetype )
-  contents_per_line = SplitLines( contents )
+  contents_per_line = _BufferLines( collect_from_comments_and_strings,
+                                   request_data )
   line = contents_per_line[ request_data[ 'line_num' ] - 1 ]
   return identifier_utils.IdentifierAtIndex(
       line,
       request_data[ 'column_codepoint' ] - 1,
-      filetype )
+      request_data[ 'first_filetype' ] )
+
+
+def _BufferLines( collect_from_comments_and_strings, request_data ):
+  """Returns the lines of the current buffer, without the comments and strings
+  unless |collect_from_comments_and_strings| is set."""
+  if collect_from_comments_and_strings:
+    # Already split in the buffer store.
+    return request_data[ 'lines' ]
+  contents = identifier_utils.RemoveIdentifierFreeText(
+    request_data[ 'buffers' ][ request_data[ 'filepath' ] ].contents,
+    request_data[ 'first_filetype' ] )
+  return SplitLines( contents )
 
 
 def _IdentifiersFromBuffer( text,
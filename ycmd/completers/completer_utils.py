@@ -243,9 +243,8 @@ def GetFileContents( request_data, filename ):
   potentially modified/dirty in the user's editor), then it is returned,
   otherwise the file is read from disk (assuming a UTF-8 encoding) and its
   contents returned."""
-  file_data = request_data[ 'file_data' ]
-  if filename in file_data:
-    return ToUnicode( file_data[ filename ][ 'contents' ] )
+  if filename in request_data[ 'file_data' ]:
+    return request_data[ 'buffers' ][ filename ].contents
 
   try:
     return ToUnicode( ReadFile( filename ) )
@@ -256,7 +255,8 @@ def GetFileContents( request_data, filename ):
 
 def GetFileLines( request_data, filename ):
   """Like GetFileContents but return the contents as a list of lines. Avoid
-  splitting the lines if they have already been split for the current file."""
-  if filename == request_data[ 'filepath' ]:
-    return request_data[ 'lines' ]
+  splitting the lines if they have already been split for an open file. The
+  returned list must not be modified."""
+  if filename in request_data[ 'file_data' ]:
+    return request_data[ 'buffers' ][ filename ].lines
   return SplitLines( GetFileContents( request_data, filename ) )
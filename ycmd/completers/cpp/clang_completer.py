@@ -23,16 +23,22 @@ from __future__ import absolute_import
 from builtins import *  # noqa
 
 from collections import defaultdict
+from concurrent.futures import CancelledError
 from future.utils import iteritems
 import os.path
+import tempfile
 import textwrap
+import threading
+import time
 import xml.etree.ElementTree
 from xml.etree.ElementTree import ParseError as XmlParseError
 
 import ycm_core
 from ycmd import responses
-from ycmd.utils import ( PathLeftSplit,
+from ycmd.utils import ( OnWindows,
+                         PathLeftSplit,
                          re,
+                         ReadFile,
                          ToBytes,
                          ToCppStringCompatible,
                          ToUnicode )
@@ -41,10 +47,17 @@ from ycmd.completers.cpp.flags import ( Flags, PrepareFlagsForClang,
                                         UserIncludePaths )
 from ycmd.completers.cpp.ephemeral_values_set import EphemeralValuesSet
 from ycmd.completers.cpp.include_cache import IncludeCache, IncludeList
+from ycmd.completers.cpp.parse_pool import ( ParsePool,
+                                             PRIORITY_BACKGROUND,
+                                             PRIORITY_CURRENT_BUFFER )
+from ycmd.completers.cpp.preamble_cache import ( MakePrivateDirectory,
+                                                 PreambleCache )
+from ycmd.completers.cpp.reparse_scheduler import ReparseScheduler
 from ycmd.responses import NoExtraConfDetected, UnknownExtraConf
 
 CLANG_FILETYPES = { 'c', 'cpp', 'cuda', 'objc', 'objcpp' }
 PARSING_FILE_MESSAGE = 'Still parsing file.'
+PARSING_FILE_POLL_INTERVAL = 0.01
 NO_COMPILE_FLAGS_MESSAGE = 'Still no compile flags.'
 NO_COMPLETIONS_MESSAGE = 'No completions found; errors in the file?'
 NO_DIAGNOSTIC_MESSAGE = 'No diagnostic for current line!'
@@ -59,10 +72,31 @@ class ClangCompleter( Completer ):
   def __init__( self, user_options ):
     super( ClangCompleter, self ).__init__( user_options )
     self._completer = ycm_core.ClangCompleter()
+    # The memory limit is given in megabytes.
+    self._completer.SetTranslationUnitLimits(
+      user_options[ 'max_clang_translation_units' ],
+      user_options[ 'max_clang_translation_units_memory' ] * 1024 * 1024 )
     self._flags = Flags()
     self._include_cache = IncludeCache()
     self._diagnostic_store = None
     self._files_being_compiled = EphemeralValuesSet()
+    # Maps a filename to the version of its buffer and the corresponding
+    # ycm_core.UnsavedFile.
+    self._unsaved_files = {}
+    self._unsaved_files_lock = threading.Lock()
+    self._parse_wait_timeout = user_options[ 'clang_parse_wait_timeout' ]
+    self._parse_pool = ParsePool( self._UpdateTranslationUnit,
+                                  user_options[ 'clang_parse_workers' ] )
+    self._reparse_scheduler = ReparseScheduler(
+      self._ReparseInBackground,
+      user_options[ 'clang_idle_reparse_interval' ] )
+    self._preamble_cache = None
+    if user_options[ 'clang_share_preambles' ]:
+      cache_directory = _PreambleCacheDirectory()
+      if MakePrivateDirectory( cache_directory ):
+        self._preamble_cache = PreambleCache(
+          self._completer.BuildPrecompiledHeader,
+          cache_directory )
 
 
   def SupportedFiletypes( self ):
@@ -74,20 +108,37 @@ class ClangCompleter( Completer ):
     for filename, file_data in iteritems( request_data[ 'file_data' ] ):
       if not ClangAvailableForFiletypes( file_data[ 'filetypes' ] ):
         continue
-      contents = file_data[ 'contents' ]
-      if not contents or not filename:
+      if not file_data[ 'contents' ] or not filename:
         continue
 
-      unsaved_file = ycm_core.UnsavedFile()
-      utf8_contents = ToCppStringCompatible( contents )
-      unsaved_file.contents_ = utf8_contents
-      unsaved_file.length_ = len( utf8_contents )
-      unsaved_file.filename_ = ToCppStringCompatible( filename )
-
-      files.append( unsaved_file )
+      # Appending an UnsavedFile to the vector doesn't copy its contents.
+      files.append( self._UnsavedFileForBuffer(
+        request_data[ 'buffers' ][ filename ] ) )
     return files
 
 
+  def _UnsavedFileForBuffer( self, file_buffer ):
+    """Returns the ycm_core.UnsavedFile for |file_buffer|. The contents of a
+    buffer are only converted and copied to ycm_core when they changed since
+    the last request."""
+    with self._unsaved_files_lock:
+      version, unsaved_file = self._unsaved_files.get( file_buffer.filepath,
+                                                       ( None, None ) )
+      if version == file_buffer.version:
+        return unsaved_file
+
+    unsaved_file = ycm_core.UnsavedFile()
+    utf8_contents = ToCppStringCompatible( file_buffer.contents_bytes )
+    unsaved_file.contents_ = utf8_contents
+    unsaved_file.length_ = len( utf8_contents )
+    unsaved_file.filename_ = ToCppStringCompatible( file_buffer.filepath )
+
+    with self._unsaved_files_lock:
+      self._unsaved_files[ file_buffer.filepath ] = ( file_buffer.version,
+                                                      unsaved_file )
+    return unsaved_file
+
+
   def ShouldCompleteIncludeStatement( self, request_data ):
     column_codepoint = request_data[ 'column_codepoint' ] - 1
     current_line = request_data[ 'line_value' ]
@@ -147,9 +198,7 @@ class ClangCompleter( Completer ):
     if includes is not None:
       return includes
 
-    if self._completer.UpdatingTranslationUnit(
-        ToCppStringCompatible( filename ) ):
-      raise RuntimeError( PARSING_FILE_MESSAGE )
+    self._WaitForTranslationUnit( filename )
 
     files = self.GetUnsavedFilesVector( request_data )
     line = request_data[ 'line_num' ]
@@ -163,10 +212,57 @@ class ClangCompleter( Completer ):
           files,
           flags )
 
+    # The buffer is being edited; bring the translation unit up to date once
+    # the user stops typing.
+    self._reparse_scheduler.Schedule( filename, files, flags )
+
     if not results:
       raise RuntimeError( NO_COMPLETIONS_MESSAGE )
 
-    return [ ConvertCompletionData( x ) for x in results ]
+    # Candidates stay in ycm_core until they are filtered; see
+    # FilterAndSortCandidates and DetailCandidates.
+    return results
+
+
+  def FilterAndSortCandidates( self, candidates, query ):
+    if not isinstance( candidates, ycm_core.CompletionVector ):
+      # Include completions.
+      return super( ClangCompleter, self ).FilterAndSortCandidates( candidates,
+                                                                    query )
+    return self._completer.FilterAndSortCandidates(
+      candidates,
+      ToCppStringCompatible( query ),
+      self._max_candidates )
+
+
+  def DetailCandidates( self, request_data, candidates ):
+    if not isinstance( candidates, ycm_core.CompletionVector ):
+      return candidates
+    return [ ConvertCompletionData( x ) for x in candidates ]
+
+
+  def _WaitForTranslationUnit( self, filename ):
+    """Waits up to |clang_parse_wait_timeout| seconds for the translation unit
+    of |filename| to be parsed. Raises PARSING_FILE_MESSAGE if it isn't."""
+    deadline = time.time() + self._parse_wait_timeout
+    while self._completer.UpdatingTranslationUnit(
+        ToCppStringCompatible( filename ) ):
+      if time.time() >= deadline:
+        raise RuntimeError( PARSING_FILE_MESSAGE )
+      time.sleep( PARSING_FILE_POLL_INTERVAL )
+
+
+  def _UpdateTranslationUnit( self, filename, files, flags ):
+    return self._completer.UpdateTranslationUnit(
+      ToCppStringCompatible( filename ),
+      files,
+      flags )
+
+
+  def _ReparseInBackground( self, filename, files, flags ):
+    # The pool never parses a file twice at once, and requests for this file
+    # wait for the reparse in _WaitForTranslationUnit rather than fail.
+    self._parse_pool.Submit( filename, PRIORITY_BACKGROUND, files, flags )
 
 
   def GetSubcommandsMap( self ):
@@ -212,9 +308,7 @@ class ClangCompleter( Completer ):
     if not flags:
       raise ValueError( NO_COMPILE_FLAGS_MESSAGE )
 
-    if self._completer.UpdatingTranslationUnit(
-        ToCppStringCompatible( filename ) ):
-      raise RuntimeError( PARSING_FILE_MESSAGE )
+    self._WaitForTranslationUnit( filename )
 
     files = self.GetUnsavedFilesVector( request_data )
     line = request_data[ 'line_num' ]
@@ -321,9 +415,7 @@ class ClangCompleter( Completer ):
     if not flags:
       raise ValueError( NO_COMPILE_FLAGS_MESSAGE )
 
-    if self._completer.UpdatingTranslationUnit(
-        ToCppStringCompatible( filename ) ):
-      raise RuntimeError( PARSING_FILE_MESSAGE )
+    self._WaitForTranslationUnit( filename )
 
     files = self.GetUnsavedFilesVector( request_data )
     line = request_data[ 'line_num' ]
@@ -353,9 +445,7 @@ class ClangCompleter( Completer ):
     if not flags:
       raise ValueError( NO_COMPILE_FLAGS_MESSAGE )
 
-    if self._completer.UpdatingTranslationUnit(
-        ToCppStringCompatible( filename ) ):
-      raise RuntimeError( PARSING_FILE_MESSAGE )
+    self._WaitForTranslationUnit( filename )
 
     files = self.GetUnsavedFilesVector( request_data )
     line = request_data[ 'line_num' ]
@@ -377,15 +467,22 @@ class ClangCompleter( Completer ):
 
 
   def OnFileReadyToParse( self, request_data ):
-    flags, filename = self._FlagsForRequest( request_data )
+    flags, filename = self._FlagsForRequest( request_data, parsing = True )
     if not flags:
       raise ValueError( NO_COMPILE_FLAGS_MESSAGE )
 
-    with self._files_being_compiled.GetExclusive( filename ):
-      diagnostics = self._completer.UpdateTranslationUnit(
-        ToCppStringCompatible( filename ),
+    self._reparse_scheduler.Cancel( filename )
+    # A parse of this file that is still queued is updated with these contents
+    # instead of queuing another one.
+    try:
+      diagnostics = self._parse_pool.Submit(
+        filename,
+        PRIORITY_CURRENT_BUFFER,
         self.GetUnsavedFilesVector( request_data ),
-        flags )
+        flags ).result()
+    except CancelledError:
+      # The buffer was unloaded while the parse was queued.
+      return []
 
     diagnostics = _FilterDiagnostics( diagnostics )
     self._diagnostic_store = DiagnosticsToDiagStructure( diagnostics )
@@ -404,8 +501,14 @@ class ClangCompleter( Completer ):
     #
     # Solving this would require remembering the graph of files to translation
     # units and only closing a unit when there are no files open which use it.
+    self._reparse_scheduler.Cancel( request_data[ 'filepath' ] )
+    self._parse_pool.Cancel( request_data[ 'filepath' ] )
+    with self._unsaved_files_lock:
+      self._unsaved_files.pop( request_data[ 'filepath' ], None )
     self._completer.DeleteCachesForFile(
         ToCppStringCompatible( request_data[ 'filepath' ] ) )
+    if self._preamble_cache:
+      self._preamble_cache.RemoveFile( request_data[ 'filepath' ] )
 
 
   def GetDetailedDiagnostic( self, request_data ):
@@ -459,13 +562,44 @@ class ClangCompleter( Completer ):
     filename_item = responses.DebugInfoItem(
       key = 'translation unit', value = filename )
 
+    statistics = self._completer.TranslationUnitStatistics()
+    units_item = responses.DebugInfoItem(
+      key = 'translation units', value = statistics.translation_units )
+    memory_item = responses.DebugInfoItem(
+      key = 'translation units memory usage',
+      value = '{0:.1f} MB'.format( statistics.memory_usage / 1024 / 1024 ) )
+    evictions_item = responses.DebugInfoItem(
+      key = 'translation unit evictions', value = statistics.evictions )
+    recreations_item = responses.DebugInfoItem(
+      key = 'translation unit re-creations', value = statistics.recreations )
+
+    parse_statistics = self._parse_pool.Statistics()
+    parse_queue_item = responses.DebugInfoItem(
+      key = 'parse queue depth', value = parse_statistics[ 'queued' ] )
+    parse_workers_item = responses.DebugInfoItem(
+      key = 'parse workers',
+      value = '{0} of {1} busy'.format( parse_statistics[ 'running' ],
+                                        parse_statistics[ 'workers' ] ) )
+    parse_wait_item = responses.DebugInfoItem(
+      key = 'parse wait time',
+      value = 'mean {0:.0f} ms, max {1:.0f} ms'.format(
+        parse_statistics[ 'mean_wait_time' ] * 1000,
+        parse_statistics[ 'max_wait_time' ] * 1000 ) )
+
     return responses.BuildDebugInfoResponse( name = 'C-family',
                                              items = [ database_item,
                                                        flags_item,
-                                                       filename_item ] )
+                                                       filename_item,
+                                                       units_item,
+                                                       memory_item,
+                                                       evictions_item,
+                                                       recreations_item,
+                                                       parse_queue_item,
+                                                       parse_workers_item,
+                                                       parse_wait_item ] )
 
 
-  def _FlagsForRequest( self, request_data ):
+  def _FlagsForRequest( self, request_data, parsing = False ):
     filename = request_data[ 'filepath' ]
 
     if 'compilation_flags' in request_data:
@@ -476,7 +610,37 @@ class ClangCompleter( Completer ):
                filename )
 
     client_data = request_data[ 'extra_conf_data' ]
-    return self._flags.FlagsForFile( filename, client_data = client_data )
+    flags, filename = self._flags.FlagsForFile( filename,
+                                                client_data = client_data )
+    return ( self._AddPreambleFlags( request_data, flags, filename, parsing ),
+             filename )
+
+
+  def _AddPreambleFlags( self, request_data, flags, filename, parsing ):
+    """Adds an -include-pch flag to |flags| when the translation unit of
+    |filename| shares a precompiled preamble with other files. This is only
+    decided again when the file is parsed."""
+    if not self._preamble_cache or not flags:
+      return flags
+
+    if parsing:
+      file_data = request_data[ 'file_data' ]
+      try:
+        contents = ( file_data[ filename ][ 'contents' ]
+                     if filename in file_data else ReadFile( filename ) )
+      except EnvironmentError:
+        return flags
+      pch = self._preamble_cache.PrecompiledPreambleForFile(
+        filename, contents, flags, open_files = list( file_data ) )
+    else:
+      pch = self._preamble_cache.PrecompiledPreambleInUse( filename, flags )
+    if not pch:
+      return flags
+
+    preamble_flags = ycm_core.StringVector( flags )
+    preamble_flags.append( '-include-pch' )
+    preamble_flags.append( ToCppStringCompatible( pch ) )
+    return preamble_flags
 
 
 def BuildExtraData( completion_data ):
@@ -509,6 +673,14 @@ def DiagnosticsToDiagStructure( diagnostics ):
   return structure
 
 
+def _PreambleCacheDirectory():
+  if OnWindows():
+    return os.path.join( tempfile.gettempdir(), 'ycmd_preambles' )
+  # The temporary directory is shared by all users.
+  return os.path.join( tempfile.gettempdir(),
+                       'ycmd_preambles_{0}'.format( os.getuid() ) )
+
+
 def ClangAvailableForFiletypes( filetypes ):
   return any( filetype in CLANG_FILETYPES for filetype in filetypes )
 
@@ -27,6 +27,8 @@ import os
 import subprocess
 
 from ycmd import extra_conf_store, responses
+from ycmd.completers.cpp.compilation_database import (
+  FindCompilationDatabaseDirectory )
 from ycmd.completers.cpp.flags import ( AddMacIncludePaths,
                                         RemoveUnusedFlags,
                                         ShouldAllowWinStyleFlags )
@@ -39,7 +41,6 @@ from ycmd.utils import ( CLANG_RESOURCE_DIR,
                          FindExecutable,
                          LOGGER,
                          OnMac,
-                         PathsToAllParentFolders,
                          re )
 
 MIN_SUPPORTED_VERSION = ( 9, 0, 0 )
@@ -417,8 +418,4 @@ class ClangdCompleter( simple_language_server_completer.SimpleLSPCompleter ):
 
 
 def CompilationDatabaseExists( file_dir ):
-  for folder in PathsToAllParentFolders( file_dir ):
-    if os.path.exists( os.path.join( folder, 'compile_commands.json' ) ):
-      return True
-
-  return False
+  return FindCompilationDatabaseDirectory( file_dir ) is not None
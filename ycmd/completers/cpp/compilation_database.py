@@ -0,0 +1,319 @@
+# Copyright (C) 2020 ycmd contributors
+#
+# This file is part of ycmd.
+#
+# ycmd is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ycmd is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ycmd.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+# Not installing aliases from python-future; it's unreliable and slow.
+from builtins import *  # noqa
+
+import json
+import os
+import shlex
+import threading
+import time
+from collections import defaultdict
+
+from future.utils import iteritems, native
+
+from ycmd.utils import ( LOGGER,
+                         OnWindows,
+                         PathsToAllParentFolders,
+                         re,
+                         StartThread,
+                         ToUnicode )
+
+DATABASE_FILENAME = 'compile_commands.json'
+# The index is stored next to the database. Bump INDEX_VERSION when changing
+# its format.
+INDEX_FILENAME = '.ycmd_compile_commands_index.json'
+INDEX_VERSION = 1
+
+# Minimum number of seconds between two checks that a directory was not
+# modified when looking for the compilation database of a file.
+DIRECTORY_REVALIDATION_INTERVAL = 1
+
+# Whitespace and commas between two entries of the database.
+SEPARATOR_REGEX = re.compile( '[\\s,]*' )
+
+# Maps each directory visited when looking for a compilation database to a
+# ( time of the check, modification time, contains a database, nearest
+# database directory ) tuple. The nearest database directory is None when
+# neither the directory nor its parents contain a database.
+_directories = {}
+_directories_lock = threading.Lock()
+
+
+class CompileCommand( object ):
+  def __init__( self, filename, directory, arguments ):
+    self.filename = filename
+    self.directory = directory
+    self.arguments = arguments
+
+
+class CompilationDatabase( object ):
+  """A compile_commands.json file from which only the commands that are needed
+  are read.
+
+  The file is indexed on a background thread: the index maps each file to the
+  position of its command in the database, so that looking up a file only
+  parses that command. The index is saved next to the database along with its
+  modification time and size, and reused until the database changes. Files
+  are not found until the index is ready; see WaitUntilIndexed."""
+
+  def __init__( self, database_directory ):
+    self.database_directory = database_directory
+    self._path = os.path.join( database_directory, DATABASE_FILENAME )
+    self._index_path = os.path.join( database_directory, INDEX_FILENAME )
+    self._indexed = threading.Event()
+    self._index_lock = threading.Lock()
+    # Maps a normalized filename to the ( offset, length ) in bytes of its
+    # command in the database.
+    self._entries = {}
+    # Maps a directory to the filenames of the commands in that directory.
+    self._filenames_by_directory = defaultdict( list )
+
+    # Only check that the file looks like a JSON array here. The rest of the
+    # database is parsed while indexing.
+    self._loaded = _StartsJsonArray( self._path )
+    if self._loaded:
+      StartThread( self._BuildIndex )
+    else:
+      self._indexed.set()
+
+
+  def DatabaseSuccessfullyLoaded( self ):
+    return self._loaded
+
+
+  def WaitUntilIndexed( self, timeout = None ):
+    """Returns True if the database is indexed within |timeout| seconds."""
+    return self._indexed.wait( timeout )
+
+
+  def GetCompileCommand( self, filename ):
+    """Returns the CompileCommand for |filename|, or None if it isn't in the
+    database or the database isn't indexed yet."""
+    filename = _NormalizePath( filename )
+    location = self._entries.get( filename )
+    if not location:
+      return None
+
+    offset, length = location
+    try:
+      with open( self._path, 'rb' ) as database:
+        database.seek( offset )
+        entry = json.loads( database.read( length ).decode( 'utf-8' ) )
+      command = _EntryToCompileCommand( entry )
+      if command.filename == filename:
+        return command
+    except ( EnvironmentError, ValueError, KeyError ):
+      pass
+
+    # The database was modified since it was indexed.
+    LOGGER.info( 'Cannot read the command for %s from %s, indexing it again',
+                 filename,
+                 self._path )
+    self._DropIndex()
+    return None
+
+
+  def FilenamesInDirectory( self, directory ):
+    return self._filenames_by_directory.get( _NormalizePath( directory ), [] )
+
+
+  def Directories( self ):
+    return list( self._filenames_by_directory )
+
+
+  def _DropIndex( self ):
+    """Indexes the database again, without reusing the saved index: the
+    database may have been modified without changing its modification time
+    and size."""
+    with self._index_lock:
+      if not self._indexed.is_set():
+        return
+      self._indexed.clear()
+      self._entries = {}
+      self._filenames_by_directory = defaultdict( list )
+    StartThread( self._BuildIndex, False )
+
+
+  def _BuildIndex( self, reuse_saved_index = True ):
+    try:
+      stat = os.stat( self._path )
+      key = { 'version': INDEX_VERSION,
+              'mtime': stat.st_mtime,
+              'size': stat.st_size }
+      entries = self._LoadIndex( key ) if reuse_saved_index else None
+      if entries is None:
+        LOGGER.info( 'Indexing compilation database %s', self._path )
+        entries = _IndexDatabase( self._path )
+        self._SaveIndex( key, entries )
+
+      filenames_by_directory = defaultdict( list )
+      for filename in entries:
+        filenames_by_directory[ os.path.dirname( filename ) ].append( filename )
+      self._filenames_by_directory = filenames_by_directory
+      self._entries = entries
+    except Exception:
+      LOGGER.exception( 'Cannot index compilation database %s', self._path )
+    finally:
+      self._indexed.set()
+
+
+  def _LoadIndex( self, key ):
+    try:
+      with open( self._index_path ) as index_file:
+        index = json.load( index_file )
+      if index[ 'key' ] != key:
+        return None
+      return { filename: tuple( location )
+               for filename, location in iteritems( index[ 'entries' ] ) }
+    except ( EnvironmentError, ValueError, KeyError ):
+      return None
+
+
+  def _SaveIndex( self, key, entries ):
+    try:
+      with open( self._index_path, 'w' ) as index_file:
+        json.dump( { 'key': key, 'entries': entries }, index_file )
+    except EnvironmentError:
+      LOGGER.info( 'Cannot save the compilation database index to %s',
+                   self._index_path )
+
+
+def FindCompilationDatabaseDirectory( path ):
+  """Returns the closest directory among |path| and its parents that contains
+  a compile_commands.json file, or None.
+
+  The result is cached for every directory visited, so that looking up another
+  file in the same tree stops at the first directory already visited. A cached
+  directory is trusted for DIRECTORY_REVALIDATION_INTERVAL seconds; then it is
+  looked into again only if its modification time changed, which happens when
+  a database is created or removed in it."""
+  now = time.time()
+  visited = []
+  nearest = None
+  for folder in PathsToAllParentFolders( path ):
+    with _directories_lock:
+      state = _directories.get( folder )
+    if state and now - state[ 0 ] < DIRECTORY_REVALIDATION_INTERVAL:
+      nearest = state[ 3 ]
+      break
+
+    mtime, contains_database = _CheckDirectory( folder, state )
+    visited.append( ( folder, mtime, contains_database ) )
+    if contains_database:
+      nearest = folder
+      break
+
+  with _directories_lock:
+    for folder, mtime, contains_database in visited:
+      _directories[ folder ] = ( now, mtime, contains_database, nearest )
+  return nearest
+
+
+def ClearCompilationDatabaseDirectories():
+  with _directories_lock:
+    _directories.clear()
+
+
+def _CheckDirectory( folder, state ):
+  """Returns a ( modification time, contains a database ) tuple for |folder|,
+  where the latter is taken from |state| if the directory was not modified."""
+  try:
+    mtime = os.stat( folder ).st_mtime
+  except OSError:
+    mtime = None
+  if state and state[ 1 ] == mtime:
+    return mtime, state[ 2 ]
+  return mtime, os.path.exists( os.path.join( folder, DATABASE_FILENAME ) )
+
+
+def _StartsJsonArray( path ):
+  try:
+    with open( path, 'rb' ) as database:
+      return database.read( 4096 ).lstrip().startswith( b'[' )
+  except EnvironmentError:
+    return False
+
+
+def _IndexDatabase( path ):
+  """Returns a dict mapping the normalized filename of each command in the
+  database at |path| to its ( offset, length ) in bytes. The first command of
+  a file is kept when there are several."""
+  with open( path, 'rb' ) as database:
+    # Decoding as Latin-1 maps each byte to one character, so that positions
+    # in the decoded text are also positions in the file.
+    text = database.read().decode( 'latin-1' )
+
+  decoder = json.JSONDecoder()
+  entries = {}
+  position = SEPARATOR_REGEX.match( text ).end()
+  if text[ position : position + 1 ] != '[':
+    raise ValueError( 'The compilation database is not a JSON array.' )
+  position = SEPARATOR_REGEX.match( text, position + 1 ).end()
+
+  while text[ position : position + 1 ] != ']':
+    entry, end = decoder.raw_decode( text, position )
+    filename = _EntryFilename( entry, _FromLatin1 )
+    entries.setdefault( filename, ( position, end - position ) )
+    position = SEPARATOR_REGEX.match( text, end ).end()
+    if position >= len( text ):
+      raise ValueError( 'The compilation database is truncated.' )
+
+  return entries
+
+
+def _FromLatin1( value ):
+  try:
+    return value.encode( 'latin-1' ).decode( 'utf-8' )
+  except ( UnicodeEncodeError, UnicodeDecodeError ):
+    # The value was written with escape sequences.
+    return value
+
+
+def _EntryFilename( entry, decode = ToUnicode ):
+  return _NormalizePath( os.path.join( decode( entry[ 'directory' ] ),
+                                       decode( entry[ 'file' ] ) ) )
+
+
+def _EntryToCompileCommand( entry ):
+  if 'arguments' in entry:
+    arguments = [ ToUnicode( argument ) for argument in entry[ 'arguments' ] ]
+  else:
+    arguments = _SplitCommand( entry[ 'command' ] )
+  return CompileCommand( _EntryFilename( entry ),
+                         ToUnicode( entry[ 'directory' ] ),
+                         arguments )
+
+
+def _SplitCommand( command ):
+  # shlex doesn't support unicode on Python 2.
+  arguments = shlex.split( native( command ), posix = not OnWindows() )
+  if OnWindows():
+    arguments = [ argument[ 1 : -1 ]
+                  if len( argument ) > 1 and
+                     argument[ 0 ] == argument[ -1 ] == '"' else argument
+                  for argument in arguments ]
+  return [ ToUnicode( argument ) for argument in arguments ]
+
+
+def _NormalizePath( path ):
+  return os.path.normcase( os.path.normpath( path ) )
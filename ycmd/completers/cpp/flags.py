@@ -25,11 +25,19 @@ from builtins import *  # noqa
 import ycm_core
 import os
 import inspect
-from future.utils import PY2, native
+import threading
+import time
+from future.utils import iteritems, PY2, native
 from ycmd import extra_conf_store
-from ycmd.utils import ( OnMac,
+from ycmd.completers.cpp.compilation_database import (
+  ClearCompilationDatabaseDirectories,
+  CompilationDatabase,
+  CompileCommand,
+  FindCompilationDatabaseDirectory )
+from ycmd.utils import ( GetModificationTime,
+                         LOGGER,
+                         OnMac,
                          OnWindows,
-                         PathsToAllParentFolders,
                          re,
                          ToCppStringCompatible,
                          ToBytes,
@@ -86,6 +94,29 @@ EMPTY_FLAGS = {
   'flags': [],
 }
 
+# Maximum number of seconds a request waits for a compilation database to be
+# indexed before reporting that the flags are not ready.
+DATABASE_INDEX_WAIT_TIMEOUT = 0.5
+
+# Maps a language to the language to use for its headers when a header borrows
+# the compile command of a source file. Other languages are left to libclang to
+# deduce from the header extension.
+HEADER_LANGUAGES = { 'c++': 'c++-header',
+                     'objective-c': 'objective-c-header',
+                     'objective-c++': 'objective-c++-header' }
+
+# Languages of the source files without a -x flag, by extension. Other source
+# files are C++.
+SOURCE_LANGUAGES = { '.c': 'c',
+                     '.cu': 'cuda',
+                     '.m': 'objective-c',
+                     '.mm': 'objective-c++' }
+
+# Minimum number of seconds between two checks that a compilation database or
+# an extra conf file was not modified since flags were loaded from it. Files
+# are checked per directory.
+FLAGS_REVALIDATION_INTERVAL = 5
+
 MAC_XCODE_TOOLCHAIN_DIR = (
   '/Applications/Xcode.app/Contents/Developer/Toolchains'
   '/XcodeDefault.xctoolchain' )
@@ -109,12 +140,25 @@ class Flags( object ):
     self.flags_for_file = {}
     self.no_extra_conf_file_warning_posted = False
 
-    # We cache the compilation database for any given source directory
-    # Keys are directory names and values are ycm_core.CompilationDatabase
-    # instances or None. Value is None when it is known there is no compilation
-    # database to be found for the directory.
+    # We cache the compilation database loaded from any given directory.
+    # Keys are directory names and values are CompilationDatabase instances.
+    # Which directory holds the database of a file is cached by
+    # FindCompilationDatabaseDirectory.
     self.compilation_database_dir_map = {}
 
+    # Maps a key of flags_for_file to a ( path, modification time ) tuple of
+    # the compilation database or extra conf file the flags were loaded from.
+    self._flags_sources = {}
+    # Maps a directory to the modification time of its compilation database
+    # when it was loaded.
+    self._database_mtimes = {}
+    # Maps a directory to a ( time of the check, modification times ) tuple
+    # where modification times maps the paths of the compilation database and
+    # extra conf files in that directory to their last checked modification
+    # time.
+    self._revalidations = {}
+    self._sources_lock = threading.Lock()
+
 
   def FlagsForFile( self,
                     filename,
@@ -132,25 +176,79 @@ class Flags( object ):
     # may be called from multiple threads, and python gives us
     # 1-python-statement synchronisation for "free" (via the GIL)
     try:
-      return self.flags_for_file[ filename, client_data ]
+      cached_flags = self.flags_for_file[ filename, client_data ]
+      if not self._FlagsSourceModified( ( filename, client_data ) ):
+        return cached_flags
     except KeyError:
       pass
 
-    results = self._GetFlagsFromExtraConfOrDatabase( filename, client_data )
+    results, source = self._GetFlagsFromExtraConfOrDatabase( filename,
+                                                             client_data )
     if not results.get( 'flags_ready', True ):
       return [], filename
 
     return self._ParseFlagsFromExtraConfOrDatabase( filename,
                                                     results,
                                                     add_extra_clang_flags,
-                                                    client_data )
+                                                    client_data,
+                                                    source )
+
+
+  def _FlagsSourceModified( self, key ):
+    """Returns True if the compilation database or extra conf file the cached
+    flags for |key| were loaded from was modified since. In that case, all the
+    flags loaded from that file are dropped from the cache and the file itself
+    is reloaded when needed."""
+    with self._sources_lock:
+      source = self._flags_sources.get( key )
+    if not source:
+      return False
+
+    path, mtime = source
+    if self._ModificationTime( path ) == mtime:
+      return False
+
+    LOGGER.info( 'Dropping flags loaded from modified %s', path )
+    with self._sources_lock:
+      for other_key, other_source in list( iteritems( self._flags_sources ) ):
+        if other_source[ 0 ] == path:
+          del self._flags_sources[ other_key ]
+          self.flags_for_file.pop( other_key, None )
+
+    directory, basename = os.path.split( path )
+    if basename == 'compile_commands.json':
+      self.compilation_database_dir_map.pop( directory, None )
+    else:
+      extra_conf_store.ReloadIfModified( path )
+    return True
+
+
+  def _ModificationTime( self, path ):
+    """Returns the modification time of |path|, read from the file system at
+    most once per FLAGS_REVALIDATION_INTERVAL for all the files in its
+    directory."""
+    directory = os.path.dirname( path )
+    now = time.time()
+    with self._sources_lock:
+      checked, mtimes = self._revalidations.get( directory, ( 0, {} ) )
+      if now - checked >= FLAGS_REVALIDATION_INTERVAL:
+        mtimes = {}
+        self._revalidations[ directory ] = ( now, mtimes )
+      if path in mtimes:
+        return mtimes[ path ]
+
+    mtime = GetModificationTime( path )
+    with self._sources_lock:
+      mtimes[ path ] = mtime
+    return mtime
 
 
   def _ParseFlagsFromExtraConfOrDatabase( self,
                                           filename,
                                           results,
                                           add_extra_clang_flags,
-                                          client_data ):
+                                          client_data,
+                                          source ):
     if 'override_filename' in results:
       filename = results[ 'override_filename' ] or filename
 
@@ -165,24 +263,33 @@ class Flags( object ):
 
     if results.get( 'do_cache', True ):
       self.flags_for_file[ filename, client_data ] = sanitized_flags, filename
+      if source:
+        with self._sources_lock:
+          self._flags_sources[ filename, client_data ] = source
 
     return sanitized_flags, filename
 
 
   def _GetFlagsFromExtraConfOrDatabase( self, filename, client_data ):
+    """Returns a ( results, source ) tuple where source is a ( path,
+    modification time ) tuple of the file the flags were loaded from, or
+    None."""
     # Load the flags from the extra conf file if one is found and is not global.
     module = extra_conf_store.ModuleForSourceFile( filename )
     if module and not extra_conf_store.IsGlobalExtraConfModule( module ):
-      return _CallExtraConfFlagsForFile( module, filename, client_data )
+      return ( _CallExtraConfFlagsForFile( module, filename, client_data ),
+               _ExtraConfSource( module ) )
 
     # Load the flags from the compilation database if any.
     database = self.LoadCompilationDatabase( filename )
     if database:
-      return self._GetFlagsFromCompilationDatabase( database, filename )
+      return ( self._GetFlagsFromCompilationDatabase( database, filename ),
+               self._DatabaseSource( database ) )
 
     # Load the flags from the global extra conf if set.
     if module:
-      return _CallExtraConfFlagsForFile( module, filename, client_data )
+      return ( _CallExtraConfFlagsForFile( module, filename, client_data ),
+               _ExtraConfSource( module ) )
 
     # No compilation database and no extra conf found. Warn the user if not
     # already warned.
@@ -190,60 +297,87 @@ class Flags( object ):
       self.no_extra_conf_file_warning_posted = True
       raise NoExtraConfDetected
 
-    return EMPTY_FLAGS
+    return EMPTY_FLAGS, None
+
+
+  def _DatabaseSource( self, database ):
+    directory = database.database_directory
+    mtime = self._database_mtimes.get( directory )
+    if not mtime:
+      return None
+    return os.path.join( directory, 'compile_commands.json' ), mtime
 
 
   def Clear( self ):
     self.flags_for_file.clear()
     self.compilation_database_dir_map.clear()
+    ClearCompilationDatabaseDirectories()
+    with self._sources_lock:
+      self._flags_sources.clear()
+      self._revalidations.clear()
 
 
   def _GetFlagsFromCompilationDatabase( self, database, file_name ):
+    if not database.WaitUntilIndexed( DATABASE_INDEX_WAIT_TIMEOUT ):
+      return { 'flags': [], 'flags_ready': False }
+
     _, file_extension = os.path.splitext( file_name )
 
-    compilation_info = _GetCompilationInfoForFile( database,
-                                                   file_name,
-                                                   file_extension )
+    compile_command = _GetCompilationInfoForFile( database,
+                                                  file_name,
+                                                  file_extension )
 
-    if not compilation_info:
+    if not compile_command:
       # No flags for this file in the database.
       return EMPTY_FLAGS
 
     return {
       'flags': _MakeRelativePathsInFlagsAbsolute(
-        compilation_info.compiler_flags_,
-        compilation_info.compiler_working_dir_ ),
+        _InferDriverMode( compile_command.arguments ),
+        compile_command.directory ),
     }
 
 
   # Return a compilation database object for the supplied path or None if no
   # compilation database is found.
   def LoadCompilationDatabase( self, file_dir ):
-    # We search up the directory hierarchy, to first see if we have a
-    # compilation database already for that path, or if a compile_commands.json
-    # file exists in that directory.
-    for folder in PathsToAllParentFolders( file_dir ):
+    # We search up the directory hierarchy for the closest compile_commands.json
+    # file that can be loaded.
+    folder = FindCompilationDatabaseDirectory( file_dir )
+    while folder:
       # Try/catch to syncronise access to cache
       try:
         return self.compilation_database_dir_map[ folder ]
       except KeyError:
         pass
 
-      compile_commands = os.path.join( folder, 'compile_commands.json' )
-      if os.path.exists( compile_commands ):
-        database = ycm_core.CompilationDatabase( folder )
+      # Read before loading so that changes made while loading are seen by
+      # _FlagsSourceModified.
+      mtime = GetModificationTime( os.path.join( folder,
+                                                 'compile_commands.json' ) )
+      database = CompilationDatabase( folder )
+
+      if database.DatabaseSuccessfullyLoaded():
+        self._database_mtimes[ folder ] = mtime
+        self.compilation_database_dir_map[ folder ] = database
+        return database
 
-        if database.DatabaseSuccessfullyLoaded():
-          self.compilation_database_dir_map[ folder ] = database
-          return database
+      # Look for a database in the parent folders instead.
+      parent = os.path.dirname( folder )
+      if parent == folder:
+        break
+      folder = FindCompilationDatabaseDirectory( parent )
 
     # Nothing was found. No compilation flags are available.
-    # Note: we cache the fact that none was found for this folder to speed up
-    # subsequent searches.
-    self.compilation_database_dir_map[ file_dir ] = None
     return None
 
 
+def _ExtraConfSource( module ):
+  module_file = getattr( module, '__file__', None )
+  mtime = getattr( module, 'ycm_extra_conf_mtime', None )
+  return ( module_file, mtime ) if module_file and mtime else None
+
+
 def _ExtractFlagsList( flags_for_file_output ):
   return [ ToUnicode( x ) for x in flags_for_file_output[ 'flags' ] ]
 
@@ -659,11 +793,89 @@ def _MakeRelativePathsInFlagsAbsolute( flags, working_directory ):
 # supplied file. If the source file is a header, try and find an appropriate
 # source file and return the compilation_info for that.
 def _GetCompilationInfoForFile( database, file_name, file_extension ):
-  # Ask the database for the flags.
-  compilation_info = database.GetCompilationInfoForFile( file_name )
-  if compilation_info.compiler_flags_:
-    return compilation_info
-  return None
+  """Returns the CompileCommand for |file_name| in |database|. A file without a
+  command, typically a header, borrows the command of a source file with the
+  same name in the same directory, or else of a file in the closest
+  directory."""
+  compile_command = database.GetCompileCommand( file_name )
+  if compile_command:
+    return compile_command
+
+  directory = os.path.dirname( file_name )
+  candidates = database.FilenamesInDirectory( directory )
+  if not candidates:
+    closest_directory = _ClosestDirectory( directory, database.Directories() )
+    if not closest_directory:
+      return None
+    candidates = database.FilenamesInDirectory( closest_directory )
+
+  if file_extension in HEADER_EXTENSIONS:
+    basename = os.path.splitext( file_name )[ 0 ]
+    for extension in SOURCE_EXTENSIONS:
+      source_file = os.path.normcase( basename + extension )
+      if source_file in candidates:
+        candidates = [ source_file ]
+        break
+
+  compile_command = database.GetCompileCommand( candidates[ 0 ] )
+  if not compile_command:
+    return None
+  return _BorrowCompileCommand( compile_command, file_name, file_extension )
+
+
+def _ClosestDirectory( directory, directories ):
+  """Returns the directory among |directories| which shares the longest path
+  prefix with |directory|, or None if |directories| is empty."""
+  components = os.path.normcase( directory ).split( os.sep )
+
+  def CommonLength( other_directory ):
+    length = 0
+    for component, other in zip( components, other_directory.split( os.sep ) ):
+      if component != other:
+        break
+      length += 1
+    return length
+
+  return max( directories, key = CommonLength ) if directories else None
+
+
+def _BorrowCompileCommand( compile_command, file_name, file_extension ):
+  """Adapts |compile_command| to compile |file_name| instead: the source file
+  is replaced by |file_name| and its language flags are dropped. Headers are
+  given the header language of the source file."""
+  language = SOURCE_LANGUAGES.get(
+    os.path.splitext( compile_command.filename )[ 1 ], 'c++' )
+  arguments = []
+  previous_argument = None
+  for argument in compile_command.arguments:
+    if previous_argument == '-x':
+      language = argument
+    elif argument.startswith( '-x' ) and argument != '-x':
+      language = argument[ 2: ]
+    elif argument != '-x':
+      source_file = os.path.normcase( os.path.normpath(
+        os.path.join( compile_command.directory, argument ) ) )
+      arguments.append( file_name if source_file == compile_command.filename
+                        else argument )
+    previous_argument = argument
+
+  if file_extension in HEADER_EXTENSIONS and language in HEADER_LANGUAGES:
+    arguments.extend( [ '-x', HEADER_LANGUAGES[ language ] ] )
+  return CompileCommand( file_name, compile_command.directory, arguments )
+
+
+def _InferDriverMode( arguments ):
+  """Like libclang, tells the driver to behave as the compiler of the command
+  when it is a C++ compiler or cl."""
+  if ( not arguments or
+       any( argument.startswith( '--driver-mode=' )
+            for argument in arguments ) ):
+    return arguments
+  if CPP_COMPILER_REGEX.search( arguments[ 0 ] ):
+    return arguments[ :1 ] + [ '--driver-mode=g++' ] + arguments[ 1: ]
+  if CL_COMPILER_REGEX.search( arguments[ 0 ] ):
+    return arguments[ :1 ] + [ '--driver-mode=cl' ] + arguments[ 1: ]
+  return arguments
 
 
 def UserIncludePaths( user_flags, filename ):
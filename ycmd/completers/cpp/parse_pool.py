@@ -0,0 +1,148 @@
+# Copyright (C) 2020 ycmd contributors
+#
+# This file is part of ycmd.
+#
+# ycmd is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ycmd is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ycmd.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+# Not installing aliases from python-future; it's unreliable and slow.
+from builtins import *  # noqa
+
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from future.utils import itervalues
+
+# Lower values are parsed first.
+PRIORITY_CURRENT_BUFFER = 0
+PRIORITY_BACKGROUND = 1
+
+# Number of recent jobs whose time spent in the queue is kept for statistics.
+WAIT_TIMES_TO_KEEP = 100
+
+
+class _ParseJob( object ):
+  def __init__( self, filename, priority, args, sequence ):
+    self.filename = filename
+    self.priority = priority
+    self.args = args
+    self.sequence = sequence
+    self.submit_time = time.time()
+    self.future = Future()
+
+
+class ParsePool( object ):
+  """Runs |parse| on at most |max_workers| threads. |parse| is called as
+  parse( filename, *args ) and its result or exception is given to the future
+  returned by Submit.
+
+  Queued jobs are run by priority, then in submission order. A file is never
+  parsed by two workers at once. Submitting a file that is already queued
+  doesn't queue it twice: the queued job is updated with the new arguments and
+  the higher of the two priorities, and its future is returned."""
+
+  def __init__( self, parse, max_workers ):
+    self._parse = parse
+    self._max_workers = max( max_workers, 1 )
+    self._condition = threading.Condition()
+    # Maps a filename to its queued job.
+    self._queued = {}
+    self._running = set()
+    self._workers = []
+    self._sequence = itertools.count()
+    self._wait_times = deque( maxlen = WAIT_TIMES_TO_KEEP )
+
+
+  def Submit( self, filename, priority, *args ):
+    with self._condition:
+      job = self._queued.get( filename )
+      if job:
+        job.args = args
+        job.priority = min( job.priority, priority )
+      else:
+        job = _ParseJob( filename, priority, args, next( self._sequence ) )
+        self._queued[ filename ] = job
+        self._StartWorkersNoLock()
+      self._condition.notify_all()
+      return job.future
+
+
+  def Cancel( self, filename ):
+    """Drops the queued job for |filename|, if any. A running job is not
+    interrupted."""
+    with self._condition:
+      job = self._queued.pop( filename, None )
+    if job:
+      job.future.cancel()
+
+
+  def Statistics( self ):
+    """Returns a dict with the number of queued and running jobs, the number of
+    workers, and the mean and maximum time in seconds recent jobs spent in the
+    queue."""
+    with self._condition:
+      wait_times = list( self._wait_times )
+      return {
+        'queued': len( self._queued ),
+        'running': len( self._running ),
+        'workers': self._max_workers,
+        'mean_wait_time': ( sum( wait_times ) / len( wait_times )
+                            if wait_times else 0 ),
+        'max_wait_time': max( wait_times ) if wait_times else 0
+      }
+
+
+  def _StartWorkersNoLock( self ):
+    while len( self._workers ) < self._max_workers:
+      worker = threading.Thread( target = self._Work )
+      worker.daemon = True
+      worker.start()
+      self._workers.append( worker )
+
+
+  def _NextJobNoLock( self ):
+    runnable = [ job for job in itervalues( self._queued )
+                 if job.filename not in self._running ]
+    if not runnable:
+      return None
+
+    job = min( runnable, key = lambda job: ( job.priority, job.sequence ) )
+    del self._queued[ job.filename ]
+    self._running.add( job.filename )
+    self._wait_times.append( time.time() - job.submit_time )
+    return job
+
+
+  def _Work( self ):
+    while True:
+      with self._condition:
+        job = self._NextJobNoLock()
+        while job is None:
+          self._condition.wait()
+          job = self._NextJobNoLock()
+
+      try:
+        job.future.set_result( self._parse( job.filename, *job.args ) )
+      except Exception as error:
+        job.future.set_exception( error )
+      finally:
+        with self._condition:
+          self._running.discard( job.filename )
+          self._condition.notify_all()
@@ -0,0 +1,451 @@
+# Copyright (C) 2020 ycmd contributors
+#
+# This file is part of ycmd.
+#
+# ycmd is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ycmd is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ycmd.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+# Not installing aliases from python-future; it's unreliable and slow.
+from builtins import *  # noqa
+
+import hashlib
+import itertools
+import json
+import os
+import stat
+import threading
+import time
+from collections import defaultdict
+
+from future.utils import iteritems, itervalues
+
+from ycmd.utils import ( LOGGER, OnWindows, re, SplitLines, StartThread,
+                         ToBytes, ToUnicode )
+
+# Minimum number of seconds between two checks that the files included by a
+# precompiled preamble were not modified.
+REVALIDATION_INTERVAL = 1
+# Number of seconds before retrying a failed build when the files it includes
+# are unknown.
+FAILED_BUILD_RETRY_INTERVAL = 60
+
+INCLUDE_LINE_REGEX = re.compile(
+  '^\\s*#\\s*(include|import)\\s*(<[^>]+>|"[^"]+")' )
+# Lines that can appear among the #include lines at the start of a file.
+IGNORED_LINE_REGEX = re.compile( '^\\s*(//.*|#\\s*pragma\\s+once\\s*)?$' )
+
+# Maps a language given to the -x flag to the language of its headers.
+HEADER_LANGUAGES = {
+  'c': 'c-header',
+  'c-header': 'c-header',
+  'c++': 'c++-header',
+  'c++-header': 'c++-header',
+  'objective-c': 'objective-c-header',
+  'objective-c-header': 'objective-c-header',
+  'objective-c++': 'objective-c++-header',
+  'objective-c++-header': 'objective-c++-header'
+}
+
+# Languages libclang deduces from the file extension when there is no -x flag.
+# Other extensions are parsed as C++.
+EXTENSION_LANGUAGES = {
+  '.c': 'c',
+  '.h': 'c-header',
+  '.m': 'objective-c',
+  '.mm': 'objective-c++',
+  '.cu': 'cuda',
+  '.cuh': 'cuda'
+}
+
+
+def IncludePrefix( contents ):
+  """Returns a tuple of the #include and #import lines at the start of
+  |contents|, normalized. Blank lines, line comments and #pragma once are
+  skipped; any other line ends the prefix."""
+  prefix = []
+  for line in SplitLines( contents ):
+    match = INCLUDE_LINE_REGEX.match( line )
+    if match:
+      prefix.append( '#{0} {1}'.format( match.group( 1 ), match.group( 2 ) ) )
+    elif not IGNORED_LINE_REGEX.match( line ):
+      break
+  return tuple( prefix )
+
+
+class _Preamble( object ):
+  def __init__( self, key, lines, header_flags ):
+    self.key = key
+    self.lines = lines
+    self.header_flags = header_flags
+    self.lock = threading.Lock()
+    self.pch = None
+    # Maps the files included by the preamble to their modification time when
+    # it was last precompiled.
+    self.dependencies = {}
+    self.last_check = 0
+    self.failed = False
+    self.failure_time = 0
+    self.building = False
+
+
+class PreambleCache( object ):
+  """Shares precompiled preambles between translation units.
+
+  When two files with the same flags start with the same #include lines, these
+  lines are written to a header in |cache_directory| which is precompiled once
+  and then given with -include-pch to the translation units of these files
+  and of any other file sharing them. This saves parsing the headers again for
+  each file and keeping a preamble for each translation unit in memory.
+
+  |build| is called as build( header, pch, flags ) to precompile a header and
+  returns the files it includes; see ClangCompleter.BuildPrecompiledHeader in
+  ycm_core. The precompiled header is named after the flags, the shared lines
+  and the modification times of the included files, and is rebuilt when one of
+  these files is modified. It is reused across ycmd instances.
+
+  Headers are precompiled on a background thread. A file only uses a header
+  that was already built when its translation unit was created: starting to
+  use it later would change the flags of the translation unit and throw it
+  away. A file stops using a header once one of the files it includes is
+  modified, since libclang refuses an outdated precompiled header."""
+
+  def __init__( self, build, cache_directory ):
+    self._build = build
+    self._cache_directory = cache_directory
+    self._lock = threading.Lock()
+    # Maps a hash of flags to a dict mapping filenames to their include prefix.
+    self._prefixes = defaultdict( dict )
+    # Maps a filename to a ( flags, include prefix, preamble, precompiled
+    # header ) tuple. Once a file is known not to use a precompiled header, it
+    # doesn't start using one later, until RemoveFile is called for it.
+    self._files = {}
+    # Maps a preamble key to a _Preamble.
+    self._preambles = {}
+    # Replaced precompiled headers, deleted once no file uses them.
+    self._replaced_headers = set()
+
+
+  def PrecompiledPreambleForFile( self, filename, contents, flags,
+                                  open_files = () ):
+    """Returns the path to the precompiled header to give to the translation
+    unit of |filename| with -include-pch, or None if it shares no preamble.
+    Called when |filename| is parsed; other requests use
+    PrecompiledPreambleInUse. A preamble including one of |open_files| isn't
+    used, since it wouldn't see the unsaved changes to that file."""
+    flags = list( flags )
+    prefix = IncludePrefix( contents )
+    header_language = None
+    if prefix and '-include-pch' not in flags:
+      header_language = _HeaderLanguage( flags, filename )
+
+    with self._lock:
+      file_state = self._files.get( filename )
+      if file_state and file_state[ :2 ] == ( flags, prefix ):
+        preamble, pch = file_state[ 2: ]
+        if pch and self._UsableHeader( preamble, open_files ) != pch:
+          # The rebuilt header isn't used either: the translation unit is
+          # created before it is built.
+          pch = None
+      elif header_language:
+        preamble = self._SharedPreambleNoLock( filename,
+                                               flags,
+                                               _Hash( flags ),
+                                               prefix,
+                                               header_language )
+        pch = preamble and self._UsableHeader( preamble, open_files )
+      else:
+        preamble = pch = None
+      self._files[ filename ] = ( flags, prefix, preamble, pch )
+      self._DeleteReplacedHeadersNoLock()
+    return pch
+
+
+  def PrecompiledPreambleInUse( self, filename, flags ):
+    """Returns the precompiled header that the last call to
+    PrecompiledPreambleForFile gave to the translation unit of |filename| with
+    |flags|, or None if it gave none or the header is outdated."""
+    with self._lock:
+      file_state = self._files.get( filename )
+    if not file_state or file_state[ 0 ] != list( flags ):
+      return None
+    preamble, pch = file_state[ 2: ]
+    if not pch:
+      return None
+    with preamble.lock:
+      if preamble.building or preamble.pch != pch:
+        return None
+    return pch
+
+
+  def RemoveFile( self, filename ):
+    """Forgets whether |filename| uses a preamble, e.g. because its translation
+    unit was deleted. The next translation unit created for it can then use a
+    preamble precompiled in the meantime."""
+    with self._lock:
+      self._files.pop( filename, None )
+      self._DeleteReplacedHeadersNoLock()
+
+
+  def _SharedPreambleNoLock( self,
+                             filename,
+                             flags,
+                             flags_hash,
+                             prefix,
+                             header_language ):
+    """Returns the _Preamble made of the longest prefix that |filename| shares
+    with another file with the same flags, or None."""
+    prefixes = self._prefixes[ flags_hash ]
+    prefixes[ filename ] = prefix
+
+    shared = ()
+    directory = os.path.dirname( filename )
+    for other_filename, other_prefix in iteritems( prefixes ):
+      if other_filename == filename:
+        continue
+      common = _CommonPrefix( prefix, other_prefix )
+      # Quoted includes are first searched in the directory of the file.
+      if os.path.dirname( other_filename ) != directory:
+        common = tuple( itertools.takewhile( lambda line: '"' not in line,
+                                             common ) )
+      if len( common ) > len( shared ):
+        shared = common
+
+    if not shared:
+      return None
+
+    header_flags = list( _RemoveLanguageFlags( flags ) )
+    header_flags.extend( [ '-x', header_language ] )
+    if any( '"' in line for line in shared ):
+      header_flags.extend( [ '-iquote', directory ] )
+
+    key = _Hash( [ header_flags, shared ] )
+    preamble = self._preambles.get( key )
+    if not preamble:
+      preamble = _Preamble( key, shared, header_flags )
+      self._preambles[ key ] = preamble
+    return preamble
+
+
+  def _UsableHeader( self, preamble, open_files ):
+    """Returns the precompiled header of |preamble| if it is up to date and
+    includes none of |open_files|, or None."""
+    pch = self._PrecompiledHeader( preamble )
+    if not pch or any( os.path.normpath( open_file ) in preamble.dependencies
+                       for open_file in open_files ):
+      return None
+    return pch
+
+
+  def _PrecompiledHeader( self, preamble ):
+    """Returns the precompiled header of |preamble|, or None if it isn't up to
+    date. A missing or outdated header is rebuilt in the background. A build
+    that failed is retried once one of the files it included last time is
+    modified, or after FAILED_BUILD_RETRY_INTERVAL seconds if none is known."""
+    with preamble.lock:
+      now = time.time()
+      build = False
+      if ( not preamble.building and
+           now - preamble.last_check >= REVALIDATION_INTERVAL ):
+        preamble.last_check = now
+        if preamble.failed:
+          build = ( not _DependenciesUnchanged( preamble ) or
+                    ( not preamble.dependencies and
+                      now - preamble.failure_time >=
+                      FAILED_BUILD_RETRY_INTERVAL ) )
+        else:
+          if not preamble.pch:
+            self._LoadManifest( preamble )
+          build = not preamble.pch or not _DependenciesUnchanged( preamble )
+        preamble.building = build
+      pch = None if preamble.building or preamble.failed else preamble.pch
+
+    if build:
+      StartThread( self._Precompile, preamble )
+    return pch
+
+
+  def _DeleteReplacedHeadersNoLock( self ):
+    if not self._replaced_headers:
+      return
+    in_use = set( file_state[ 3 ] for file_state in itervalues( self._files ) )
+    for pch in self._replaced_headers - in_use:
+      self._replaced_headers.discard( pch )
+      try:
+        os.remove( pch )
+      except EnvironmentError:
+        pass
+
+
+  def _Path( self, preamble, extension ):
+    return os.path.join( self._cache_directory, preamble.key + extension )
+
+
+  def _LoadManifest( self, preamble ):
+    if not MakePrivateDirectory( self._cache_directory ):
+      return
+    try:
+      with open( self._Path( preamble, '.json' ) ) as manifest_file:
+        manifest = json.load( manifest_file )
+      name = manifest[ 'pch' ]
+      if not _IsPlainFilename( name ):
+        return
+      pch = os.path.join( self._cache_directory, name )
+      if os.path.isfile( pch ):
+        preamble.pch = pch
+        preamble.dependencies = manifest[ 'dependencies' ]
+    except ( EnvironmentError, ValueError, KeyError, TypeError ):
+      pass
+
+
+  def _Precompile( self, preamble ):
+    header = self._Path( preamble, '.h' )
+    # Other ycmd instances may be precompiling the same preamble.
+    temporary_pch = self._Path( preamble, '.{0}.tmp'.format( os.getpid() ) )
+    try:
+      if not MakePrivateDirectory( self._cache_directory ):
+        raise RuntimeError( '{0} is not a private directory'.format(
+          self._cache_directory ) )
+      with open( header, 'w' ) as header_file:
+        header_file.write( '\n'.join( preamble.lines ) + '\n' )
+
+      included_files = self._build( header, temporary_pch,
+                                    preamble.header_flags )
+      dependencies = {}
+      for included_file in included_files:
+        included_file = os.path.normpath( ToUnicode( included_file ) )
+        dependencies[ included_file ] = os.path.getmtime( included_file )
+
+      pch = self._Path(
+        preamble,
+        '-{0}.pch'.format( _Hash( sorted( iteritems( dependencies ) ) ) ) )
+      if os.path.exists( pch ):
+        os.remove( temporary_pch )
+      else:
+        os.rename( temporary_pch, pch )
+
+      with open( self._Path( preamble, '.json' ), 'w' ) as manifest_file:
+        json.dump( { 'pch': os.path.basename( pch ),
+                     'dependencies': dependencies }, manifest_file )
+    except Exception:
+      LOGGER.exception( 'Could not precompile preamble %s', header )
+      pch = None
+      # Retried once one of the files included by the last build is modified.
+      dependencies = { filename: _ModificationTime( filename )
+                       for filename in preamble.dependencies }
+    else:
+      LOGGER.info( 'Precompiled preamble %s for %s', pch,
+                   ', '.join( preamble.lines ) )
+
+    with self._lock:
+      with preamble.lock:
+        old_pch = preamble.pch
+        preamble.pch = pch
+        preamble.dependencies = dependencies
+        preamble.failed = pch is None
+        if preamble.failed:
+          preamble.failure_time = time.time()
+        preamble.building = False
+      # Files given the old header keep it until they are parsed again, so it
+      # is only deleted once no file uses it.
+      if old_pch and old_pch != pch:
+        self._replaced_headers.add( old_pch )
+        self._DeleteReplacedHeadersNoLock()
+
+
+def MakePrivateDirectory( path ):
+  """Creates the directory |path| if it doesn't exist and returns whether it is
+  a directory that only the current user can access. The temporary directory
+  is shared by all users: another user could have created |path| first, or
+  made it a symbolic link."""
+  try:
+    os.makedirs( path, 0o700 )
+  except OSError:
+    pass
+  if OnWindows():
+    return os.path.isdir( path )
+  try:
+    status = os.lstat( path )
+  except OSError:
+    return False
+  private = ( stat.S_ISDIR( status.st_mode ) and
+              status.st_uid == os.getuid() and
+              not stat.S_IMODE( status.st_mode ) & 0o077 )
+  if not private:
+    LOGGER.warning( 'Not sharing preambles: %s is not a private directory',
+                    path )
+  return private
+
+
+def _IsPlainFilename( name ):
+  return ( isinstance( name, str ) and
+           name not in ( '', os.curdir, os.pardir ) and
+           os.path.basename( name ) == name and
+           not ( os.altsep and os.altsep in name ) )
+
+
+def _ModificationTime( filename ):
+  try:
+    return os.path.getmtime( filename )
+  except EnvironmentError:
+    return None
+
+
+def _DependenciesUnchanged( preamble ):
+  return all( _ModificationTime( filename ) == mtime
+              for filename, mtime in iteritems( preamble.dependencies ) )
+
+
+def _HeaderLanguage( flags, filename ):
+  """Returns the language to precompile the headers included by |filename|
+  with, or None if precompiling them isn't supported."""
+  language = None
+  previous_flag = None
+  for flag in flags:
+    if previous_flag == '-x':
+      language = flag
+    elif flag.startswith( '-x' ) and flag != '-x':
+      language = flag[ 2: ]
+    previous_flag = flag
+
+  if language is None:
+    extension = os.path.splitext( filename )[ 1 ]
+    language = EXTENSION_LANGUAGES.get( extension, 'c++' )
+  return HEADER_LANGUAGES.get( language )
+
+
+def _RemoveLanguageFlags( flags ):
+  skip_next = False
+  for flag in flags:
+    if skip_next:
+      skip_next = False
+    elif flag == '-x':
+      skip_next = True
+    elif not flag.startswith( '-x' ):
+      yield flag
+
+
+def _CommonPrefix( first, second ):
+  common = []
+  for first_line, second_line in zip( first, second ):
+    if first_line != second_line:
+      break
+    common.append( first_line )
+  return tuple( common )
+
+
+def _Hash( value ):
+  return hashlib.sha1( ToBytes( json.dumps( value ) ) ).hexdigest()
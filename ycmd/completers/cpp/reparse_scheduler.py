@@ -0,0 +1,103 @@
+# Copyright (C) 2020 ycmd contributors
+#
+# This file is part of ycmd.
+#
+# ycmd is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ycmd is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ycmd.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+# Not installing aliases from python-future; it's unreliable and slow.
+from builtins import *  # noqa
+
+import threading
+import time
+
+from future.utils import iteritems
+
+from ycmd.utils import LOGGER
+
+
+class ReparseScheduler( object ):
+  """Reparses translation units on a background thread once their buffer has
+  been idle for |idle_interval| seconds.
+
+  Each call to Schedule for a file postpones its reparse, so that only the
+  latest contents are parsed once the user stops typing. |reparse| is called
+  as reparse( filename, *args ) with the arguments of the last Schedule call.
+  An |idle_interval| of 0 disables the scheduler."""
+
+  def __init__( self, reparse, idle_interval ):
+    self._reparse = reparse
+    self._idle_interval = idle_interval
+    self._condition = threading.Condition()
+    # Maps a filename to a ( due time, args ) tuple.
+    self._pending = {}
+    self._thread = None
+
+
+  def Schedule( self, filename, *args ):
+    if self._idle_interval <= 0:
+      return
+
+    with self._condition:
+      self._pending[ filename ] = ( time.time() + self._idle_interval, args )
+      if not self._thread:
+        self._thread = threading.Thread( target = self._Run )
+        self._thread.daemon = True
+        self._thread.start()
+      self._condition.notify()
+
+
+  def Cancel( self, filename ):
+    """Drops the pending reparse of |filename|, e.g. because it was just parsed
+    or its buffer was unloaded."""
+    with self._condition:
+      self._pending.pop( filename, None )
+
+
+  def IsPending( self, filename ):
+    with self._condition:
+      return filename in self._pending
+
+
+  def _NextDueFileNoLock( self ):
+    """Returns a ( filename, args, timeout ) tuple. If no reparse is due yet,
+    filename is None and timeout is the number of seconds until the next one is
+    due (None if nothing is pending)."""
+    if not self._pending:
+      return None, None, None
+
+    filename, ( due, args ) = min( iteritems( self._pending ),
+                                   key = lambda item: item[ 1 ][ 0 ] )
+    now = time.time()
+    if due > now:
+      return None, None, due - now
+    del self._pending[ filename ]
+    return filename, args, None
+
+
+  def _Run( self ):
+    while True:
+      with self._condition:
+        filename, args, timeout = self._NextDueFileNoLock()
+        while filename is None:
+          self._condition.wait( timeout )
+          filename, args, timeout = self._NextDueFileNoLock()
+
+      try:
+        self._reparse( filename, *args )
+      except Exception:
+        LOGGER.exception( 'Background reparse of %s failed', filename )
@@ -383,6 +383,10 @@ class JavaCompleter( simple_language_server_completer.SimpleLSPCompleter ):
     return self._java_project_dir
 
 
+  def ProjectDirectoryForFile( self, request_data ):
+    return _FindProjectDir( os.path.dirname( request_data[ 'filepath' ] ) )
+
+
   def _WipeWorkspace( self, request_data, args ):
     with_config = False
     if len( args ) > 0 and '--with-config' in args:
@@ -32,6 +32,7 @@ import logging
 import os
 import queue
 import threading
+import time
 
 from ycmd import extra_conf_store, responses, utils
 from ycmd.completers.completer import Completer, CompletionsCache
@@ -51,6 +52,22 @@ CONNECTION_TIMEOUT         = 5
 # Size of the notification ring buffer
 MAX_QUEUED_MESSAGES = 250
 
+# Methods of the requests sent for the GoTo handlers.
+GOTO_METHODS = {
+  'Declaration': 'textDocument/declaration',
+  'Definition': 'textDocument/definition',
+  'Implementation': 'textDocument/implementation',
+  'References': 'textDocument/references',
+  'TypeDefinition': 'textDocument/typeDefinition',
+}
+
+# Diagnostics response built from the server |diagnostics| for a file whose
+# contents were |contents|.
+ConvertedDiagnostics = collections.namedtuple( 'ConvertedDiagnostics',
+                                               [ 'diagnostics',
+                                                 'contents',
+                                                 'response' ] )
+
 PROVIDERS_MAP = {
   'codeActionProvider': (
     lambda self, request_data, args: self.GetCodeActions( request_data, args )
@@ -130,6 +147,13 @@ class ResponseAbortedException( Exception ):
   pass # pragma: no cover
 
 
+class ResponseCancelledException( Exception ):
+  """Raised by LanguageServerConnection if a request is cancelled by the client
+  before its response is received, e.g. because it was superseded by a newer
+  request."""
+  pass # pragma: no cover
+
+
 class ResponseFailedException( Exception ):
   """Raised by LanguageServerConnection if a request returns an error"""
   pass # pragma: no cover
@@ -164,7 +188,7 @@ class Response( object ):
   the associated response is read, which triggers the |AwaitResponse| method to
   handle the actual response"""
 
-  def __init__( self, response_callback=None ):
+  def __init__( self, response_callback=None, method=None ):
     """In order to receive a callback in the message pump thread context, supply
     a method taking ( response, message ) in |response_callback|. Note that
     |response| is _this object_, not the calling object, and message is the
@@ -172,7 +196,9 @@ class Response( object ):
     users should synchronously wait on AwaitResponse."""
     self._event = threading.Event()
     self._message = None
+    self._cancelled = False
     self._response_callback = response_callback
+    self.method = method
 
 
   def ResponseReceived( self, message ):
@@ -190,18 +216,28 @@ class Response( object ):
     self.ResponseReceived( None )
 
 
+  def Cancel( self ):
+    """Called when the client gives up on the request."""
+    self._cancelled = True
+    self.ResponseReceived( None )
+
+
   def AwaitResponse( self, timeout ):
     """Called by clients to wait synchronously for either a response to be
     received or for |timeout| seconds to have passed.
     Returns the message, or:
         - throws ResponseFailedException if the request fails
         - throws ResponseTimeoutException in case of timeout
+        - throws ResponseCancelledException in case the request is cancelled
         - throws ResponseAbortedException in case the server is shut down."""
     self._event.wait( timeout )
 
     if not self._event.is_set():
       raise ResponseTimeoutException( 'Response Timeout' )
 
+    if self._cancelled:
+      raise ResponseCancelledException( 'Response Cancelled' )
+
     if self._message is None:
       raise ResponseAbortedException( 'Response Aborted' )
 
@@ -214,6 +250,51 @@ class Response( object ):
     return self._message
 
 
+class NotificationQueue( queue.Queue ):
+  """Queue of the notifications received from the server, waiting to be polled
+  by the client.
+
+  Servers can publish diagnostics for a file many times before the client gets
+  a chance to poll them (e.g. for every file in the project when it is loaded),
+  and only the latest set is useful. So only the newest
+  textDocument/publishDiagnostics notification is kept for each URI. It takes
+  the place of the first pending one for that URI, which doesn't need any more
+  room in the queue. Other notifications are kept in order."""
+
+  def _init( self, maxsize ):
+    super( NotificationQueue, self )._init( maxsize )
+    self._diagnostics = {}
+
+
+  def put( self, item, block = True, timeout = None ):
+    with self.mutex:
+      uri = _PublishDiagnosticsUri( item )
+      if uri in self._diagnostics:
+        self._diagnostics[ uri ] = item
+        return
+
+    super( NotificationQueue, self ).put( item, block, timeout )
+
+
+  def _put( self, item ):
+    uri = _PublishDiagnosticsUri( item )
+    if uri is not None:
+      if uri in self._diagnostics:
+        self._diagnostics[ uri ] = item
+        return
+      self._diagnostics[ uri ] = item
+
+    self.queue.append( item )
+
+
+  def _get( self ):
+    item = self.queue.popleft()
+    uri = _PublishDiagnosticsUri( item )
+    if uri is not None:
+      return self._diagnostics.pop( uri )
+    return item
+
+
 class LanguageServerConnection( threading.Thread ):
   """
   Abstract language server communication object.
@@ -310,7 +391,10 @@ class LanguageServerConnection( threading.Thread ):
     self._last_id = 0
     self._responses = {}
     self._response_mutex = threading.Lock()
-    self._notifications = queue.Queue( maxsize=MAX_QUEUED_MESSAGES )
+    self._request_statistics = collections.defaultdict( collections.Counter )
+    self._recording = None
+    self._recording_mutex = threading.Lock()
+    self._notifications = NotificationQueue( maxsize=MAX_QUEUED_MESSAGES )
 
     self._connection_event = threading.Event()
     self._stop_event = threading.Event()
@@ -373,6 +457,7 @@ class LanguageServerConnection( threading.Thread ):
 
 
   def Close( self ):
+    self.StopRecording()
     self.Shutdown()
     try:
       self.join()
@@ -391,13 +476,18 @@ class LanguageServerConnection( threading.Thread ):
       return self._last_id
 
 
-  def GetResponseAsync( self, request_id, message, response_callback=None ):
+  def GetResponseAsync( self,
+                        request_id,
+                        message,
+                        response_callback=None,
+                        method=None ):
     """Issue a request to the server and return immediately. If a response needs
     to be handled, supply a method taking ( response, message ) in
     response_callback. Note |response| is the instance of Response and message
-    is the message received from the server.
+    is the message received from the server. |method| is the method of the
+    request, under which it is counted in RequestStatistics.
     Returns the Response instance created."""
-    response = Response( response_callback )
+    response = Response( response_callback, method )
 
     with self._response_mutex:
       assert request_id not in self._responses
@@ -405,15 +495,53 @@ class LanguageServerConnection( threading.Thread ):
 
     LOGGER.debug( 'TX: Sending message: %r', message )
 
+    self._Record( 'client', message )
     self.WriteData( message )
     return response
 
 
-  def GetResponse( self, request_id, message, timeout ):
+  def GetResponse( self, request_id, message, timeout, method=None ):
     """Issue a request to the server and await the response. See
-    Response.AwaitResponse for return values and exceptions."""
-    response = self.GetResponseAsync( request_id, message )
-    return response.AwaitResponse( timeout )
+    Response.AwaitResponse for return values and exceptions. The request is
+    cancelled if it times out."""
+    response = self.GetResponseAsync( request_id, message, method = method )
+    try:
+      return response.AwaitResponse( timeout )
+    except ResponseTimeoutException:
+      self.CancelRequest( request_id )
+      raise
+
+
+  def CancelRequest( self, request_id ):
+    """Stop waiting for the response to the request |request_id| and ask the
+    server to drop it. Any thread waiting for the response gets a
+    ResponseCancelledException and a late response is ignored. Returns False if
+    the request is no longer pending."""
+    with self._response_mutex:
+      response = self._responses.pop( request_id, None )
+      if response is None:
+        return False
+      if response.method:
+        self._request_statistics[ response.method ][ 'cancelled' ] += 1
+
+    response.Cancel()
+
+    try:
+      self.SendNotification( lsp.CancelRequest( request_id ) )
+    except Exception:
+      LOGGER.exception( 'Failed to cancel request %s', request_id )
+
+    return True
+
+
+  def RequestStatistics( self ):
+    """Returns a dictionary mapping each request method to the number of
+    requests of that method which were completed and cancelled. Only requests
+    issued with a method are counted."""
+    with self._response_mutex:
+      return { method: { 'completed': counts[ 'completed' ],
+                         'cancelled': counts[ 'cancelled' ] }
+               for method, counts in iteritems( self._request_statistics ) }
 
 
   def SendNotification( self, message ):
@@ -421,6 +549,7 @@ class LanguageServerConnection( threading.Thread ):
     no response will be received and nothing is returned."""
     LOGGER.debug( 'TX: Sending notification: %r', message )
 
+    self._Record( 'client', message )
     self.WriteData( message )
 
 
@@ -429,9 +558,53 @@ class LanguageServerConnection( threading.Thread ):
     but still requires no further response from the server."""
     LOGGER.debug( 'TX: Sending response: %r', message )
 
+    self._Record( 'client', message )
     self.WriteData( message )
 
 
+  def StartRecording( self, file_path ):
+    """Record every message exchanged with the server to |file_path|. Each line
+    of the file is a JSON object with the following members:
+      - time: seconds elapsed since the recording started,
+      - sender: 'client' or 'server',
+      - message: the message.
+    The replay server in ycmd/tests/language_server can play these recordings
+    back."""
+    with self._recording_mutex:
+      self._StopRecordingUnderLock()
+      self._recording = open( file_path, 'w' )
+      self._recording_start = time.time()
+
+
+  def StopRecording( self ):
+    with self._recording_mutex:
+      self._StopRecordingUnderLock()
+
+
+  def _StopRecordingUnderLock( self ):
+    if self._recording:
+      self._recording.close()
+      self._recording = None
+
+
+  def _Record( self, sender, message ):
+    # Cheap check first; this is called for every message.
+    if not self._recording:
+      return
+
+    if isinstance( message, bytes ):
+      message = lsp.Parse( message[ message.index( b'\r\n\r\n' ) + 4 : ] )
+
+    with self._recording_mutex:
+      if self._recording:
+        self._recording.write( json.dumps( {
+          'time': time.time() - self._recording_start,
+          'sender': sender,
+          'message': message
+        } ) + '\n' )
+        self._recording.flush()
+
+
   def AwaitServerConnection( self ):
     """Language server completer implementations should call this after starting
     the server and the message pump (Start()) to await successful connection to
@@ -558,6 +731,8 @@ class LanguageServerConnection( threading.Thread ):
     for notifications (unsolicited messages from the server), simply accumulates
     them in a Queue which is polled by the long-polling mechanism in
     LanguageServerCompleter."""
+    self._Record( 'server', message )
+
     if 'id' in message:
       if 'method' in message:
         # This is a server->client request, which requires a response.
@@ -566,9 +741,15 @@ class LanguageServerConnection( threading.Thread ):
         # This is a response to the message with id message[ 'id' ]
         with self._response_mutex:
           message_id = message[ 'id' ]
-          assert message_id in self._responses
-          self._responses[ message_id ].ResponseReceived( message )
-          del self._responses[ message_id ]
+          response = self._responses.pop( message_id, None )
+          if response is None:
+            # The request was cancelled, most likely after timing out.
+            LOGGER.debug( 'Ignoring response to cancelled request %s',
+                          message_id )
+            return
+          if response.method:
+            self._request_statistics[ response.method ][ 'completed' ] += 1
+          response.ResponseReceived( message )
     else:
       # This is a notification
       self._AddNotificationToQueue( message )
@@ -805,7 +986,10 @@ class LanguageServerCompleter( Completer ):
     with self._server_info_mutex:
       self._server_file_state = lsp.ServerFileStateStore()
       self._latest_diagnostics = collections.defaultdict( list )
+      self._converted_diagnostics = {}
+      self._pending_completions = {}
       self._sync_type = 'Full'
+      self._position_encoding = 'utf-16'
       self._initialize_response = None
       self._initialize_event = threading.Event()
       self._on_initialize_complete_handlers = []
@@ -848,7 +1032,8 @@ class LanguageServerCompleter( Completer ):
       try:
         self.GetConnection().GetResponse( request_id,
                                           msg,
-                                          REQUEST_TIMEOUT_INITIALISE )
+                                          REQUEST_TIMEOUT_INITIALISE,
+                                          method = 'shutdown' )
       except ResponseAbortedException:
         # When the language server (heinously) dies handling the shutdown
         # request, it is aborted. Just return - we're done.
@@ -921,12 +1106,35 @@ class LanguageServerCompleter( Completer ):
 
     self._UpdateServerWithFileContents( request_data )
 
+    filepath = request_data[ 'filepath' ]
     request_id = self.GetConnection().NextRequestId()
 
-    msg = lsp.Completion( request_id, request_data, codepoint )
-    response = self.GetConnection().GetResponse( request_id,
-                                                 msg,
-                                                 REQUEST_TIMEOUT_COMPLETION )
+    # A newer completion request for a file supersedes any still in flight for
+    # that file; the client has already given up on it.
+    with self._server_info_mutex:
+      superseded_id = self._pending_completions.get( filepath )
+      self._pending_completions[ filepath ] = request_id
+    if superseded_id is not None:
+      self.GetConnection().CancelRequest( superseded_id )
+
+    msg = lsp.Completion( request_id,
+                          request_data,
+                          codepoint,
+                          self._position_encoding )
+    try:
+      response = self.GetConnection().GetResponse(
+        request_id,
+        msg,
+        REQUEST_TIMEOUT_COMPLETION,
+        method = 'textDocument/completion' )
+    except ResponseCancelledException:
+      # A newer completion request was made for this file. Don't let this
+      # result be reused.
+      return [], True
+    finally:
+      with self._server_info_mutex:
+        if self._pending_completions.get( filepath ) == request_id:
+          del self._pending_completions[ filepath ]
     result = response.get( 'result' ) or []
 
     if isinstance( result, list ):
@@ -993,7 +1201,8 @@ class LanguageServerCompleter( Completer ):
       response = self.GetConnection().GetResponse(
         resolve_id,
         resolve,
-        REQUEST_TIMEOUT_COMPLETION )
+        REQUEST_TIMEOUT_COMPLETION,
+        method = 'completionItem/resolve' )
       item.clear()
       item.update( response[ 'result' ] )
     except ResponseFailedException:
@@ -1061,7 +1270,9 @@ class LanguageServerCompleter( Completer ):
 
       try:
         insertion_text, extra_data, start_codepoint = (
-          _InsertionTextForItem( request_data, item ) )
+          _InsertionTextForItem( request_data,
+                                 item,
+                                 self._position_encoding ) )
       except IncompatibleCompletionException:
         LOGGER.exception( 'Ignoring incompatible completion suggestion %s',
                           item )
@@ -1120,11 +1331,15 @@ class LanguageServerCompleter( Completer ):
     self._UpdateServerWithFileContents( request_data )
 
     request_id = self.GetConnection().NextRequestId()
-    msg = lsp.SignatureHelp( request_id, request_data )
+    msg = lsp.SignatureHelp( request_id,
+                             request_data,
+                             self._position_encoding )
 
-    response = self.GetConnection().GetResponse( request_id,
-                                                 msg,
-                                                 REQUEST_TIMEOUT_COMPLETION )
+    response = self.GetConnection().GetResponse(
+      request_id,
+      msg,
+      REQUEST_TIMEOUT_COMPLETION,
+      method = 'textDocument/signatureHelp' )
 
     result = response[ 'result' ]
     if result is None:
@@ -1164,9 +1379,10 @@ class LanguageServerCompleter( Completer ):
       return responses.BuildDisplayMessageResponse(
           'No diagnostics for current file.' )
 
-    current_column = lsp.CodepointsToUTF16CodeUnits(
+    current_column = lsp.CodepointsToCodeUnits(
         GetFileLines( request_data, current_file )[ current_line_lsp ],
-        request_data[ 'column_codepoint' ] )
+        request_data[ 'column_codepoint' ],
+        self._position_encoding )
     minimum_distance = None
 
     message = 'No diagnostics for current line.'
@@ -1310,6 +1526,14 @@ class LanguageServerCompleter( Completer ):
     self._server_started = True
 
     if self.StartServer( request_data, *args, **kwargs ):
+      if self.user_options[ 'record_language_server_traffic' ]:
+        recording = utils.CreateLogfile(
+          '{}_traffic_'.format( self.GetCompleterName().lower() ) )
+        LOGGER.info( 'Recording %s traffic to %s',
+                     self.GetCompleterName(),
+                     recording )
+        self.GetConnection().StartRecording( recording )
+
       self._SendInitialize( request_data, extra_conf_dir )
 
 
@@ -1348,13 +1572,12 @@ class LanguageServerCompleter( Completer ):
     # polling mechanism.
     filepath = request_data[ 'filepath' ]
     uri = lsp.FilePathToUri( filepath )
-    contents = GetFileLines( request_data, filepath )
     with self._server_info_mutex:
       if uri in self._latest_diagnostics:
-        diagnostics = [ _BuildDiagnostic( contents, uri, diag )
-                        for diag in self._latest_diagnostics[ uri ] ]
-        return responses.BuildDiagnosticResponse(
-          diagnostics, filepath, self.max_diagnostics_to_display )
+        return self._ConvertDiagnosticsUnderLock(
+          request_data,
+          filepath,
+          self._latest_diagnostics[ uri ] )
 
 
   def PollForMessagesInner( self, request_data, timeout ):
@@ -1378,22 +1601,28 @@ class LanguageServerCompleter( Completer ):
       # pending, and in any case they will be handled later.
       return messages
 
+    notifications = []
     try:
       while True:
         if not self.GetConnection():
           # The server isn't running or something. Don't re-poll.
           return False
 
-        notification = self.GetConnection()._notifications.get_nowait()
-        message = self.ConvertNotificationToMessage( request_data,
-                                                     notification )
-
-        if message:
-          messages.append( message )
+        notifications.append(
+          self.GetConnection()._notifications.get_nowait() )
     except queue.Empty:
       # We drained the queue
       pass
 
+    # New diagnostics for a file might have been queued while we were draining
+    # the queue. Only convert the latest ones for each file.
+    for notification in _DropSupersededDiagnostics( notifications ):
+      message = self.ConvertNotificationToMessage( request_data,
+                                                   notification )
+
+      if message:
+        messages.append( message )
+
     return messages
 
 
@@ -1486,16 +1715,12 @@ class LanguageServerCompleter( Completer ):
         return None
 
       with self._server_info_mutex:
-        if filepath in self._server_file_state:
-          contents = utils.SplitLines(
-            self._server_file_state[ filepath ].contents )
-        else:
-          contents = GetFileLines( request_data, filepath )
-      diagnostics = [ _BuildDiagnostic( contents, uri, x )
-                      for x in params[ 'diagnostics' ] ]
+        diagnostics = self._ConvertDiagnosticsUnderLock(
+          request_data,
+          filepath,
+          params[ 'diagnostics' ] )
       return {
-        'diagnostics': responses.BuildDiagnosticResponse(
-          diagnostics, filepath, self.max_diagnostics_to_display ),
+        'diagnostics': diagnostics,
         'filepath': filepath
       }
 
@@ -1516,6 +1741,42 @@ class LanguageServerCompleter( Completer ):
     return None
 
 
+  def _ConvertDiagnosticsUnderLock( self, request_data, filepath, diagnostics ):
+    """Returns the ycmd diagnostics response for the list of LSP |diagnostics|
+    published for |filepath|. Converting thousands of diagnostics is costly, so
+    the response is reused until either the server publishes new diagnostics
+    for the file or the file contents change. The returned list must not be
+    modified."""
+    if filepath in self._server_file_state:
+      contents = self._server_file_state[ filepath ].contents
+    else:
+      contents = GetFileContents( request_data, filepath )
+
+    uri = lsp.FilePathToUri( filepath )
+    converted = self._converted_diagnostics.get( uri )
+    if ( converted is not None and
+         converted.diagnostics is diagnostics and
+         converted.contents == contents ):
+      return converted.response
+
+    # The server usually has the contents of the buffer store, which are
+    # already split.
+    file_buffer = request_data[ 'buffers' ].get( filepath )
+    if file_buffer is not None and file_buffer.contents is contents:
+      lines = file_buffer.lines
+    else:
+      lines = utils.SplitLines( contents )
+    response = responses.BuildDiagnosticResponse(
+      [ _BuildDiagnostic( lines, uri, diag, self._position_encoding )
+        for diag in diagnostics ],
+      filepath,
+      self.max_diagnostics_to_display )
+    self._converted_diagnostics[ uri ] = ConvertedDiagnostics( diagnostics,
+                                                               contents,
+                                                               response )
+    return response
+
+
   def _AnySupportedFileType( self, file_types ):
     for supported in self.SupportedFiletypes():
       if supported in file_types:
@@ -1536,6 +1797,7 @@ class LanguageServerCompleter( Completer ):
 
 
   def _UpdateDirtyFilesUnderLock( self, request_data ):
+    buffers = request_data[ 'buffers' ]
     for file_name, file_data in iteritems( request_data[ 'file_data' ] ):
       if not self._AnySupportedFileType( file_data[ 'filetypes' ] ):
         LOGGER.debug( 'Not updating file %s, it is not a supported filetype: '
@@ -1545,8 +1807,17 @@ class LanguageServerCompleter( Completer ):
                        self.SupportedFiletypes() )
         continue
 
+      # Keep the contents of the buffer store so that they are shared with the
+      # other completers and compared with the next ones immediately.
+      contents = buffers[ file_name ].contents
       file_state = self._server_file_state[ file_name ]
-      action, changes, ranges = file_state.ChangeContents( file_data[ 'contents' ] )
+      action, changes = file_state.ChangeContents(
+        contents,
+        self._sync_type == 'Incremental',
+        self._position_encoding )
+      # The server now has the buffer contents rather than the on-disk ones, so
+      # the file must be re-read once it is no longer dirty.
+      file_state.disk_stat = None
 
       LOGGER.debug( 'Refreshing file %s: State is %s/action %s',
                     file_name,
@@ -1556,14 +1827,11 @@ class LanguageServerCompleter( Completer ):
       if action == lsp.ServerFileState.OPEN_FILE:
         msg = lsp.DidOpenTextDocument( file_state,
                                        file_data[ 'filetypes' ],
-                                       file_data[ 'contents' ] )
+                                       contents )
 
         self.GetConnection().SendNotification( msg )
       elif action == lsp.ServerFileState.CHANGE_FILE:
-        if self._sync_type == "Incremental":
-          msg = lsp.DidChangeTextDocument( file_state, changes, ranges )
-        else:
-          msg = lsp.DidChangeTextDocument( file_state, file_data[ 'contents' ] )
+        msg = lsp.DidChangeTextDocument( file_state, contents, changes )
 
         self.GetConnection().SendNotification( msg )
 
@@ -1582,13 +1850,17 @@ class LanguageServerCompleter( Completer ):
       # the request, we check to see if its on-disk contents match the latest in
       # the server. If they don't, we send an update.
       #
-      # FIXME: This is really inefficient currently, as it reads the entire file
-      # on every update. It might actually be better to close files which have
-      # been saved and are no longer "dirty", though that would likely be less
-      # efficient for downstream servers which cache e.g. AST.
+      # Reading and diffing every such file on every request is expensive, so
+      # we only do it when the file's stat signature (mtime, size, inode)
+      # differs from the one recorded the last time we read it.
       try:
+        disk_stat = _GetFileStatSignature( file_name )
+        if disk_stat == file_state.disk_stat:
+          continue
+
+        # The file can still be removed after its stat was read.
         contents = GetFileContents( request_data, file_name )
-      except IOError:
+      except ( IOError, OSError ):
         LOGGER.exception( 'Error getting contents for open file: %s',
                           file_name )
 
@@ -1601,12 +1873,14 @@ class LanguageServerCompleter( Completer ):
         files_to_purge.append( file_name )
         continue
 
-      action, changes, ranges = file_state.SaveContents( contents )
+      file_state.disk_stat = disk_stat
+
+      action, changes = file_state.SaveContents(
+        contents,
+        self._sync_type == 'Incremental',
+        self._position_encoding )
       if action == lsp.ServerFileState.CHANGE_FILE:
-        if self._sync_type == "Incremental":
-          msg = lsp.DidChangeTextDocument( file_state, changes, ranges )
-        else:
-          msg = lsp.DidChangeTextDocument( file_state, contents )
+        msg = lsp.DidChangeTextDocument( file_state, contents, changes )
         self.GetConnection().SendNotification( msg )
 
     return files_to_purge
@@ -1644,6 +1918,7 @@ class LanguageServerCompleter( Completer ):
       self.GetConnection().SendNotification( msg )
 
     del self._server_file_state[ file_state.filename ]
+    self._converted_diagnostics.pop( lsp.FilePathToUri( file_path ), None )
 
 
   def GetProjectRootFiles( self ):
@@ -1681,6 +1956,18 @@ class LanguageServerCompleter( Completer ):
     return os.path.dirname( request_data[ 'filepath' ] )
 
 
+  def ProjectDirectoryForFile( self, request_data ):
+    """Returns the project directory a server started for the file in
+    |request_data| would operate in, without starting it. This is used to pick
+    the server instance for a file when servers are pooled by project."""
+    extra_conf_dir = None
+    module = extra_conf_store.ModuleForSourceFile( request_data[ 'filepath' ] )
+    if module and not extra_conf_store.IsGlobalExtraConfModule( module ):
+      extra_conf_dir = os.path.dirname( module.__file__ )
+
+    return self.GetProjectDirectory( request_data, extra_conf_dir )
+
+
   def _SendInitialize( self, request_data, extra_conf_dir ):
     """Sends the initialize request asynchronously.
     This must be called immediately after establishing the connection with the
@@ -1717,7 +2004,8 @@ class LanguageServerCompleter( Completer ):
       self._initialize_response = self.GetConnection().GetResponseAsync(
         request_id,
         msg,
-        response_handler )
+        response_handler,
+        method = 'initialize' )
 
 
   def GetTriggerCharacters( self, server_trigger_characters ):
@@ -1746,6 +2034,13 @@ class LanguageServerCompleter( Completer ):
       self._is_completion_provider = (
           'completionProvider' in self._server_capabilities )
 
+      # Servers not supporting the positionEncodings client capability don't
+      # reply with the encoding they chose, and use UTF-16.
+      self._position_encoding = self._server_capabilities.get(
+        'positionEncoding', 'utf-16' )
+      LOGGER.info( 'Language server uses %s position encoding',
+                   self._position_encoding )
+
       if 'textDocumentSync' in self._server_capabilities:
         sync = self._server_capabilities[ 'textDocumentSync' ]
         SYNC_TYPE = [
@@ -1860,8 +2155,9 @@ class LanguageServerCompleter( Completer ):
     request_id = self.GetConnection().NextRequestId()
     response = self.GetConnection().GetResponse(
       request_id,
-      lsp.Hover( request_id, request_data ),
-      REQUEST_TIMEOUT_COMMAND )
+      lsp.Hover( request_id, request_data, self._position_encoding ),
+      REQUEST_TIMEOUT_COMMAND,
+      method = 'textDocument/hover' )
 
     result = response[ 'result' ]
     if result:
@@ -1873,8 +2169,11 @@ class LanguageServerCompleter( Completer ):
     request_id = self.GetConnection().NextRequestId()
     result = self.GetConnection().GetResponse(
       request_id,
-      getattr( lsp, handler )( request_id, request_data ),
-      REQUEST_TIMEOUT_COMMAND )[ 'result' ]
+      getattr( lsp, handler )( request_id,
+                               request_data,
+                               self._position_encoding ),
+      REQUEST_TIMEOUT_COMMAND,
+      method = GOTO_METHODS.get( handler ) )[ 'result' ]
     if not result:
       raise RuntimeError( 'Cannot jump to location' )
     if not isinstance( result, list ):
@@ -1897,11 +2196,13 @@ class LanguageServerCompleter( Completer ):
     else:
       for handler in handlers:
         result = self._GoToRequest( request_data, handler )
-        if len( result ) > 1 or not _CursorInsideLocation( request_data,
-                                                           result[ 0 ] ):
+        if len( result ) > 1 or not _CursorInsideLocation(
+            request_data, result[ 0 ], self._position_encoding ):
           break
 
-    return _LocationListToGoTo( request_data, result )
+    return _LocationListToGoTo( request_data,
+                                result,
+                                self._position_encoding )
 
 
   def GetCodeActions( self, request_data, args ):
@@ -1919,9 +2220,10 @@ class LanguageServerCompleter( Completer ):
         request_id,
         lsp.CodeAction( request_id,
                         request_data,
-                        lsp.Range( request_data ),
+                        lsp.Range( request_data, self._position_encoding ),
                         [] ),
-        REQUEST_TIMEOUT_COMMAND )
+        REQUEST_TIMEOUT_COMMAND,
+        method = 'textDocument/codeAction' )
     else:
 
       def WithinRange( diag ):
@@ -1948,7 +2250,8 @@ class LanguageServerCompleter( Completer ):
                           request_data,
                           matched_diagnostics[ 0 ][ 'range' ],
                           matched_diagnostics ),
-          REQUEST_TIMEOUT_COMMAND )
+          REQUEST_TIMEOUT_COMMAND,
+          method = 'textDocument/codeAction' )
 
       else:
         line_value = request_data[ 'line_value' ]
@@ -1966,13 +2269,15 @@ class LanguageServerCompleter( Completer ):
               },
               'end': {
                 'line': line_num_ls,
-                'character': lsp.CodepointsToUTF16CodeUnits(
+                'character': lsp.CodepointsToCodeUnits(
                   line_value,
-                  len( line_value ) + 1 ) - 1,
+                  len( line_value ) + 1,
+                  self._position_encoding ) - 1,
               }
             },
             [] ),
-          REQUEST_TIMEOUT_COMMAND )
+          REQUEST_TIMEOUT_COMMAND,
+          method = 'textDocument/codeAction' )
 
     return self.CodeActionResponseToFixIts( request_data,
                                             code_actions[ 'result' ] )
@@ -2026,7 +2331,8 @@ class LanguageServerCompleter( Completer ):
   def CodeActionLiteralToFixIt( self, request_data, code_action_literal ):
     return WorkspaceEditToFixIt( request_data,
                                  code_action_literal[ 'edit' ],
-                                 code_action_literal[ 'title' ] )
+                                 code_action_literal[ 'title' ],
+                                 self._position_encoding )
 
 
   def CodeActionCommandToFixIt( self, request_data, code_action_command ):
@@ -2054,10 +2360,16 @@ class LanguageServerCompleter( Completer ):
     request_id = self.GetConnection().NextRequestId()
     response = self.GetConnection().GetResponse(
       request_id,
-      lsp.Rename( request_id, request_data, new_name ),
-      REQUEST_TIMEOUT_COMMAND )
-
-    fixit = WorkspaceEditToFixIt( request_data, response[ 'result' ] )
+      lsp.Rename( request_id,
+                  request_data,
+                  new_name,
+                  self._position_encoding ),
+      REQUEST_TIMEOUT_COMMAND,
+      method = 'textDocument/rename' )
+
+    fixit = WorkspaceEditToFixIt( request_data,
+                                  response[ 'result' ],
+                                  encoding = self._position_encoding )
     if not fixit:
       raise RuntimeError( 'Cannot rename the symbol under cursor.' )
 
@@ -2085,19 +2397,25 @@ class LanguageServerCompleter( Completer ):
       self.AdditionalFormattingOptions( request_data ) )
     request_id = self.GetConnection().NextRequestId()
     if 'range' in request_data:
-      message = lsp.RangeFormatting( request_id, request_data )
+      method = 'textDocument/rangeFormatting'
+      message = lsp.RangeFormatting( request_id,
+                                     request_data,
+                                     self._position_encoding )
     else:
+      method = 'textDocument/formatting'
       message = lsp.Formatting( request_id, request_data )
 
     response = self.GetConnection().GetResponse( request_id,
                                                  message,
-                                                 REQUEST_TIMEOUT_COMMAND )
+                                                 REQUEST_TIMEOUT_COMMAND,
+                                                 method = method )
     filepath = request_data[ 'filepath' ]
     contents = GetFileLines( request_data, filepath )
     chunks = [ responses.FixItChunk( text_edit[ 'newText' ],
                                      _BuildRange( contents,
                                                   filepath,
-                                                  text_edit[ 'range' ] ) )
+                                                  text_edit[ 'range' ],
+                                                  self._position_encoding ) )
                for text_edit in response[ 'result' ] or [] ]
 
     return responses.BuildFixItResponse( [ responses.FixIt(
@@ -2125,7 +2443,8 @@ class LanguageServerCompleter( Completer ):
     fixit = WorkspaceEditToFixIt(
       request_data,
       response[ 0 ][ 'edit' ],
-      unresolved_fixit[ 'title' ] )
+      unresolved_fixit[ 'title' ],
+      self._position_encoding )
     return responses.BuildFixItResponse( [ fixit ] )
 
 
@@ -2157,7 +2476,8 @@ class LanguageServerCompleter( Completer ):
       fixits = [ WorkspaceEditToFixIt(
         request_data,
         e[ 'edit' ],
-        '' ) for e in edits ]
+        '',
+        self._position_encoding ) for e in edits ]
       return responses.BuildFixItResponse( fixits )
 
     return responses.BuildDetailedInfoResponse( json.dumps( command_response,
@@ -2172,9 +2492,11 @@ class LanguageServerCompleter( Completer ):
 
     request_id = self.GetConnection().NextRequestId()
     message = lsp.ExecuteCommand( request_id, command, arguments )
-    response = self.GetConnection().GetResponse( request_id,
-                                                 message,
-                                                 REQUEST_TIMEOUT_COMMAND )
+    response = self.GetConnection().GetResponse(
+      request_id,
+      message,
+      REQUEST_TIMEOUT_COMMAND,
+      method = 'workspace/executeCommand' )
     return response[ 'result' ]
 
 
@@ -2188,6 +2510,21 @@ class LanguageServerCompleter( Completer ):
 
       return 'Initialized'
 
+    def RequestsDescription():
+      connection = self.GetConnection()
+      if not connection:
+        return 'None'
+
+      statistics = connection.RequestStatistics()
+      if not statistics:
+        return 'None'
+
+      return '\n'.join(
+        '{0}: {1} completed, {2} cancelled'.format( method,
+                                                    counts[ 'completed' ],
+                                                    counts[ 'cancelled' ] )
+        for method, counts in sorted( iteritems( statistics ) ) )
+
     return [ responses.DebugInfoItem( 'Server State',
                                       ServerStateDescription() ),
              responses.DebugInfoItem( 'Project Directory',
@@ -2195,7 +2532,38 @@ class LanguageServerCompleter( Completer ):
              responses.DebugInfoItem( 'Settings',
                                       json.dumps( self._settings,
                                                   indent = 2,
-                                                  sort_keys = True ) ) ]
+                                                  sort_keys = True ) ),
+             responses.DebugInfoItem( 'Requests', RequestsDescription() ) ]
+
+
+def _DropSupersededDiagnostics( notifications ):
+  """Returns |notifications| without the diagnostics superseded by later
+  diagnostics for the same file."""
+  latest_diagnostics = {}
+  for index, notification in enumerate( notifications ):
+    uri = _PublishDiagnosticsUri( notification )
+    if uri is not None:
+      latest_diagnostics[ uri ] = index
+
+  return [ notification for index, notification in enumerate( notifications )
+           if latest_diagnostics.get( _PublishDiagnosticsUri( notification ),
+                                      index ) == index ]
+
+
+def _PublishDiagnosticsUri( notification ):
+  """Returns the URI of the file |notification| publishes diagnostics for, or
+  None if it is not a textDocument/publishDiagnostics notification."""
+  if ( isinstance( notification, dict ) and
+       notification.get( 'method' ) == 'textDocument/publishDiagnostics' ):
+    return notification[ 'params' ][ 'uri' ]
+  return None
+
+
+def _GetFileStatSignature( file_name ):
+  """Returns a tuple which changes whenever the on-disk contents of |file_name|
+  are likely to have changed. Raises OSError if the file can't be accessed."""
+  stat = os.stat( file_name )
+  return ( stat.st_mtime, stat.st_size, stat.st_ino )
 
 
 def _DistanceOfPointToRange( point, range ):
@@ -2269,7 +2637,7 @@ def _FixUpCompletionPrefixes( completions,
   return completions
 
 
-def _InsertionTextForItem( request_data, item ):
+def _InsertionTextForItem( request_data, item, encoding = 'utf-16' ):
   """Determines the insertion text for the completion item |item|, and any
   additional FixIts that need to be applied when selecting it.
 
@@ -2304,7 +2672,8 @@ def _InsertionTextForItem( request_data, item ):
   if 'textEdit' in item and item[ 'textEdit' ]:
     text_edit = item[ 'textEdit' ]
     start_codepoint = _GetCompletionItemStartCodepointOrReject( text_edit,
-                                                                request_data )
+                                                                request_data,
+                                                                encoding )
 
     insertion_text = text_edit[ 'newText' ]
 
@@ -2344,7 +2713,8 @@ def _InsertionTextForItem( request_data, item ):
     chunks = [ responses.FixItChunk( e[ 'newText' ],
                                      _BuildRange( contents,
                                                   filepath,
-                                                  e[ 'range' ] ) )
+                                                  e[ 'range' ],
+                                                  encoding ) )
                for e in additional_text_edits ]
 
     fixits = responses.BuildFixItResponse(
@@ -2433,7 +2803,9 @@ def FindOverlapLength( line_value, insertion_text ):
       overlap += 1
 
 
-def _GetCompletionItemStartCodepointOrReject( text_edit, request_data ):
+def _GetCompletionItemStartCodepointOrReject( text_edit,
+                                              request_data,
+                                              encoding = 'utf-16' ):
   edit_range = text_edit[ 'range' ]
 
   # Conservatively rejecting candidates that breach the protocol
@@ -2445,9 +2817,10 @@ def _GetCompletionItemStartCodepointOrReject( text_edit, request_data ):
   file_contents = GetFileLines( request_data, request_data[ 'filepath' ] )
   line_value = file_contents[ edit_range[ 'start' ][ 'line' ] ]
 
-  start_codepoint = lsp.UTF16CodeUnitsToCodepoints(
+  start_codepoint = lsp.CodeUnitsToCodepoints(
     line_value,
-    edit_range[ 'start' ][ 'character' ] + 1 )
+    edit_range[ 'start' ][ 'character' ] + 1,
+    encoding )
 
   if start_codepoint > request_data[ 'start_codepoint' ]:
     raise IncompatibleCompletionException(
@@ -2457,22 +2830,28 @@ def _GetCompletionItemStartCodepointOrReject( text_edit, request_data ):
   return start_codepoint
 
 
-def _LocationListToGoTo( request_data, positions ):
+def _LocationListToGoTo( request_data, positions, encoding = 'utf-16' ):
   """Convert a LSP list of locations to a ycmd GoTo response."""
   try:
     if len( positions ) > 1:
       return [
         responses.BuildGoToResponseFromLocation(
-          *_PositionToLocationAndDescription( request_data, position ) )
+          *_PositionToLocationAndDescription( request_data,
+                                              position,
+                                              encoding ) )
         for position in positions
       ]
     return responses.BuildGoToResponseFromLocation(
-      *_PositionToLocationAndDescription( request_data, positions[ 0 ] ) )
+      *_PositionToLocationAndDescription( request_data,
+                                          positions[ 0 ],
+                                          encoding ) )
   except ( IndexError, KeyError ):
     raise RuntimeError( 'Cannot jump to location' )
 
 
-def _PositionToLocationAndDescription( request_data, position ):
+def _PositionToLocationAndDescription( request_data,
+                                       position,
+                                       encoding = 'utf-16' ):
   """Convert a LSP position to a ycmd location."""
   try:
     filename = lsp.UriToFilePath( position[ 'uri' ] )
@@ -2491,29 +2870,35 @@ def _PositionToLocationAndDescription( request_data, position ):
 
   return _BuildLocationAndDescription( filename,
                                        file_contents,
-                                       position[ 'range' ][ 'start' ] )
+                                       position[ 'range' ][ 'start' ],
+                                       encoding )
 
 
-def _LspToYcmdLocation( file_contents, location ):
+def _LspToYcmdLocation( file_contents, location, encoding = 'utf-16' ):
   """Converts a LSP location to a ycmd one. Returns a tuple of (
      - the contents of the line of |location|
      - the line number of |location|
-     - the byte offset converted from the UTF-16 offset of |location|
+     - the byte offset converted from the offset of |location| in code units of
+       the position |encoding|
   )"""
   line_num = location[ 'line' ] + 1
   try:
     line_value = file_contents[ location[ 'line' ] ]
+    if encoding == 'utf-8':
+      # Already a byte offset.
+      return line_value, line_num, location[ 'character' ] + 1
     return line_value, line_num, utils.CodepointOffsetToByteOffset(
       line_value,
-      lsp.UTF16CodeUnitsToCodepoints( line_value,
-                                      location[ 'character' ] + 1 ) )
+      lsp.CodeUnitsToCodepoints( line_value,
+                                 location[ 'character' ] + 1,
+                                 encoding ) )
   except IndexError:
     # This can happen when there are stale diagnostics in OnFileReadyToParse,
     # just return the value as-is.
     return '', line_num, location[ 'character' ] + 1
 
 
-def _CursorInsideLocation( request_data, location ):
+def _CursorInsideLocation( request_data, location, encoding = 'utf-16' ):
   try:
     filepath = lsp.UriToFilePath( location[ 'uri' ] )
   except lsp.InvalidUriException:
@@ -2529,13 +2914,15 @@ def _CursorInsideLocation( request_data, location ):
   lsp_range = location[ 'range' ]
 
   _, start_line, start_column = _LspToYcmdLocation( file_contents,
-                                                    lsp_range[ 'start' ] )
+                                                    lsp_range[ 'start' ],
+                                                    encoding )
   if ( line < start_line or
        ( line == start_line and column < start_column ) ):
     return False
 
   _, end_line, end_column = _LspToYcmdLocation( file_contents,
-                                                lsp_range[ 'end' ] )
+                                                lsp_range[ 'end' ],
+                                                encoding )
   if ( line > end_line or
        ( line == end_line and column > end_column ) ):
     return False
@@ -2543,27 +2930,34 @@ def _CursorInsideLocation( request_data, location ):
   return True
 
 
-def _BuildLocationAndDescription( filename, file_contents, location ):
+def _BuildLocationAndDescription( filename,
+                                  file_contents,
+                                  location,
+                                  encoding = 'utf-16' ):
   """Returns a tuple of (
     - ycmd Location for the supplied filename and LSP location
     - contents of the line at that location
   )
   Importantly, converts from LSP Unicode offset to ycmd byte offset."""
-  line_value, line, column = _LspToYcmdLocation( file_contents, location )
+  line_value, line, column = _LspToYcmdLocation( file_contents,
+                                                 location,
+                                                 encoding )
   return responses.Location( line, column, filename = filename ), line_value
 
 
-def _BuildRange( contents, filename, r ):
+def _BuildRange( contents, filename, r, encoding = 'utf-16' ):
   """Returns a ycmd range from a LSP range |r|."""
   return responses.Range( _BuildLocationAndDescription( filename,
                                                         contents,
-                                                        r[ 'start' ] )[ 0 ],
+                                                        r[ 'start' ],
+                                                        encoding )[ 0 ],
                           _BuildLocationAndDescription( filename,
                                                         contents,
-                                                        r[ 'end' ] )[ 0 ] )
+                                                        r[ 'end' ],
+                                                        encoding )[ 0 ] )
 
 
-def _BuildDiagnostic( contents, uri, diag ):
+def _BuildDiagnostic( contents, uri, diag, encoding = 'utf-16' ):
   """Return a ycmd diagnostic from a LSP diagnostic."""
   try:
     filename = lsp.UriToFilePath( uri )
@@ -2571,7 +2965,7 @@ def _BuildDiagnostic( contents, uri, diag ):
     LOGGER.debug( 'Invalid URI received for diagnostic' )
     filename = ''
 
-  r = _BuildRange( contents, filename, diag[ 'range' ] )
+  r = _BuildRange( contents, filename, diag[ 'range' ], encoding )
   diag_text = diag[ 'message' ]
   try:
     code = diag[ 'code' ]
@@ -2588,7 +2982,7 @@ def _BuildDiagnostic( contents, uri, diag ):
     kind = lsp.SEVERITY[ diag[ 'severity' ] ].upper() )
 
 
-def TextEditToChunks( request_data, uri, text_edit ):
+def TextEditToChunks( request_data, uri, text_edit, encoding = 'utf-16' ):
   """Returns a list of FixItChunks from a LSP textEdit."""
   try:
     filepath = lsp.UriToFilePath( uri )
@@ -2601,12 +2995,16 @@ def TextEditToChunks( request_data, uri, text_edit ):
     responses.FixItChunk( change[ 'newText' ],
                           _BuildRange( contents,
                                        filepath,
-                                       change[ 'range' ] ) )
+                                       change[ 'range' ],
+                                       encoding ) )
     for change in text_edit
   ]
 
 
-def WorkspaceEditToFixIt( request_data, workspace_edit, text='' ):
+def WorkspaceEditToFixIt( request_data,
+                          workspace_edit,
+                          text = '',
+                          encoding = 'utf-16' ):
   """Converts a LSP workspace edit to a ycmd FixIt suitable for passing to
   responses.BuildFixItResponse."""
 
@@ -2621,13 +3019,14 @@ def WorkspaceEditToFixIt( request_data, workspace_edit, text='' ):
     for uri in sorted( iterkeys( workspace_edit[ 'changes' ] ) ):
       chunks.extend( TextEditToChunks( request_data,
                                        uri,
-                                       workspace_edit[ 'changes' ][ uri ] ) )
+                                       workspace_edit[ 'changes' ][ uri ],
+                                       encoding ) )
   else:
     chunks = []
     for text_document_edit in workspace_edit[ 'documentChanges' ]:
       uri = text_document_edit[ 'textDocument' ][ 'uri' ]
       edits = text_document_edit[ 'edits' ]
-      chunks.extend( TextEditToChunks( request_data, uri, edits ) )
+      chunks.extend( TextEditToChunks( request_data, uri, edits, encoding ) )
   return responses.FixIt(
     responses.Location( request_data[ 'line_num' ],
                         request_data[ 'column_num' ],
@@ -0,0 +1,250 @@
+# Copyright (C) 2020 ycmd contributors
+#
+# This file is part of ycmd.
+#
+# ycmd is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ycmd is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ycmd.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+# Not installing aliases from python-future; it's unreliable and slow.
+from builtins import *  # noqa
+
+import collections
+import threading
+import time
+
+from ycmd import utils
+from ycmd.completers.completer import Completer
+from ycmd.utils import LOGGER
+
+
+class LanguageServerPool( Completer ):
+  """Completer running one instance of a language server completer per project
+  directory, so that files from different projects are handled by a server
+  started in the right project, and switching between projects doesn't restart
+  a server each time.
+
+  Requests are forwarded to the instance for the project directory of the
+  request's file, as returned by the instances' ProjectDirectoryForFile. At
+  most |max_language_server_instances| instances are kept; the least recently
+  used one is shut down to make room for a new one. Instances unused for more
+  than |language_server_idle_timeout| seconds are shut down too, unless that
+  option is 0.
+
+  |completer_factory| is a callable returning a new completer instance. The
+  |resolver| instance is only used to find the project directories of files and
+  never starts a server."""
+
+  def __init__( self, user_options, completer_factory, resolver ):
+    self._completer_factory = completer_factory
+    self._resolver = resolver
+    super( LanguageServerPool, self ).__init__( user_options )
+
+    self._max_instances = user_options[ 'max_language_server_instances' ]
+    self._idle_timeout = user_options[ 'language_server_idle_timeout' ]
+
+    # Guards _instances and _last_used. Project directory -> completer, least
+    # recently used first.
+    self._instances_mutex = threading.Lock()
+    self._instances = collections.OrderedDict()
+    self._last_used = {}
+
+    # Finding the project directory of a file walks the file system, so it is
+    # done once per file until the file is unloaded. Guarded by
+    # _instances_mutex.
+    self._project_directories = {}
+
+
+  def SupportedFiletypes( self ):
+    return self._resolver.SupportedFiletypes()
+
+
+  def _ProjectDirectoryForRequest( self, request_data ):
+    filepath = request_data[ 'filepath' ]
+    with self._instances_mutex:
+      project_directory = self._project_directories.get( filepath )
+    if project_directory is None:
+      project_directory = self._resolver.ProjectDirectoryForFile( request_data )
+      with self._instances_mutex:
+        self._project_directories[ filepath ] = project_directory
+    return project_directory
+
+
+  def _InstanceForRequest( self, request_data, create = True ):
+    project_directory = self._ProjectDirectoryForRequest( request_data )
+    now = time.time()
+
+    with self._instances_mutex:
+      evicted = self._EvictIdleInstancesUnderLock( now, project_directory )
+
+      completer = self._instances.get( project_directory )
+      if completer is None and create:
+        LOGGER.info( 'Creating %s instance for project %s',
+                     self._resolver.GetCompleterName(),
+                     project_directory )
+        completer = self._completer_factory()
+        self._instances[ project_directory ] = completer
+
+      if completer is not None:
+        # Mark as most recently used.
+        self._instances[ project_directory ] = self._instances.pop(
+          project_directory )
+        self._last_used[ project_directory ] = now
+
+      while len( self._instances ) > self._max_instances:
+        evicted.append( self._PopInstanceUnderLock(
+          next( iter( self._instances ) ) ) )
+
+    for evicted_completer in evicted:
+      # Shutting a server down can take a while; don't hold up the request.
+      utils.StartThread( evicted_completer.Shutdown )
+
+    return completer
+
+
+  def _EvictIdleInstancesUnderLock( self, now, project_directory ):
+    if not self._idle_timeout:
+      return []
+
+    return [ self._PopInstanceUnderLock( directory )
+             for directory, last_used in list( self._last_used.items() )
+             if ( directory != project_directory and
+                  now - last_used > self._idle_timeout ) ]
+
+
+  def _PopInstanceUnderLock( self, project_directory ):
+    LOGGER.info( 'Shutting down %s instance for project %s',
+                 self._resolver.GetCompleterName(),
+                 project_directory )
+    del self._last_used[ project_directory ]
+    return self._instances.pop( project_directory )
+
+
+  def _MostRecentlyUsedInstance( self ):
+    with self._instances_mutex:
+      if not self._instances:
+        return None
+      return list( self._instances.values() )[ -1 ]
+
+
+  def ShouldUseNow( self, request_data ):
+    return self._InstanceForRequest( request_data ).ShouldUseNow( request_data )
+
+
+  def ComputeCandidates( self, request_data ):
+    return self._InstanceForRequest( request_data ).ComputeCandidates(
+      request_data )
+
+
+  def ComputeSignatures( self, request_data ):
+    return self._InstanceForRequest( request_data ).ComputeSignatures(
+      request_data )
+
+
+  def DefinedSubcommands( self ):
+    return self._resolver.DefinedSubcommands()
+
+
+  def OnUserCommand( self, arguments, request_data ):
+    return self._InstanceForRequest( request_data ).OnUserCommand(
+      arguments, request_data )
+
+
+  def ResolveFixit( self, request_data ):
+    return self._InstanceForRequest( request_data ).ResolveFixit( request_data )
+
+
+  def OnFileReadyToParse( self, request_data ):
+    return self._InstanceForRequest( request_data ).OnFileReadyToParse(
+      request_data )
+
+
+  def OnBufferVisit( self, request_data ):
+    return self._InstanceForRequest( request_data ).OnBufferVisit(
+      request_data )
+
+
+  def OnBufferUnload( self, request_data ):
+    # Don't start a server just to tell it a file was closed.
+    completer = self._InstanceForRequest( request_data, create = False )
+    with self._instances_mutex:
+      self._project_directories.pop( request_data[ 'filepath' ], None )
+    if completer:
+      completer.OnBufferUnload( request_data )
+
+
+  def OnInsertLeave( self, request_data ):
+    return self._InstanceForRequest( request_data ).OnInsertLeave(
+      request_data )
+
+
+  def OnCurrentIdentifierFinished( self, request_data ):
+    return self._InstanceForRequest( request_data ).OnCurrentIdentifierFinished(
+      request_data )
+
+
+  def GetDiagnosticsForCurrentFile( self, request_data ):
+    return self._InstanceForRequest(
+      request_data ).GetDiagnosticsForCurrentFile( request_data )
+
+
+  def GetDetailedDiagnostic( self, request_data ):
+    return self._InstanceForRequest( request_data ).GetDetailedDiagnostic(
+      request_data )
+
+
+  def PollForMessages( self, request_data ):
+    return self._InstanceForRequest( request_data ).PollForMessages(
+      request_data )
+
+
+  def DebugInfo( self, request_data ):
+    debug_info = self._InstanceForRequest( request_data ).DebugInfo(
+      request_data )
+
+    with self._instances_mutex:
+      project_directories = list( self._instances )
+
+    debug_info[ 'items' ].append( {
+      'key': 'Pooled Projects',
+      'value': '\n'.join( reversed( project_directories ) )
+    } )
+    return debug_info
+
+
+  def Shutdown( self ):
+    with self._instances_mutex:
+      instances = list( self._instances.values() )
+      self._instances.clear()
+      self._last_used.clear()
+
+    for completer in instances:
+      completer.Shutdown()
+
+
+  def ServerIsHealthy( self ):
+    completer = self._MostRecentlyUsedInstance()
+    return completer.ServerIsHealthy() if completer else False
+
+
+  def ServerIsReady( self ):
+    completer = self._MostRecentlyUsedInstance()
+    return completer.ServerIsReady() if completer else False
+
+
+  def SignatureHelpAvailable( self ):
+    completer = self._MostRecentlyUsedInstance() or self._resolver
+    return completer.SignatureHelpAvailable()
@@ -22,17 +22,18 @@ from __future__ import absolute_import
 # Not installing aliases from python-future; it's unreliable and slow.
 from builtins import *  # noqa
 
+import bisect
 import collections
+import difflib
 import os
 import json
 import hashlib
 
-from ycm_core import DiffString
 from ycmd.utils import ( ByteOffsetToCodepointOffset,
+                         CodepointOffsetToByteOffset,
                          pathname2url,
                          ToBytes,
                          ToUnicode,
-                         LineColumnFromByteOffset,
                          unquote,
                          url2pathname,
                          urlparse,
@@ -104,6 +105,19 @@ ITEM_KIND = [
   'TypeParameter',
 ]
 
+# Encodings of the character offsets in positions we support, in order of
+# preference. UTF-16 is the protocol default and the only one servers must
+# support; the others don't require any conversion of ycmd offsets.
+POSITION_ENCODINGS = [
+  'utf-8',
+  'utf-32',
+  'utf-16',
+]
+
+# Maximum number of lines for which the UTF-16 offset table is cached. See
+# _UTF16OffsetTable.
+MAX_UTF16_OFFSET_TABLES = 10000
+
 SEVERITY = [
   None,
   'Error',
@@ -148,56 +162,54 @@ class ServerFileState( object ):
     self.state = ServerFileState.CLOSED
     self.checksum = None
     self.contents = ''
-
-  def ChangeContents( self, contents ):
-    """ return (Action, contents, Ranges) """
+    # Stat signature of the file on disk when its contents were last read. Only
+    # meaningful while the file is open but not dirty in the client.
+    self.disk_stat = None
+    self._lines = None
+
+  def ChangeContents( self, contents, incremental = True, encoding = 'utf-16' ):
+    """Progress the state for a file whose contents are now |contents|. Returns
+    a tuple ( action, changes ) where |action| is one of the Actions to perform
+    and |changes| is the list of LSP TextDocumentContentChangeEvent to send for
+    an incremental change, or None if |incremental| is False or the file has
+    to be opened. Positions in |changes| use the position |encoding|."""
+    lines = None
+    changes = None
     if self.state == ServerFileState.OPEN:
-      changes, change_range = self._DiffContents(contents)
-      if change_range is None: # no change
-        return (ServerFileState.NO_ACTION, contents, None)
+      if contents == self.contents:
+        return ServerFileState.NO_ACTION, None
+
       action = ServerFileState.CHANGE_FILE
-    elif self.state == ServerFileState.CLOSED:
+      if incremental:
+        lines = _SplitLinesKeepEnds( contents )
+        changes = _DiffLines( self._GetLines(), lines, encoding )
+    else:
       self.version = 0
       action = ServerFileState.OPEN_FILE
-      changes = contents
-      change_range = None
 
-    self._SendNewVersion(None, action, contents)
-    return (action, changes, change_range)
+    self._SendNewVersion( None, action, contents )
+    self._lines = lines
+    return action, changes
+
 
-  def SaveContents( self, contents ):
+  def SaveContents( self, contents, incremental = True, encoding = 'utf-16' ):
+    """Same as ChangeContents for a file no longer supplied in the dirty buffers
+    list. Files that are not open are left untouched."""
     # We only need to update if the server state is open
     if self.state != ServerFileState.OPEN:
-      return (ServerFileState.NO_ACTION, contents, None)
-
-    return self.ChangeContents(contents)
-
-  def _DiffContents(self, contents):
-    """ return (contents, Ranges), if no change, return original ("", None) """
-    start, length, changes = DiffString(self.contents, contents)
-    if length == 0 and changes == "": # no change
-      return ("", None)
-
-    old_bytes = ToBytes(self.contents)
-    line, column = LineColumnFromByteOffset(old_bytes, start)
-    line_start = start - (column - 1)
-    line_prefix = old_bytes[line_start:start].decode('utf-8')
-    start_position = Position(line, line_prefix, len(line_prefix) + 1)
-    if length == 0: # add
-      end_position = start_position
-    else: # change or remove
-      end = start + length
-      replaced = old_bytes[start:end]
-      replace_line, replace_column = LineColumnFromByteOffset(replaced, length)
-      end_line = line + replace_line - 1
-      if replace_line == 1: end_column = column + replace_column - 1
-      else: end_column = replace_column
-      end_line_start = start + length - (end_column - 1)
-      end_line_prefix = old_bytes[end_line_start:end].decode('utf-8')
-
-      end_position = Position(end_line, end_line_prefix, len(end_line_prefix) + 1)
-
-    return (changes, {'start': start_position, 'end': end_position})
+      return ServerFileState.NO_ACTION, None
+
+    return self.ChangeContents( contents, incremental, encoding )
+
+
+  def _GetLines( self ):
+    """Returns the stored contents split into lines, including line endings.
+    The split is kept between incremental changes so that only the new contents
+    need to be split when computing the next change."""
+    if self._lines is None:
+      self._lines = _SplitLinesKeepEnds( self.contents )
+    return self._lines
+
 
   def GetDirtyFileAction( self, contents ):
     """Progress the state for a file to be updated due to being supplied in the
@@ -249,6 +261,7 @@ class ServerFileState( object ):
     self.version = self.version + 1
     self.state = ServerFileState.OPEN
     self.contents = contents
+    self._lines = None
 
     return action
 
@@ -257,6 +270,122 @@ class ServerFileState( object ):
     return hashlib.sha1( ToBytes( contents ) )
 
 
+def _SplitLinesKeepEnds( contents ):
+  """Splits the unicode string |contents| on newlines, keeping the line endings.
+  Unlike utils.SplitLines, there is no empty last line when |contents| ends
+  with a newline so that joining the lines gives back |contents|."""
+  lines = contents.split( '\n' )
+  last_line = lines.pop()
+  lines = [ line + '\n' for line in lines ]
+  if last_line:
+    lines.append( last_line )
+  return lines
+
+
+def _CodeUnitsLength( value, encoding ):
+  """Returns the length of the unicode string |value| in code units of the
+  position |encoding|."""
+  if encoding == 'utf-32':
+    return len( value )
+  if encoding == 'utf-8':
+    return len( ToBytes( value ) )
+  return len( value.encode( 'utf-16-le' ) ) // 2
+
+
+def _LinePosition( lines, index, encoding ):
+  """Returns the LSP position of the start of lines[ index ] in the document
+  made of |lines|, or of the end of the document if |index| is len( lines )."""
+  if index == len( lines ) and lines and not lines[ -1 ].endswith( '\n' ):
+    return { 'line': index - 1,
+             'character': _CodeUnitsLength( lines[ -1 ], encoding ) }
+  return { 'line': index, 'character': 0 }
+
+
+def _LineOffsetPosition( lines, index, offset, encoding ):
+  """Returns the LSP position of the codepoint |offset| in lines[ index ]."""
+  line = lines[ index ]
+  if offset == len( line ) and line.endswith( '\n' ):
+    return { 'line': index + 1, 'character': 0 }
+  return { 'line': index,
+           'character': _CodeUnitsLength( line[ : offset ], encoding ) }
+
+
+def _LinesChange( old_lines, new_lines,
+                  old_start, old_end,
+                  new_start, new_end,
+                  encoding ):
+  """Returns the change event replacing old_lines[ old_start : old_end ] with
+  new_lines[ new_start : new_end ]."""
+  if old_end - old_start == 1 and new_end - new_start == 1:
+    # The change is within a single line. Only send the part of it that changed.
+    old_line = old_lines[ old_start ]
+    new_line = new_lines[ new_start ]
+    prefix = len( os.path.commonprefix( [ old_line, new_line ] ) )
+    suffix = 0
+    max_suffix = min( len( old_line ), len( new_line ) ) - prefix
+    while ( suffix < max_suffix and
+            old_line[ -1 - suffix ] == new_line[ -1 - suffix ] ):
+      suffix += 1
+    return {
+      'range': {
+        'start': _LineOffsetPosition( old_lines, old_start, prefix, encoding ),
+        'end': _LineOffsetPosition( old_lines,
+                                    old_start,
+                                    len( old_line ) - suffix,
+                                    encoding ),
+      },
+      'text': new_line[ prefix : len( new_line ) - suffix ]
+    }
+
+  return {
+    'range': {
+      'start': _LinePosition( old_lines, old_start, encoding ),
+      'end': _LinePosition( old_lines, old_end, encoding ),
+    },
+    'text': ''.join( new_lines[ new_start : new_end ] )
+  }
+
+
+def _DiffLines( old_lines, new_lines, encoding = 'utf-16' ):
+  """Returns the list of LSP TextDocumentContentChangeEvent which transform the
+  document |old_lines| into |new_lines|, both as returned by
+  _SplitLinesKeepEnds. There is one change per modified hunk. Changes are
+  ordered from the end of the document to its start so that the range of each
+  change is still valid once the previous ones are applied, as the protocol
+  requires."""
+  # Skip the common leading and trailing lines first. This is cheap and
+  # usually leaves only a few lines for the sequence matcher.
+  prefix = 0
+  max_prefix = min( len( old_lines ), len( new_lines ) )
+  while prefix < max_prefix and old_lines[ prefix ] == new_lines[ prefix ]:
+    prefix += 1
+
+  suffix = 0
+  max_suffix = max_prefix - prefix
+  while ( suffix < max_suffix and
+          old_lines[ -1 - suffix ] == new_lines[ -1 - suffix ] ):
+    suffix += 1
+
+  old_end = len( old_lines ) - suffix
+  new_end = len( new_lines ) - suffix
+  matcher = difflib.SequenceMatcher( None,
+                                     old_lines[ prefix : old_end ],
+                                     new_lines[ prefix : new_end ] )
+
+  changes = []
+  for tag, i1, i2, j1, j2 in reversed( matcher.get_opcodes() ):
+    if tag == 'equal':
+      continue
+    changes.append( _LinesChange( old_lines,
+                                  new_lines,
+                                  prefix + i1,
+                                  prefix + i2,
+                                  prefix + j1,
+                                  prefix + j2,
+                                  encoding ) )
+  return changes
+
+
 def BuildRequest( request_id, method, parameters ):
   """Builds a JSON RPC request message with the supplied ID, method and method
   parameters"""
@@ -293,6 +422,7 @@ def Initialize( request_id, project_directory, settings ):
     'rootUri': FilePathToUri( project_directory ),
     'initializationOptions': settings,
     'capabilities': {
+      'general': { 'positionEncodings': POSITION_ENCODINGS },
       'workspace': { 'applyEdit': True, 'documentChanges': True },
       'textDocument': {
         'codeAction': {
@@ -355,6 +485,10 @@ def Exit():
   return BuildNotification( 'exit', None )
 
 
+def CancelRequest( request_id ):
+  return BuildNotification( '$/cancelRequest', { 'id': request_id } )
+
+
 def Reject( request, request_error, data = None ):
   msg = {
     'error': {
@@ -397,23 +531,26 @@ def DidOpenTextDocument( file_state, file_types, file_contents ):
   } )
 
 
-def DidChangeTextDocument( file_state, file_contents, ranges = None ):
+def DidChangeTextDocument( file_state, file_contents, content_changes = None ):
   # NOTE: Passing `None` for the second argument will send an empty
   # textDocument/didChange notification. It is useful when a LSP server
   # needs to be forced to reparse a file without sending all the changes.
   # More specifically, clangd completer relies on this.
-  change = { 'text': file_contents }
-  if ranges is not None:
-      change['range'] = ranges
+  #
+  # When |content_changes| is supplied, it is the list of incremental changes
+  # returned by ServerFileState.ChangeContents and is sent instead of the whole
+  # contents.
+  if content_changes is None:
+    content_changes = [
+      { 'text': file_contents }
+    ] if file_contents is not None else []
 
   return BuildNotification( 'textDocument/didChange', {
     'textDocument': {
       'uri': FilePathToUri( file_state.filename ),
       'version': file_state.version,
     },
-    'contentChanges': [
-      change,
-    ] if file_contents is not None else [],
+    'contentChanges': content_changes,
   } )
 
 
@@ -426,14 +563,15 @@ def DidCloseTextDocument( file_state ):
   } )
 
 
-def Completion( request_id, request_data, codepoint ):
+def Completion( request_id, request_data, codepoint, encoding = 'utf-16' ):
   return BuildRequest( request_id, 'textDocument/completion', {
     'textDocument': {
       'uri': FilePathToUri( request_data[ 'filepath' ] ),
     },
     'position': Position( request_data[ 'line_num' ],
                           request_data[ 'line_value' ],
-                          codepoint ),
+                          codepoint,
+                          encoding ),
   } )
 
 
@@ -441,41 +579,47 @@ def ResolveCompletion( request_id, completion ):
   return BuildRequest( request_id, 'completionItem/resolve', completion )
 
 
-def SignatureHelp( request_id, request_data ):
+def SignatureHelp( request_id, request_data, encoding = 'utf-16' ):
   return BuildRequest( request_id,
                        'textDocument/signatureHelp',
-                       BuildTextDocumentPositionParams( request_data ) )
+                       BuildTextDocumentPositionParams( request_data,
+                                                        encoding ) )
 
 
-def Hover( request_id, request_data ):
+def Hover( request_id, request_data, encoding = 'utf-16' ):
   return BuildRequest( request_id,
                        'textDocument/hover',
-                       BuildTextDocumentPositionParams( request_data ) )
+                       BuildTextDocumentPositionParams( request_data,
+                                                        encoding ) )
 
 
-def Definition( request_id, request_data ):
+def Definition( request_id, request_data, encoding = 'utf-16' ):
   return BuildRequest( request_id,
                        'textDocument/definition',
-                       BuildTextDocumentPositionParams( request_data ) )
+                       BuildTextDocumentPositionParams( request_data,
+                                                        encoding ) )
 
 
-def Declaration( request_id, request_data ):
+def Declaration( request_id, request_data, encoding = 'utf-16' ):
   return BuildRequest( request_id,
                        'textDocument/declaration',
-                       BuildTextDocumentPositionParams( request_data ) )
+                       BuildTextDocumentPositionParams( request_data,
+                                                        encoding ) )
 
 
-def TypeDefinition( request_id, request_data ):
+def TypeDefinition( request_id, request_data, encoding = 'utf-16' ):
   return BuildRequest( request_id,
                        'textDocument/typeDefinition',
-                       BuildTextDocumentPositionParams( request_data ) )
+                       BuildTextDocumentPositionParams( request_data,
+                                                        encoding ) )
 
 
 
-def Implementation( request_id, request_data ):
+def Implementation( request_id, request_data, encoding = 'utf-16' ):
   return BuildRequest( request_id,
                        'textDocument/implementation',
-                       BuildTextDocumentPositionParams( request_data ) )
+                       BuildTextDocumentPositionParams( request_data,
+                                                        encoding ) )
 
 
 def CodeAction( request_id, request_data, best_match_range, diagnostics ):
@@ -490,7 +634,7 @@ def CodeAction( request_id, request_data, best_match_range, diagnostics ):
   } )
 
 
-def Rename( request_id, request_data, new_name ):
+def Rename( request_id, request_data, new_name, encoding = 'utf-16' ):
   return BuildRequest( request_id, 'textDocument/rename', {
     'textDocument': {
       'uri': FilePathToUri( request_data[ 'filepath' ] ),
@@ -498,32 +642,37 @@ def Rename( request_id, request_data, new_name ):
     'newName': new_name,
     'position': Position( request_data[ 'line_num' ],
                           request_data[ 'line_value' ],
-                          request_data[ 'column_codepoint' ] )
+                          request_data[ 'column_codepoint' ],
+                          encoding )
   } )
 
 
-def BuildTextDocumentPositionParams( request_data ):
+def BuildTextDocumentPositionParams( request_data, encoding = 'utf-16' ):
   return {
     'textDocument': {
       'uri': FilePathToUri( request_data[ 'filepath' ] ),
     },
     'position': Position( request_data[ 'line_num' ],
                           request_data[ 'line_value' ],
-                          request_data[ 'column_codepoint' ] )
+                          request_data[ 'column_codepoint' ],
+                          encoding )
   }
 
 
-def References( request_id, request_data ):
-  request = BuildTextDocumentPositionParams( request_data )
+def References( request_id, request_data, encoding = 'utf-16' ):
+  request = BuildTextDocumentPositionParams( request_data, encoding )
   request[ 'context' ] = { 'includeDeclaration': True }
   return BuildRequest( request_id, 'textDocument/references', request )
 
 
-def Position( line_num, line_value, column_codepoint ):
-  # The API requires 0-based line number and 0-based UTF-16 offset.
+def Position( line_num, line_value, column_codepoint, encoding = 'utf-16' ):
+  # The API requires 0-based line number and 0-based offset in code units of the
+  # negotiated position encoding.
   return {
     'line': line_num - 1,
-    'character': CodepointsToUTF16CodeUnits( line_value, column_codepoint ) - 1
+    'character': CodepointsToCodeUnits( line_value,
+                                        column_codepoint,
+                                        encoding ) - 1
   }
 
 
@@ -536,12 +685,12 @@ def Formatting( request_id, request_data ):
   } )
 
 
-def RangeFormatting( request_id, request_data ):
+def RangeFormatting( request_id, request_data, encoding = 'utf-16' ):
   return BuildRequest( request_id, 'textDocument/rangeFormatting', {
     'textDocument': {
       'uri': FilePathToUri( request_data[ 'filepath' ] ),
     },
-    'range': Range( request_data ),
+    'range': Range( request_data, encoding ),
     'options': FormattingOptions( request_data )
   } )
 
@@ -556,7 +705,7 @@ def FormattingOptions( request_data ):
   return format_options
 
 
-def Range( request_data ):
+def Range( request_data, encoding = 'utf-16' ):
   lines = request_data[ 'lines' ]
 
   start = request_data[ 'range' ][ 'start' ]
@@ -579,8 +728,11 @@ def Range( request_data ):
     end_codepoint = 1
 
   return {
-    'start': Position( start_line_num, start_line_value, start_codepoint ),
-    'end': Position( end_line_num, end_line_value, end_codepoint )
+    'start': Position( start_line_num,
+                       start_line_value,
+                       start_codepoint,
+                       encoding ),
+    'end': Position( end_line_num, end_line_value, end_codepoint, encoding )
   }
 
 
@@ -628,40 +780,96 @@ def Parse( data ):
   return json.loads( ToUnicode( data ) )
 
 
+def CodepointsToCodeUnits( line_value, codepoint_offset, encoding ):
+  """Return the 1-based offset in code units of the position |encoding|
+  equivalent to the 1-based unicode codepoint offset |codepoint_offset| in the
+  Unicode string |line_value|"""
+  if encoding == 'utf-32':
+    return min( codepoint_offset, len( line_value ) + 1 )
+  if encoding == 'utf-8':
+    return CodepointOffsetToByteOffset( line_value, codepoint_offset )
+  return CodepointsToUTF16CodeUnits( line_value, codepoint_offset )
+
+
+def CodeUnitsToCodepoints( line_value, code_unit_offset, encoding ):
+  """Return the 1-based codepoint offset into the unicode string |line_value|
+  equivalent to the 1-based offset |code_unit_offset| in code units of the
+  position |encoding|"""
+  if encoding == 'utf-32':
+    return min( code_unit_offset, len( line_value ) + 1 )
+  if encoding == 'utf-8':
+    return ByteOffsetToCodepointOffset( line_value, code_unit_offset )
+  return UTF16CodeUnitsToCodepoints( line_value, code_unit_offset )
+
+
+# Cache of _UTF16OffsetTable results, keyed by line. As the lines of a buffer
+# version are the keys, the tables of a new version are computed only for the
+# lines that changed, and those of old versions are dropped when the cache is
+# cleared.
+_utf16_offset_tables = {}
+
+
+def _UTF16OffsetTable( line_value ):
+  """Returns None if all the codepoints of |line_value| are encoded as a single
+  UTF-16 code unit, so that offsets are the same in codepoints and code units.
+  Otherwise returns a tuple ( astral, ends ) where |astral| is the sorted list
+  of the 0-based indices of the codepoints encoded as a surrogate pair and
+  |ends| the 0-based code unit offsets just past each of these pairs."""
+  try:
+    return _utf16_offset_tables[ line_value ]
+  except KeyError:
+    pass
+
+  table = None
+  if len( line_value.encode( 'utf-16-le' ) ) != 2 * len( line_value ):
+    astral = [ index for index, character in enumerate( line_value )
+               if ord( character ) > 0xFFFF ]
+    table = ( astral,
+              [ index + count + 2 for count, index in enumerate( astral ) ] )
+
+  if len( _utf16_offset_tables ) >= MAX_UTF16_OFFSET_TABLES:
+    _utf16_offset_tables.clear()
+  _utf16_offset_tables[ line_value ] = table
+  return table
+
+
 def CodepointsToUTF16CodeUnits( line_value, codepoint_offset ):
   """Return the 1-based UTF-16 code unit offset equivalent to the 1-based
   unicode codepoint offset |codepoint_offset| in the Unicode string
   |line_value|"""
-  # Language server protocol requires offsets to be in utf16 code _units_.
-  # Each code unit is 2 bytes.
-  # So we re-encode the line as utf-16 and divide the length in bytes by 2.
+  # Language server protocol requires offsets to be in utf16 code _units_ unless
+  # the server supports another position encoding. Each codepoint is one code
+  # unit, except those outside the Basic Multilingual Plane, which are a
+  # surrogate pair of two code units. Rather than re-encoding the line for each
+  # conversion, we count the surrogate pairs before the offset in the cached
+  # table of the line.
   #
   # Of course, this is a terrible API, but until all the servers support any
   # change out of
   # https://github.com/Microsoft/language-server-protocol/issues/376 then we
   # have to jump through hoops.
-  if codepoint_offset > len( line_value ):
-    return ( len( line_value.encode( 'utf-16-le' ) ) + 2 ) // 2
+  codepoint_offset = min( codepoint_offset, len( line_value ) + 1 )
+  table = _UTF16OffsetTable( line_value )
+  if table is None:
+    return codepoint_offset
 
-  value_as_utf16 = line_value[ : codepoint_offset ].encode( 'utf-16-le' )
-  return len( value_as_utf16 ) // 2
+  astral, _ = table
+  return codepoint_offset + bisect.bisect_left( astral, codepoint_offset )
 
 
 def UTF16CodeUnitsToCodepoints( line_value, code_unit_offset ):
   """Return the 1-based codepoint offset into the unicode string |line_value|
   equivalent to the 1-based UTF-16 code unit offset |code_unit_offset| into a
   UTF-16 encoded version of |line_value|"""
-  # As above, LSP returns offsets in utf16 code units. So we convert the line to
-  # UTF16, snip everything up to the code_unit_offset * 2 bytes (each code unit
-  # is 2 bytes), then re-encode as unicode and return the length (in
-  # codepoints).
-  value_as_utf16_bytes = ToBytes( line_value.encode( 'utf-16-le' ) )
-
-  byte_offset_utf16 = code_unit_offset * 2
-  if byte_offset_utf16 > len( value_as_utf16_bytes ):
+  table = _UTF16OffsetTable( line_value )
+  if table is None:
+    return min( code_unit_offset, len( line_value ) + 1 )
+
+  astral, ends = table
+  if code_unit_offset > len( line_value ) + len( astral ):
     # If the offset points off the end of the string, then the codepoint offset
     # is one-past-the-end of the string in unicode codepoints
     return len( line_value ) + 1
 
-  bytes_included = value_as_utf16_bytes[ : code_unit_offset * 2 ]
-  return len( bytes_included.decode( 'utf-16-le' ) )
+  # Each surrogate pair ending before the offset is a single codepoint.
+  return code_unit_offset - bisect.bisect_right( ends, code_unit_offset )
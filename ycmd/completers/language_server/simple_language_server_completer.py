@@ -103,7 +103,7 @@ class SimpleLSPCompleter( lsc.LanguageServerCompleter ):
       return utils.ProcessIsRunning( self._server_handle )
 
   def PopenKwargs( self ):
-      return { 'env': self.GetServerEnvironment }
+      return { 'env': self.GetServerEnvironment() }
 
   def StartServer( self, request_data ):
     with self._server_state_mutex:
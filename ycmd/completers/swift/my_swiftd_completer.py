@@ -29,7 +29,7 @@ standard_library.install_aliases()
 
 from ycm_core import DiffString
 from ycmd.utils import ToBytes, ToUnicode, LineColumnFromByteOffset, ProcessIsRunning
-from ycmd.completers.completer import Completer
+from ycmd.completers.completer import Completer, CompletionsCache
 from ycmd.completers.completer_utils import GetFileContents
 from ycmd import responses, utils, hmac_utils
 from ycmd import extra_conf_store
@@ -38,6 +38,7 @@ from io import BytesIO
 import json
 import logging
 from subprocess import PIPE
+import queue
 import sys
 import os
 import threading
@@ -48,6 +49,20 @@ import re
 import time
 header_pattern = re.compile(rb'(\S+)\s*:\s*(\S+)')
 
+# All timeout values are in seconds
+REQUEST_TIMEOUT = 30
+DIAGNOSTICS_TIMEOUT = 10
+# diagnostics are polled with exponential backoff between these intervals,
+# unless a document update notification comes first
+DIAGNOSTICS_MIN_POLL_INTERVAL = 0.1
+DIAGNOSTICS_MAX_POLL_INTERVAL = 2
+# cached flags are checked against their extra conf and dependencies at most
+# once per interval
+FLAGS_CHECK_INTERVAL = 2
+
+DIAGNOSTIC_STAGE_PARSE = "source.diagnostic.stage.swift.parse"
+DOCUMENT_UPDATE_NOTIFICATION = "source.notification.editor.documentupdate"
+
 # BINARY_NOT_FOUND_MESSAGE = ( 'The specified sourceKitten {0} ' +
 #                              'was not found. Did you specify it correctly?' )
 # LOGFILE_FORMAT = 'swift_{port}_{std}_'
@@ -63,26 +78,369 @@ PATH_TO_SOURCEKITTEN = os.path.abspath( os.path.join(
 def ShouldEnableSwiftCompleter():
     return os.path.exists(PATH_TO_SOURCEKITTEN)
 
+
+class PendingResponse(object):
+    """A request sent to the daemon, waiting for its response. |slot| is the
+    semaphore serializing the request with the others, if any"""
+    def __init__(self, request_id, slot=None):
+        self.request_id = request_id
+        self.serialized = slot is not None
+        self._slot = slot
+        self._event = threading.Event()
+        self._response = None
+
+    def ReleaseSlot(self):
+        """let the next serialized request be sent. called once the request is
+        no longer pending"""
+        slot, self._slot = self._slot, None
+        if slot:
+            slot.release()
+
+    def ResponseReceived(self, response):
+        """called by the reader thread. response is None when the daemon
+        exits"""
+        self._response = response
+        self._event.set()
+
+    def AwaitResponse(self, timeout):
+        """return the response, or None on timeout or when the daemon exits"""
+        if not self._event.wait(timeout):
+            return None
+        return self._response
+
+
+class SourceKittenDaemon(object):
+    """a sourcekitten daemon process and the files open in it.
+    requests are pipelined: the reader thread dispatches each response to the
+    PendingResponse with the same id, so requests don't wait for each other.
+    a response without an id can't be matched to its request, so requests are
+    serialized until the daemon answers with an id, and for good when it
+    answers without one"""
+    def __init__(self, name, binary_path):
+        self.name = name
+        self._binary_path = binary_path
+        # Used to ensure that starting/stopping of the daemon is synchronized.
+        # also guards source_repository and open_modules
+        self.state_mutex = threading.RLock()
+        self.source_repository = {} # open files
+        self.open_modules = {}
+        # the modules assigned to the daemon by SwiftCompleter
+        self.modules = set()
+        # the codecomplete session open in the daemon: completions at the same
+        # offset with the same text before it only update its filter text.
+        # completion_mutex keeps the session requests in order.
+        self.completion_mutex = threading.Lock()
+        self.completion_session = None
+        # _pending_mutex guards _request_id and _pending_responses,
+        # _write_mutex only keeps the packages written whole.
+        self._request_id = 0
+        self._pending_mutex = threading.Lock()
+        self._pending_responses = {}
+        # whether the daemon echoes the request ids, None until its first
+        # response. while it isn't True, requests hold _request_slot until
+        # their response arrives, and _late_responses counts the serialized
+        # requests given up before their response, which is then ignored.
+        self._echoes_ids = None
+        self._request_slot = threading.BoundedSemaphore(1)
+        self._late_responses = 0
+        self._write_mutex = threading.Lock()
+        self._server_handle = None # type: subprocess.Popen
+        self._server_stderr = None
+
+    def Start(self):
+        with self.state_mutex:
+            if self._server_handle:
+                return
+            LOGGER.info(f'Starting {self.name}...')
+            self.source_repository = {}
+            self.open_modules = {}
+            self.completion_session = None
+            with self._pending_mutex:
+                self._echoes_ids = None
+                self._request_slot = threading.BoundedSemaphore(1)
+                self._late_responses = 0
+            self._server_stderr = utils.CreateLogfile( 'SwiftD_stderr_' )
+            with utils.OpenForStdHandle( self._server_stderr ) as stderr:
+                self._server_handle = utils.SafePopen(
+                    [self._binary_path, "daemon"],
+                    env = ({"SOURCEKIT_LOGGING": "3"}
+                           if LOGGER.isEnabledFor( logging.DEBUG ) else None),
+                    stdin = PIPE, stdout = PIPE,
+                    stderr = stderr) # type: subprocess.Popen
+            utils.StartThread(self._ReadResponses, self._server_handle)
+
+    def Stop(self):
+        with self.state_mutex:
+            if not self.IsRunning():
+                LOGGER.info(f'{self.name} not running')
+                return
+            LOGGER.info(f'Stopping {self.name} '
+                        f'with PID {self._server_handle.pid}')
+
+            try:
+                for filename, file_state in self.source_repository.items():
+                    file_state['parse_id'] += 1 # cancel waiting parsing
+                    file_state['diag_event'].set()
+                    file_state['diag_ready'].set()
+                    if self.IsHealthy():
+                        # not awaited: the daemon is ending, and the reader
+                        # thread resolves the pending requests when it exits
+                        self.requestAsync("source.request.editor.close", {
+                            "key.sourcefile": filename,
+                            "key.name": filename,
+                        })
+
+                if self.IsHealthy():
+                    self._SendNotification("end")
+                    # stdout is read by the reader thread until the daemon exits
+                    self._server_handle.stdin.close()
+                self._server_handle.wait()
+            except Exception:
+                LOGGER.exception(f'Error while stopping {self.name}')
+                if self.IsHealthy():
+                    return
+            try:
+                self._server_handle.stdin.close()
+            except OSError:
+                pass # the daemon exited with unread input
+            self._server_handle = None
+
+    def IsRunning(self):
+        """the daemon was started and not stopped"""
+        return self._server_handle is not None
+
+    def IsHealthy(self):
+        return ProcessIsRunning(self._server_handle)
+
+    def EnsureHealthy(self):
+        """start the daemon, or restart it when its process exited"""
+        with self.state_mutex:
+            if self.IsRunning() and not self.IsHealthy():
+                LOGGER.warning(f'{self.name} exited, restarting it')
+                self.Stop()
+            self.Start()
+
+    def DebugInfoServer(self):
+        with self._pending_mutex:
+            pending = len(self._pending_responses)
+        return responses.DebugInfoServer(
+          name = self.name,
+          handle = self._server_handle,
+          executable = self._binary_path,
+          logfiles = [ self._server_stderr ],
+          extras = [
+            responses.DebugInfoItem( key = 'modules',
+                                     value = len( self.modules ) ),
+            responses.DebugInfoItem( key = 'open files',
+                                     value = len( self.source_repository ) ),
+            responses.DebugInfoItem( key = 'pending requests',
+                                     value = pending ),
+          ]
+        )
+
+    def request(self, name, requestObject, timeout=REQUEST_TIMEOUT):
+        return self.requestAwait(self.requestAsync(name, requestObject),
+                                 timeout)
+
+    def requestAsync(self, name, requestObject):
+        """send the request, return a PendingResponse for requestAwait"""
+        request  = json.dumps(requestObject, ensure_ascii=False)
+        # sourcekitd only support direct name, can't ecode as json string
+        request = "{key.request: " + name + "," + request[1:]
+        return self._SendRequestAsync("yaml", request)
+
+    def requestAwait(self, pending, timeout=REQUEST_TIMEOUT):
+        return self._AwaitResponse(pending, timeout).get("result")
+
+    def _SendNotification(self, method, params=None):
+        r = {"method": method}
+        if params:
+            r["params"] = params
+
+        d = json.dumps(r).encode()
+        LOGGER.info(f"send notification len({len(d)}): {method}")
+        self._writePackage(d)
+
+    def _SendRequest(self, method, params=None, timeout=REQUEST_TIMEOUT):
+        return self._AwaitResponse(self._SendRequestAsync(method, params),
+                                   timeout)
+
+    def _SendRequestAsync(self, method, params=None):
+        """send the request without waiting for its response. return the
+        PendingResponse to pass to _AwaitResponse"""
+        with self._pending_mutex:
+            slot = None if self._echoes_ids else self._request_slot
+        if slot and not slot.acquire(timeout=REQUEST_TIMEOUT):
+            LOGGER.error(f"{self.name} doesn't answer, not sending {method}")
+            pending = PendingResponse(None)
+            pending.ResponseReceived(None)
+            return pending
+
+        with self._pending_mutex:
+            self._request_id += 1
+            pending = PendingResponse(self._request_id, slot)
+            self._pending_responses[pending.request_id] = pending
+
+        r = {"id": pending.request_id, "method": method}
+        if params:
+            r["params"] = params
+
+        d = json.dumps(r).encode()
+        LOGGER.debug(f"send request len({len(d)}): {d}")
+        try:
+            self._writePackage(d)
+        except (AttributeError, OSError, ValueError):
+            LOGGER.exception( 'Error while sending request' )
+            self._DropPendingResponse(pending)
+            pending.ResponseReceived(None)
+        return pending
+
+    def _AwaitResponse(self, pending, timeout=REQUEST_TIMEOUT):
+        r = pending.AwaitResponse(timeout)
+        if r is None:
+            LOGGER.error(f"no response for request {pending.request_id}")
+            self._DropPendingResponse(pending, response_expected=True)
+            return {}
+        return r
+
+    def _DropPendingResponse(self, pending, response_expected=False):
+        """stop waiting for the response of pending. when |response_expected|,
+        the daemon may still answer it"""
+        with self._pending_mutex:
+            dropped = self._pending_responses.pop(pending.request_id, None)
+            if dropped and dropped.serialized and response_expected:
+                self._late_responses += 1
+        if dropped:
+            dropped.ReleaseSlot()
+
+    def _writePackage(self, data):
+        with self._write_mutex:
+            self._server_handle.stdin.write(
+                b'Content-Length:%d\r\n\r\n' % (len(data)))
+            self._server_handle.stdin.write(data)
+            self._server_handle.stdin.flush()
+
+    def _ReadResponses(self, server_handle):
+        """reader thread: dispatch the responses of server_handle until it
+        exits"""
+        while True:
+            r = ReadPackage(server_handle.stdout)
+            if r is None:
+                break
+            if isinstance(r, dict) and "method" in r and "id" not in r:
+                self._HandleNotification(r)
+                continue
+
+            error = None
+            if isinstance(r, dict):
+                error = r.get("error")
+            if error:
+                LOGGER.error(f"response error: {error}")
+            else:
+                LOGGER.debug(f"get response: {r}")
+
+            pending = self._PopPendingResponse(r)
+            if pending:
+                pending.ReleaseSlot()
+                pending.ResponseReceived(r)
+
+        LOGGER.info(f"{self.name} stdout closed")
+        with self._pending_mutex:
+            pending_responses = list(self._pending_responses.values())
+            self._pending_responses.clear()
+        for pending in pending_responses:
+            pending.ReleaseSlot()
+            pending.ResponseReceived(None)
+
+    def _PopPendingResponse(self, response):
+        """return the PendingResponse answered by |response|, or None"""
+        request_id = None
+        if isinstance(response, dict):
+            request_id = response.get("id")
+        with self._pending_mutex:
+            if request_id is not None:
+                self._echoes_ids = True
+            elif self._echoes_ids:
+                LOGGER.warning("ignore response without id")
+                return None
+            else:
+                # requests are serialized, so the response is for the one in
+                # flight, unless it is late for a request given up before.
+                self._echoes_ids = False
+                if self._late_responses:
+                    self._late_responses -= 1
+                    LOGGER.warning("ignore late response without id")
+                    return None
+                if self._pending_responses:
+                    request_id = min(self._pending_responses)
+            pending = self._pending_responses.pop(request_id, None)
+        if pending is None:
+            LOGGER.warning(f"ignore response to unknown request {request_id}")
+        return pending
+
+    def _HandleNotification(self, notification):
+        """wake the diagnostics waiter of a document updated by sourcekitd"""
+        params = notification.get("params")
+        if not isinstance(params, dict):
+            return
+        if params.get("key.notification") != DOCUMENT_UPDATE_NOTIFICATION:
+            return
+
+        # not under state_mutex: the reader thread must not wait for a thread
+        # which may be waiting for a response. the lookup is atomic, and
+        # waking the waiter of previous contents is harmless.
+        file_state = self.source_repository.get(params.get("key.name"))
+        if file_state:
+            file_state['diag_event'].set()
+
+
+class CompletionSessionCache( CompletionsCache ):
+  """completions are filtered by the daemon with the query of the request
+  which computed them, so they are only valid for queries extending it"""
+
+  def _CacheValidNoLock( self, request_data ):
+    return ( super()._CacheValidNoLock( request_data ) and
+             request_data[ 'query' ].startswith(
+               self._request_data[ 'query' ] ) )
+
+
 class SwiftCompleter( Completer ):
   """
   A Completer that uses the SourceKitten.
   https://github.com/jpsim/SourceKitten
+
+  Files are dispatched to a pool of at most |max_swift_daemon_instances|
+  daemons by module, so a module being typechecked doesn't hold up the
+  requests of the others. Daemons are started when a module is first
+  assigned to them.
   """
 
   def __init__( self, user_options ):
     super().__init__( user_options )
     self.max_diagnostics_to_display = user_options[ 'max_diagnostics_to_display' ]
-    self._big_cache = []
+    self._completions_cache = CompletionSessionCache()
 
+    # filename -> {'flags', 'dependencies', 'mtimes', 'checked'}. extra conf
+    # calls are serialized by _flags_mutex
     self._flags_for_file = {}
+    self._flags_mutex = threading.RLock()
+    self._flags_warm_up_files = set()
     self._extra_conf_storage = {}
-    self._source_repository = {} # open files
-    self._open_modules = {}
-    self._request_id = 0
-    # Used to ensure that starting/stopping of the server is synchronized
+    # Used to ensure that starting/stopping of the daemons is synchronized
     self._server_state_mutex = threading.RLock()
-    self._server_handle = None # type: subprocess.Popen
     self._sourcekitten_binary_path = PATH_TO_SOURCEKITTEN
+    self._daemons = [
+      SourceKittenDaemon(f"SourceKitten daemon {index + 1}",
+                         self._sourcekitten_binary_path)
+      for index in range(max(user_options[ 'max_swift_daemon_instances' ], 1)) ]
+    # _daemons_mutex guards the module and open file -> daemon maps. files
+    # stay in the daemon which opened them until they are unloaded.
+    self._daemons_mutex = threading.Lock()
+    self._daemon_for_module = {}
+    self._daemon_for_file = {}
+    # diagnostics computed after OnFileReadyToParse returned, for
+    # PollForMessagesInner
+    self._diagnostic_messages = queue.Queue()
     self._StartServer()
 
   def SupportedFiletypes( self ):
@@ -91,100 +449,50 @@ class SwiftCompleter( Completer ):
 
   def _StartServer(self, request_data = None):
       with self._server_state_mutex:
-          if self._server_handle: return
-          LOGGER.info( 'Starting SwiftLSP Language Server...' )
-          self._flags_for_file = {}
-          self._extra_conf_storage = {}
-          self._source_repository = {}
-          self._open_modules = {}
-          self._server_stderr = utils.CreateLogfile( 'SwiftD_stderr_' )
-          with utils.OpenForStdHandle( self._server_stderr ) as stderr:
-              self._server_handle = utils.SafePopen(
-                  [self._sourcekitten_binary_path, "daemon"],
-                  env = ({"SOURCEKIT_LOGGING": "3"} if LOGGER.isEnabledFor( logging.DEBUG ) else None),
-                  stdin = PIPE, stdout = PIPE, stderr = stderr) # type: subprocess.Popen
+          if self._ServerIsRunning():
+              return
+          with self._flags_mutex:
+              self._flags_for_file = {}
+              self._flags_warm_up_files = set()
+              self._extra_conf_storage = {}
+          with self._daemons_mutex:
+              self._daemon_for_module = {}
+              self._daemon_for_file = {}
+              for daemon in self._daemons:
+                  daemon.modules = set()
+          self._daemons[0].Start()
 
   def _StopServer(self):
       with self._server_state_mutex:
           LOGGER.info( 'Shutting down SwiftLSP...' )
-          if not self._ServerIsRunning():
-              LOGGER.info( 'SwiftLSP Language server not running' )
-              return
-          LOGGER.info( 'Stopping Swift server with PID {0}'.format(
-              self._server_handle.pid ) )
-
-          try:
-              for filename, file_state in self._source_repository.items():
-                file_state['parse_id'] += 1 # cancel waiting parsing
-                self.request("source.request.editor.close", {
-                    "key.sourcefile": filename,
-                    "key.name": filename,
-                })
-
-              self._SendNotification("end")
-              self._server_handle.communicate()
-          except Exception as e:
-              LOGGER.exception( 'Error while stopping SwiftLSP server' )
-          else:
-              self._server_handle = None
+          for daemon in self._daemons:
+              daemon.Stop()
 
   def _ServerIsRunning(self):
-      return self._server_handle is not None
+      return any(daemon.IsRunning() for daemon in self._daemons)
 
   def _RestartServer( self, request_data ):
     with self._server_state_mutex:
       self._StopServer()
       self._StartServer( request_data )
 
-  def _SendNotification(self, method, params=None):
-      with self._server_state_mutex:
-          r = {"method": method}
-          if params: r["params"] = params
-
-          d = json.dumps(r).encode()
-          LOGGER.info(f"send notification len({len(d)}): {method}")
-          self._writePackage(d)
-
-  def _SendRequest(self, method, params=None):
-      with self._server_state_mutex:
-          self._request_id += 1
-          r = {"id": self._request_id, "method": method}
-          if params: r["params"] = params
-
-          d = json.dumps(r).encode()
-          LOGGER.debug(f"send request len({len(d)}): {d}")
-          self._writePackage(d)
-          #  TODO: 先同步串行, 以后可能改成根据id串行, 且需要比对id
-          return self.__GetResponse()
-
-  def _writePackage(self, data):
-      self._server_handle.stdin.write(b'Content-Length:%d\r\n\r\n'%(len(data)))
-      self._server_handle.stdin.write(data)
-      self._server_handle.stdin.flush()
-
-  def __GetResponse(self):
-    # with self._server_state_mutex:
-    headers = {}
-    while True:
-        line = self._server_handle.stdout.readline()
-        if len(line) < 3: break
-
-        m = header_pattern.search(line)
-        if m: headers[m.group(1)] = m.group(2)
-
-    try:
-        content_length = int(headers[b'Content-Length'])
-        r = json.loads( self._server_handle.stdout.read(content_length))
-        error = None
-        if isinstance(r, dict): error = r.get("error")
-        if error:
-            LOGGER.error(f"response error: {error}")
-        else:
-            LOGGER.debug(f"get response: {r}")
-        return r
-    except (KeyError, ValueError) as e:
-        LOGGER.exception( 'Error while read package' )
-        return {}
+  def _DaemonForFile(self, filename, flags=None):
+      """the daemon of the module of filename, which is started if needed.
+      the module is found from flags, or the flags of filename"""
+      with self._daemons_mutex:
+          daemon = self._daemon_for_file.get(filename)
+      if daemon is None:
+          if flags is None:
+              flags = self.FlagsForFile(filename)
+          module = _ModuleKey(flags)
+          with self._daemons_mutex:
+              daemon = self._daemon_for_module.get(module)
+              if daemon is None:
+                  daemon = min(self._daemons, key=lambda d: len(d.modules))
+                  daemon.modules.add(module)
+                  self._daemon_for_module[module] = daemon
+      daemon.EnsureHealthy()
+      return daemon
 
   def DebugInfo( self, request_data ):
     items = []
@@ -195,30 +503,56 @@ class SwiftCompleter( Completer ):
           key = 'flags', value = '{0}'.format( list( flags ) ) )
         filename_item = responses.DebugInfoItem(
           key = 'translation unit', value = filename )
+        daemon_item = responses.DebugInfoItem(
+          key = 'daemon', value = self._DaemonForFile(filename, flags).name )
         items.append(flags_item)
         items.append(filename_item)
+        items.append(daemon_item)
+    # health check: restart the daemons which exited
+    for daemon in self._daemons:
+        if daemon.IsRunning():
+            daemon.EnsureHealthy()
     return responses.BuildDebugInfoResponse(
       name = "Swift",
-      servers = [
-        responses.DebugInfoServer(
-          name = "Swift Language Server",
-          handle = self._server_handle,
-          executable = self._sourcekitten_binary_path,
-          logfiles = [
-            self._server_stderr,
-          ],
-        )
-      ],
+      servers = [ daemon.DebugInfoServer() for daemon in self._daemons ],
       items = items,
     )
 
   def FlagsForFile(self, filename):
-    try:
-      return self._flags_for_file[ filename ]
-    except KeyError:
-        pass
+    entry = self._flags_for_file.get(filename)
+    if entry is not None and not self._FlagsOutdated(entry):
+        return entry['flags']
+
+    with self._flags_mutex:
+        entry = self._flags_for_file.get(filename)
+        if entry is not None and not self._FlagsOutdated(entry):
+            return entry['flags']
+        flags = self._ComputeFlagsForFile(filename)
+        if filename not in self._flags_for_file:
+            return flags
+
+    self._WarmUpFlags(flags)
+    return flags
 
+  def _FlagsOutdated(self, entry):
+      """the flags are outdated when the extra conf or a dependency it declared
+      changed. files are checked at most once per FLAGS_CHECK_INTERVAL"""
+      now = time.time()
+      if now - entry['checked'] < FLAGS_CHECK_INTERVAL:
+          return False
+      entry['checked'] = now
+      return _ModificationTimes(entry['dependencies']) != entry['mtimes']
+
+  def _ComputeFlagsForFile(self, filename):
+    """call FlagsForSwift of the extra conf, under _flags_mutex"""
+    module_file = extra_conf_store.ModuleFileForSourceFile( filename )
     module = extra_conf_store.ModuleForSourceFile( filename )
+    if module:
+        reloaded = extra_conf_store.ReloadIfModified( module_file )
+        if reloaded is not module:
+            # the storage belongs to the previous version of the conf
+            self._extra_conf_storage.clear()
+            module = reloaded
     if not module or not hasattr(module, 'FlagsForSwift'):
         return [filename]
 
@@ -226,9 +560,44 @@ class SwiftCompleter( Completer ):
                                     store = self._extra_conf_storage )
     flags = response['flags']
     if response.get('do_cache', True):
-        self._flags_for_file[filename] = flags
+        self._StoreFlags(filename, flags, [module_file] +
+                         list(response.get('dependencies', [])))
     return flags
 
+  def _StoreFlags(self, filename, flags, dependencies):
+      self._flags_for_file[filename] = {
+          'flags': flags,
+          'dependencies': dependencies,
+          'mtimes': _ModificationTimes(dependencies),
+          'checked': time.time(),
+      }
+
+  def _WarmUpFlags(self, flags):
+      """compute in background the flags of the other swift files of the
+      module, found in flags, so opening them doesn't wait for the extra conf"""
+      with self._flags_mutex:
+          filenames = [ f for f in flags
+                        if f.endswith('.swift') and
+                        f not in self._flags_warm_up_files and
+                        f not in self._flags_for_file ]
+          if not filenames:
+              return
+          self._flags_warm_up_files.update(filenames)
+      utils.StartThread(self._WarmUpFlagsInBackground, filenames)
+
+  def _WarmUpFlagsInBackground(self, filenames):
+      for filename in filenames:
+          if not os.path.isfile(filename):
+              continue
+          try:
+              with self._flags_mutex:
+                  if filename in self._flags_for_file:
+                      continue
+                  self._ComputeFlagsForFile(filename)
+          except Exception:
+              LOGGER.exception(
+                  f"error while computing the flags for {filename}")
+
   def RequestDataExtract(self, request_data, current=False):
       filename = request_data[ 'filepath' ]
       if not filename: return
@@ -242,7 +611,8 @@ class SwiftCompleter( Completer ):
           column = request_data[ 'start_column' ]
       additional_flags = self.FlagsForFile(filename)
 
-      offset = len(utils.ToBytes(contents[:LineOffsetInStr(contents, line)])) + column - 1
+      file_buffer = request_data['buffers'][filename]
+      offset = file_buffer.LineByteOffset(line) + column - 1
       return (filename, contents, offset, additional_flags)
 
   def OnFileReadyToParse( self, request_data ):
@@ -250,116 +620,229 @@ class SwiftCompleter( Completer ):
     if not filename: return
     # 限制不要重复编译
     contents = GetFileContents( request_data, filename )
-    with self._server_state_mutex:
-        file_state = self._source_repository.get(filename)
+    daemon = self._DaemonForFile(filename)
+    with daemon.state_mutex:
+        file_state = daemon.source_repository.get(filename)
         if file_state is None:
-            if filename in self._open_modules:
+            if filename in daemon.open_modules:
                 return # module file 不需要编译, rare cause delay in rare execute branch
-            file_state = {'parse_id': 0, 'last_contents': contents}
-            self._source_repository[filename] = file_state
-
-            output = self.request("source.request.editor.open", {
+            file_state = {'parse_id': 0, 'last_contents': contents,
+                          'diag_event': threading.Event(),
+                          'diag_ready': threading.Event()}
+            daemon.source_repository[filename] = file_state
+            with self._daemons_mutex:
+                self._daemon_for_file[filename] = daemon
+
+            pending = daemon.requestAsync("source.request.editor.open", {
                 "key.sourcefile": filename,
                 "key.name": filename,
                 "key.sourcetext": contents,
                 "key.compilerargs": self.FlagsForFile(filename),
                 "key.enablesyntaxmap": 0,
                 "key.enablesubstructure": 0
-            }) # type: dict
-            if output is None: LOGGER.warn("editor open error!"); return
+            })
         else:
             diff = DiffString(file_state['last_contents'], contents)
             file_state['last_contents'] = contents
             file_state['parse_id'] += 1
             file_state.pop('last_diag', None)
-            output = self.request("source.request.editor.replacetext", {
+            # stop waiting for the diagnostics of the previous contents
+            file_state['diag_event'].set()
+            file_state['diag_event'] = threading.Event()
+            # and let Fixit wait for the new ones
+            file_state['diag_ready'].set()
+            file_state['diag_ready'] = threading.Event()
+            pending = daemon.requestAsync("source.request.editor.replacetext", {
                 "key.sourcefile": filename,
                 "key.name": filename,
                 "key.offset": diff[0],
                 "key.length": diff[1],
                 "key.sourcetext": diff[2],
             })
-            if output is None: LOGGER.warn("editor open error!"); return
         parse_id = file_state['parse_id']
-    # lock end
-
-    diag = output.get("key.diagnostics")
-    c = 0
-    while not diag and output.get("key.diagnostic_stage") == "source.diagnostic.stage.swift.parse":
-        if c > 5: LOGGER.warn("get diag timeout!"); return
-        time.sleep(1)
-        c += 1
-        if file_state['parse_id'] != parse_id: # new request, ignore old loop query
-            return
-
-        output = self.request("source.request.editor.replacetext", {
-            "key.sourcefile": filename,
-            "key.name": filename,
-            "key.offset": 0,
-            "key.length": 0,
-            "key.sourcetext": "",
-        })
-        if output is None: LOGGER.warn("get diag error!"); return
-        diag = output.get("key.diagnostics")
+    # lock end. edits are sent in order under the lock, but other requests
+    # don't wait for their responses.
+
+    output = daemon.requestAwait(pending) # type: dict
+    if output is None:
+      LOGGER.warn("editor open error!")
+      return
+
+    bytes_contents = request_data['buffers'][filename].contents_bytes
+    if _DiagnosticsPending(output):
+        # only the parse stage is done. don't hold up the request until the
+        # semantic diagnostics are ready; they are sent to PollForMessages.
+        utils.StartThread(self._AwaitDiagnostics, daemon,
+                          filename, file_state, parse_id, bytes_contents)
+        return
 
-    if not diag: return
-    bytes_contents = utils.ToBytes(contents)
-    diag = list(filter(bool, map(lambda d: ConvertToYCMDDiag(d, bytes_contents), diag)))
-    LOGGER.debug("%d diags", len(diag))
-    with self._server_state_mutex:
-        if file_state['parse_id'] == parse_id: # no changes, save last diag
-            file_state['last_diag'] = diag
+    return self._StoreDiagnostics(daemon, filename, file_state, parse_id,
+                                  output.get("key.diagnostics"), bytes_contents)
+
+  def _AwaitDiagnostics(self, daemon, filename, file_state, parse_id,
+                        bytes_contents):
+      """background worker: poll the diagnostics of filename until they are
+      ready, and queue them for PollForMessages"""
+      diag_event = file_state['diag_event']
+      deadline = time.time() + DIAGNOSTICS_TIMEOUT
+      interval = DIAGNOSTICS_MIN_POLL_INTERVAL
+      while True:
+          # woken early by a document update notification or a newer parse
+          diag_event.wait(min(interval, max(deadline - time.time(), 0)))
+          diag_event.clear()
+          if file_state['parse_id'] != parse_id:
+              return # new request
+          if time.time() >= deadline:
+              LOGGER.warn("get diag timeout!")
+              return
 
-    return responses.BuildDiagnosticResponse(diag, filename, self.max_diagnostics_to_display)
+          output = daemon.request("source.request.editor.replacetext", {
+              "key.sourcefile": filename,
+              "key.name": filename,
+              "key.offset": 0,
+              "key.length": 0,
+              "key.sourcetext": "",
+          })
+          if output is None:
+              LOGGER.warn("get diag error!")
+              return
+          if not _DiagnosticsPending(output):
+              break
+          interval = min(interval * 2, DIAGNOSTICS_MAX_POLL_INTERVAL)
+
+      diagnostics = self._StoreDiagnostics(daemon, filename, file_state,
+                                           parse_id,
+                                           output.get("key.diagnostics"),
+                                           bytes_contents)
+      if diagnostics is not None:
+          self._diagnostic_messages.put({'filepath': filename,
+                                         'diagnostics': diagnostics})
+
+  def _StoreDiagnostics(self, daemon, filename, file_state, parse_id, diag,
+                        bytes_contents):
+      """convert the sourcekit diagnostics of filename and save them unless the
+      file changed since. return the diagnostics response"""
+      diag = [ d for d in ( ConvertToYCMDDiag(d, bytes_contents)
+                            for d in diag or [] ) if d ]
+      LOGGER.debug("%d diags", len(diag))
+      with daemon.state_mutex:
+          if file_state['parse_id'] != parse_id:
+              return # outdated
+          file_state['last_diag'] = diag
+          file_state['diag_ready'].set()
+
+      return responses.BuildDiagnosticResponse(
+          diag, filename, self.max_diagnostics_to_display)
+
+  def PollForMessagesInner( self, request_data, timeout ):
+      if not self._ServerIsRunning():
+          return False
+
+      try:
+          messages = [self._diagnostic_messages.get(timeout = timeout)]
+      except queue.Empty:
+          return True # poll again
+      try:
+          while True:
+              messages.append(self._diagnostic_messages.get_nowait())
+      except queue.Empty:
+          pass
+      return messages
 
   def OnBufferUnload( self, request_data ):
     filename = request_data[ 'filepath' ]
     if not filename: return
-    with self._server_state_mutex:
-        if filename in self._open_modules: return
-        file_state = self._source_repository.pop(filename, None)
-        if file_state: file_state['parse_id'] += 1 # cancel waiting parsing
-        self.request("source.request.editor.close", {
+    for daemon in self._daemons:
+        with daemon.completion_mutex:
+            self._CloseCompletionSession(daemon, filename)
+    with self._daemons_mutex:
+        daemon = self._daemon_for_file.pop(filename, None)
+    if daemon is None:
+      return # not open, or a module interface
+    with daemon.state_mutex:
+        file_state = daemon.source_repository.pop(filename, None)
+        if file_state:
+            file_state['parse_id'] += 1 # cancel waiting parsing
+            file_state['diag_event'].set()
+            file_state['diag_ready'].set()
+        # sent under the lock to stay in order with the edits, but awaited
+        # after releasing it
+        pending = daemon.requestAsync("source.request.editor.close", {
             "key.sourcefile": filename,
             "key.name": filename,
         })
-
-  def QuickCandidates(self, request_data):
-      if request_data['force_semantic'] and request_data[ 'query' ]:
-          return self._big_cache
-      return []
+    daemon.requestAwait(pending)
 
   def ComputeCandidatesInner( self, request_data ):
       data = self.RequestDataExtract(request_data)
       if data is None: return []
 
-      output = self.request("source.request.codecomplete", {
-          "key.sourcefile" : data[0],
-          "key.sourcetext" : data[1],
-          "key.offset" : data[2],
-          "key.compilerargs" : data[3],
-      } )
+      output = self._CodeComplete(request_data, *data)
       if output is None: return []
 
-      completions = [ responses.BuildCompletionData(
-        completion['key.name'],
-        completion.get('key.typename'),
-        detailed_info = completion.get('key.doc.brief'),
-        menu_text     = completion.get('key.description'),
-        kind          = KindFromKittenKind(completion.get('key.kind')),
-        extra_data    = { 'template' : completion.get('key.sourcetext') }
-      ) for completion in output["key.results"] ]
-      # cache for QuickCandidates when big than 1M
-      if len(output) > 1e6 :
-          LOGGER.debug("swift cache %d", len(output))
-          self._big_cache = completions
-      return completions
-
-  def request(self, name, requestObject):
-      request  = json.dumps(requestObject, ensure_ascii=False)
-      # sourcekitd only support direct name, can't ecode as json string
-      request = "{key.request: " + name + "," + request[1:]
-      return self._SendRequest("yaml", request).get("result")
+      # there may be 10k+ results. the results from the daemon are kept in
+      # extra_data to detail only the candidates left after filtering.
+      return [ { 'insertion_text': completion['key.name'],
+                 'extra_data': completion }
+               for completion in output.get("key.results", []) ]
+
+  def DetailCandidates( self, request_data, candidates ):
+      for candidate in candidates:
+          completion = candidate['extra_data']
+          if 'key.name' not in completion:
+              continue # This candidate is already detailed.
+          candidate.update(responses.BuildCompletionData(
+            completion['key.name'],
+            completion.get('key.typename'),
+            detailed_info = completion.get('key.doc.brief'),
+            menu_text     = completion.get('key.description'),
+            kind          = KindFromKittenKind(completion.get('key.kind')),
+            extra_data    = { 'template' : completion.get('key.sourcetext') }
+          ))
+      return candidates
+
+  def _CodeComplete(self, request_data, filename, contents, offset, flags):
+      """complete at offset with the results filtered by the daemon for the
+      query. the session opened at offset is reused while the text before it
+      doesn't change, so the file isn't typechecked again for each query"""
+      prefix = request_data['buffers'][filename].contents_bytes[:offset]
+      options = {"key.codecomplete.filtertext": request_data['query']}
+      daemon = self._DaemonForFile(filename, flags)
+      with daemon.completion_mutex:
+          session = daemon.completion_session
+          if session == (filename, offset, prefix, flags):
+              output = daemon.request("source.request.codecomplete.update", {
+                  "key.name": filename,
+                  "key.offset": offset,
+                  "key.codecomplete.options": options,
+              })
+              if output is not None:
+                  return output
+
+          self._CloseCompletionSession(daemon)
+          output = daemon.request("source.request.codecomplete.open", {
+              "key.name": filename,
+              "key.sourcefile": filename,
+              "key.sourcetext": contents,
+              "key.offset": offset,
+              "key.compilerargs": flags,
+              "key.codecomplete.options": options,
+          })
+          if output is not None:
+              daemon.completion_session = (filename, offset, prefix, flags)
+          return output
+
+  def _CloseCompletionSession(self, daemon, filename=None):
+      """close the codecomplete session of daemon, only if it's in filename
+      when given. must be called under daemon.completion_mutex"""
+      session = daemon.completion_session
+      if session is None or filename not in (None, session[0]):
+          return
+      daemon.completion_session = None
+      daemon.request("source.request.codecomplete.close", {
+          "key.name": session[0],
+          "key.offset": session[1],
+      })
 
   def GetSubcommandsMap( self ):
     return {
@@ -379,7 +862,8 @@ class SwiftCompleter( Completer ):
   def _CursorRequest(self, data):
       if data is None: return
 
-      return self.request("source.request.cursorinfo", {
+      daemon = self._DaemonForFile(data[0], data[3])
+      return daemon.request("source.request.cursorinfo", {
           "key.sourcefile" : data[0],
           "key.sourcetext" : data[1],
           "key.offset" : data[2],
@@ -398,9 +882,11 @@ class SwiftCompleter( Completer ):
       """
       if not moduleName or data is None: return
       filename = self._InterfacePath(moduleName)
-      if filename in self._open_modules: return True # already open, don't need to reopen
+      daemon = self._DaemonForFile(data[0], data[3])
+      if filename in daemon.open_modules:
+          return True # already open, don't need to reopen
 
-      interface = self.request("source.request.editor.open.interface", {
+      interface = daemon.request("source.request.editor.open.interface", {
           "key.name": self._ModuleVirtualName(moduleName),
           "key.modulename": moduleName,
           "key.compilerargs": data[3],
@@ -412,8 +898,9 @@ class SwiftCompleter( Completer ):
               f.write(source)
           # with open(filename+"raw", "w") as f:
           #     f.write(output) # cache the openInterface output, since recall open interface is slow
-          self._open_modules[filename] = data[3]
-          self._flags_for_file[filename] = data[3] # use same compile flags as open args
+          daemon.open_modules[filename] = data[3]
+          # use same compile flags as open args
+          self._StoreFlags(filename, data[3], [])
       return interface
 
   def GetType(self, request_data, args):
@@ -482,7 +969,8 @@ class SwiftCompleter( Completer ):
 
               usr = cursorInfo.get('key.usr')
               if usr:
-                  output = self.request("source.request.editor.find_usr", {
+                  daemon = self._DaemonForFile(data[0], data[3])
+                  output = daemon.request("source.request.editor.find_usr", {
                       "key.usr": usr,
                       "key.sourcefile": self._ModuleVirtualName(moduleName)
                   })
@@ -544,21 +1032,45 @@ class SwiftCompleter( Completer ):
     column = request_data[ 'column_num' ]
     location = responses.Location(line, column, filename)
 
-    with self._server_state_mutex:
-        file_state = self._source_repository.get(filename)
+    daemon = self._DaemonForFile(filename)
+    with daemon.state_mutex:
+        file_state = daemon.source_repository.get(filename)
         if file_state is None: return
-        if file_state['last_contents'] != contents: # force reparse
-            self.OnFileReadyToParse(request_data)
-        diag = file_state.get('last_diag')
-        if diag is None: return
-        for fixits in (d.fixits_ for d in diag
-                       if d.fixits_ and LocationInRange(location, d.location_extent_) ):
-            return responses.BuildFixItResponse(fixits)
-        # no accurate column match, try only line match
-        for fixits in (d.fixits_ for d in diag
-                       if d.fixits_ and LocationLineInRange(location, d.location_extent_) ):
-            return responses.BuildFixItResponse(fixits)
+        outdated = file_state['last_contents'] != contents
+    if outdated: # force reparse
+        self.OnFileReadyToParse(request_data)
+    diag = _AwaitLastDiagnostics(daemon, file_state)
+    if diag is None:
         return
+    for fixits in (d.fixits_ for d in diag if d.fixits_ and
+                   LocationInRange(location, d.location_extent_)):
+        return responses.BuildFixItResponse(fixits)
+    # no accurate column match, try only line match
+    for fixits in (d.fixits_ for d in diag if d.fixits_ and
+                   LocationLineInRange(location, d.location_extent_)):
+        return responses.BuildFixItResponse(fixits)
+    return
+
+
+def _AwaitLastDiagnostics(daemon, file_state):
+    """return the diagnostics of the last contents sent for the file, waiting
+    up to DIAGNOSTICS_TIMEOUT for them. None if they are not ready by then"""
+    deadline = time.time() + DIAGNOSTICS_TIMEOUT
+    while True:
+        with daemon.state_mutex:
+            diag = file_state.get('last_diag')
+            diag_ready = file_state['diag_ready']
+        if diag is not None:
+            return diag
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            LOGGER.warning("diagnostics not ready for FixIt")
+            return None
+        if diag_ready.is_set():
+            return None # set without diagnostics: the file was closed
+        # set when the diagnostics are stored, or when newer contents are sent
+        diag_ready.wait(remaining)
+
 
 def LocationInRange(location, location_range):
     """ return true if location in location_range """
@@ -634,14 +1146,53 @@ def ConvertToYCMDDiag(sourcekit_diag, bytes_contents):
         fixits = fixits
     )
 
-# return 0 if line overflow
-def LineOffsetInStr(file_contents, line):
-    i = -1
-    while line > 1:
-        i = file_contents.find("\n", i + 1)
-        if i < 0: return 0
-        line -= 1
-    return i + 1
+
+def _ModificationTimes(paths):
+    """modification times of paths, None for missing files"""
+    def ModificationTime(path):
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return None
+    return [ModificationTime(path) for path in paths]
+
+
+def _ModuleKey(flags):
+    """the files with the same key are sent to the same daemon: the module
+    name when the flags have one, else the flags"""
+    try:
+        return flags[flags.index('-module-name') + 1]
+    except (ValueError, IndexError):
+        return tuple(flags)
+
+
+def _DiagnosticsPending(output):
+    """whether sourcekitd only finished the parse stage of the diagnostics"""
+    return (not output.get("key.diagnostics") and
+            output.get("key.diagnostic_stage") == DIAGNOSTIC_STAGE_PARSE)
+
+
+def ReadPackage(stream):
+    """read a Content-Length framed json package. return None at the end of
+    the stream"""
+    headers = {}
+    while True:
+        line = stream.readline()
+        if not line:
+            return None
+        if len(line) < 3:
+            break
+
+        m = header_pattern.search(line)
+        if m:
+            headers[m.group(1)] = m.group(2)
+
+    try:
+        content_length = int(headers[b'Content-Length'])
+        return json.loads(stream.read(content_length))
+    except (KeyError, ValueError):
+        LOGGER.exception( 'Error while read package' )
+        return {}
 
 def KindFromKittenKind(sourcekind):
       return {
@@ -345,9 +345,8 @@ class TypeScriptCompleter( Completer ):
     """
 
     filename = request_data[ 'filepath' ]
-    contents = request_data[ 'file_data' ][ filename ][ 'contents' ]
     tmpfile = NamedTemporaryFile( delete = False )
-    tmpfile.write( utils.ToBytes( contents ) )
+    tmpfile.write( request_data[ 'buffers' ][ filename ].contents_bytes )
     tmpfile.close()
     self._SendRequest( 'reload', {
       'file':    filename,
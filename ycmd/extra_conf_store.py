@@ -31,8 +31,8 @@ import sys
 from threading import Lock
 from ycmd import user_options_store
 from ycmd.responses import UnknownExtraConf, YCM_EXTRA_CONF_FILENAME
-from ycmd.utils import ( ExpandVariablesInPath, LoadPythonSource, LOGGER,
-                         PathsToAllParentFolders )
+from ycmd.utils import ( ExpandVariablesInPath, GetModificationTime,
+                         LoadPythonSource, LOGGER, PathsToAllParentFolders )
 from fnmatch import fnmatch
 
 
@@ -174,19 +174,57 @@ def Load( module_file, force = False ):
   # files thus really fast to compile and only loaded once by editing session.
   old_dont_write_bytecode = sys.dont_write_bytecode
   sys.dont_write_bytecode = True
+  # Read before loading so that changes made while loading are seen by
+  # ReloadIfModified.
+  mtime = GetModificationTime( module_file )
   try:
     module = LoadPythonSource( _RandomName(), module_file )
     module.is_global_ycm_extra_conf = is_global
+    module.ycm_extra_conf_mtime = mtime
   finally:
     sys.dont_write_bytecode = old_dont_write_bytecode
-
-  del sys.path[ 0 ]
+    del sys.path[ 0 ]
 
   with _module_for_module_file_lock:
     _module_for_module_file[ module_file ] = module
   return module
 
 
+def ReloadIfModified( module_file ):
+  """Loads the module contained in |module_file| again if the file was
+  modified since it was loaded. Returns the module, or None if it isn't loaded.
+  The modified file is checked by _ShouldLoad like any other module: this
+  raises UnknownExtraConf if it must be confirmed and returns None if it is
+  blacklisted. The previous module is kept if the modified file fails to
+  load, and the file isn't loaded again until it is modified again."""
+  with _module_for_module_file_lock:
+    module = _module_for_module_file.get( module_file )
+
+  if not module:
+    return module
+
+  mtime = GetModificationTime( module_file )
+  if not mtime or mtime == module.ycm_extra_conf_mtime:
+    return module
+
+  LOGGER.info( 'Reloading modified extra conf %s', module_file )
+  with _module_for_module_file_lock:
+    _module_for_module_file.pop( module_file, None )
+  try:
+    return Load( module_file )
+  except UnknownExtraConf:
+    # The modified code must be confirmed by the user before it runs.
+    raise
+  except Exception:
+    LOGGER.exception( 'Error occurred while reloading extra conf %s',
+                      module_file )
+    # Checks against this mtime must not run the broken file again.
+    module.ycm_extra_conf_mtime = mtime
+    with _module_for_module_file_lock:
+      _module_for_module_file[ module_file ] = module
+    return module
+
+
 def _MatchesGlobPattern( filename, glob ):
   """Returns true if a filename matches a given pattern. Environment variables
   and a '~' in glob will be expanded and checking will be performed using
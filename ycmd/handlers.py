@@ -31,7 +31,8 @@ import traceback
 from bottle import request
 
 import ycm_core
-from ycmd import extra_conf_store, hmac_plugin, server_state, user_options_store
+from ycmd import ( buffer_store, extra_conf_store, hmac_plugin, server_state,
+                   user_options_store )
 from ycmd.responses import ( BuildExceptionResponse,
                              BuildCompletionResponse,
                              BuildSignatureHelpResponse,
@@ -70,6 +71,9 @@ def EventNotification():
     response_data = getattr( _server_state.GetFiletypeCompleter( filetypes ),
                              event_handler )( request_data )
 
+  if event_name == 'BufferUnload':
+    buffer_store.RemoveBuffer( request_data[ 'filepath' ] )
+
   if response_data:
     return _JsonResponse( response_data )
   return _JsonResponse( {} )
@@ -26,13 +26,13 @@ from builtins import *  # noqa
 
 from future.utils import iteritems
 
+from ycmd import buffer_store
 from ycmd.utils import ( ByteOffsetToCodepointOffset,
                          CodepointOffsetToByteOffset,
                          HashableDict,
                          LOGGER,
                          ToUnicode,
-                         ToBytes,
-                         SplitLines )
+                         ToBytes )
 from ycmd.identifier_utils import StartOfLongestIdentifierEndingAtIndex
 from ycmd.request_validation import EnsureRequestValid
 
@@ -93,6 +93,11 @@ class RequestWrap( object ):
 
       'lines': ( self._CurrentLines, None ),
 
+      # Dict of filepath -> buffer_store.Buffer for the files in file_data. The
+      # buffer store is updated when this is first used.
+      'buffers': ( lambda: buffer_store.UpdateBuffers( self[ 'file_data' ] ),
+                   None ),
+
       'extra_conf_data': ( self._GetExtraConfData, None ),
     }
     self._cached_computed = {}
@@ -161,9 +166,7 @@ class RequestWrap( object ):
 
 
   def _CurrentLines( self ):
-    current_file = self[ 'filepath' ]
-    contents = self[ 'file_data' ][ current_file ][ 'contents' ]
-    return SplitLines( contents )
+    return self[ 'buffers' ][ self[ 'filepath' ] ].lines
 
 
   def _CurrentLine( self ):
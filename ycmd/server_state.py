@@ -23,11 +23,16 @@ from __future__ import absolute_import
 from builtins import *  # noqa
 
 import threading
+from functools import partial
 from future.utils import itervalues
 from importlib import import_module
 from ycmd.completers.general.general_completer_store import (
     GeneralCompleterStore )
 from ycmd.completers.language_server import generic_lsp_completer
+from ycmd.completers.language_server.language_server_completer import (
+    LanguageServerCompleter )
+from ycmd.completers.language_server.language_server_pool import (
+    LanguageServerPool )
 from ycmd.utils import LOGGER
 
 
@@ -71,12 +76,24 @@ class ServerState( object ):
 
       try:
         module = import_module( 'ycmd.completers.{}.hook'.format( filetype ) )
-        completer = module.GetCompleter( self._user_options )
+        completer_factory = partial( module.GetCompleter, self._user_options )
+        completer = completer_factory()
       except ImportError:
         completer = None
 
       if completer is None:
-        completer = _GetGenericLSPCompleter( self._user_options, filetype )
+        completer_factory = partial( _GetGenericLSPCompleter,
+                                     self._user_options,
+                                     filetype )
+        completer = completer_factory()
+
+      if ( isinstance( completer, LanguageServerCompleter ) and
+           self._user_options[ 'max_language_server_instances' ] > 1 ):
+        # Run a server per project. The completer created above is only used to
+        # find the projects.
+        completer = LanguageServerPool( self._user_options,
+                                        completer_factory,
+                                        completer )
 
       supported_filetypes = { filetype }
       if completer:
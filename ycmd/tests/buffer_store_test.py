@@ -0,0 +1,86 @@
+# coding: utf-8
+#
+# Copyright (C) 2020 ycmd contributors
+#
+# This file is part of ycmd.
+#
+# ycmd is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ycmd is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ycmd.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+# Not installing aliases from python-future; it's unreliable and slow.
+from builtins import *  # noqa
+
+from hamcrest import ( assert_that, contains, equal_to, greater_than,
+                       has_key, is_not, none, same_instance )
+
+from ycmd import buffer_store
+from ycmd.request_wrap import RequestWrap
+from ycmd.tests.request_wrap_test import PrepareJson
+
+
+def _FileData( **contents ):
+  return { '/' + name: { 'filetypes': [ 'foo' ], 'contents': value }
+           for name, value in contents.items() }
+
+
+def BufferStore_UpdateBuffers_SharesUnchangedContents_test():
+  buffer_store.Reset()
+  first = buffer_store.UpdateBuffers( _FileData( a = 'abc', b = 'def' ) )
+  # Equal contents received in another request.
+  second = buffer_store.UpdateBuffers( _FileData( a = 'ab' + 'c', b = 'xyz' ) )
+
+  assert_that( second[ '/a' ], same_instance( first[ '/a' ] ) )
+  assert_that( second[ '/a' ].contents,
+               same_instance( first[ '/a' ].contents ) )
+  assert_that( second[ '/b' ].contents, equal_to( 'xyz' ) )
+  assert_that( second[ '/b' ].version,
+               greater_than( first[ '/b' ].version ) )
+  assert_that( first[ '/b' ].contents, equal_to( 'def' ) )
+  assert_that( buffer_store.GetBuffer( '/b' ), same_instance( second[ '/b' ] ) )
+
+
+def BufferStore_RemoveBuffer_test():
+  buffer_store.Reset()
+  first = buffer_store.UpdateBuffers( _FileData( a = 'abc' ) )
+  buffer_store.RemoveBuffer( '/a' )
+  assert_that( buffer_store.GetBuffer( '/a' ), none() )
+
+  # Versions still increase when the file is opened again.
+  second = buffer_store.UpdateBuffers( _FileData( a = 'abc' ) )
+  assert_that( second[ '/a' ], is_not( same_instance( first[ '/a' ] ) ) )
+  assert_that( second[ '/a' ].version, greater_than( first[ '/a' ].version ) )
+
+
+def Buffer_LinesAndBytes_test():
+  file_buffer = buffer_store.Buffer( '/a', 'ab\nç\n\nd', 1 )
+  assert_that( file_buffer.lines, contains( 'ab', 'ç', '', 'd' ) )
+  assert_that( file_buffer.lines, same_instance( file_buffer.lines ) )
+  assert_that( file_buffer.contents_bytes, equal_to( b'ab\n\xc3\xa7\n\nd' ) )
+  assert_that( [ file_buffer.LineByteOffset( line_num )
+                 for line_num in range( 1, 7 ) ],
+               contains( 0, 3, 6, 7, 8, 8 ) )
+
+
+def RequestWrap_Buffers_test():
+  buffer_store.Reset()
+  request = RequestWrap( PrepareJson( contents = 'abc\ndef' ) )
+  assert_that( request[ 'buffers' ], has_key( '/foo' ) )
+  assert_that( request[ 'lines' ],
+               same_instance( request[ 'buffers' ][ '/foo' ].lines ) )
+
+  other_request = RequestWrap( PrepareJson( contents = 'abc\ndef' ) )
+  assert_that( other_request[ 'lines' ], same_instance( request[ 'lines' ] ) )
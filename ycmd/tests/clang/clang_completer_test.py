@@ -0,0 +1,80 @@
+# Copyright (C) 2020 ycmd contributors
+#
+# This file is part of ycmd.
+#
+# ycmd is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ycmd is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ycmd.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+# Not installing aliases from python-future; it's unreliable and slow.
+from builtins import *  # noqa
+
+from concurrent.futures import Future
+from hamcrest import assert_that, contains, equal_to, has_properties
+from mock import patch
+
+import ycm_core
+from ycmd import user_options_store
+from ycmd.completers.cpp.clang_completer import ClangCompleter
+from ycmd.request_wrap import RequestWrap
+from ycmd.tests.test_utils import BuildRequest
+
+
+def _Request( contents ):
+  return RequestWrap( BuildRequest( filepath = '/foo.cpp',
+                                    filetype = 'cpp',
+                                    contents = contents ) )
+
+
+def ClangCompleter_GetUnsavedFilesVector_ConvertsOnlyChangedBuffers_test():
+  completer = ClangCompleter( user_options_store.DefaultOptions() )
+
+  with patch( 'ycm_core.UnsavedFile',
+              wraps = ycm_core.UnsavedFile ) as unsaved_file:
+    files = completer.GetUnsavedFilesVector( _Request( 'int a;' ) )
+    assert_that( files, contains( has_properties( {
+      'filename_': '/foo.cpp',
+      'contents_': 'int a;',
+      'length_': 6
+    } ) ) )
+    assert_that( unsaved_file.call_count, equal_to( 1 ) )
+
+    completer.GetUnsavedFilesVector( _Request( 'int a;' ) )
+    assert_that( unsaved_file.call_count, equal_to( 1 ) )
+
+    files = completer.GetUnsavedFilesVector( _Request( 'int ab;' ) )
+    assert_that( files, contains( has_properties( {
+      'contents_': 'int ab;',
+      'length_': 7
+    } ) ) )
+    assert_that( unsaved_file.call_count, equal_to( 2 ) )
+
+    completer.OnBufferUnload( _Request( 'int ab;' ) )
+    completer.GetUnsavedFilesVector( _Request( 'int ab;' ) )
+    assert_that( unsaved_file.call_count, equal_to( 3 ) )
+
+
+@patch( 'ycmd.completers.cpp.clang_completer.ClangCompleter._FlagsForRequest',
+        return_value = ( [ '-x', 'c++' ], '/foo.cpp' ) )
+def ClangCompleter_OnFileReadyToParse_CancelledParse_test( *args ):
+  completer = ClangCompleter( user_options_store.DefaultOptions() )
+  cancelled = Future()
+  cancelled.cancel()
+
+  with patch.object( completer._parse_pool, 'Submit',
+                     return_value = cancelled ):
+    assert_that( completer.OnFileReadyToParse( _Request( 'int a;' ) ),
+                 equal_to( [] ) )
@@ -0,0 +1,227 @@
+# coding: utf-8
+#
+# Copyright (C) 2020 ycmd contributors
+#
+# This file is part of ycmd.
+#
+# ycmd is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ycmd is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ycmd.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+# Not installing aliases from python-future; it's unreliable and slow.
+from builtins import *  # noqa
+
+import io
+import json
+import os
+from hamcrest import ( assert_that, contains, contains_inanyorder, equal_to,
+                       greater_than, has_properties, none )
+from mock import call, patch
+
+from ycmd.completers.cpp import compilation_database
+from ycmd.completers.cpp.compilation_database import (
+  CompilationDatabase,
+  FindCompilationDatabaseDirectory,
+  INDEX_FILENAME )
+from ycmd.tests.test_utils import TemporaryClangProject, TemporaryTestDir
+from ycmd.utils import ToUnicode
+
+
+def _Database( tmp_dir ):
+  database = CompilationDatabase( tmp_dir )
+  assert_that( database.WaitUntilIndexed( 5 ), equal_to( True ) )
+  return database
+
+
+def CompilationDatabase_GetCompileCommand_test():
+  with TemporaryTestDir() as tmp_dir:
+    compile_commands = [
+      {
+        'directory': tmp_dir,
+        'command': 'clang++ -DNAME="été" -Wall "with space.cc"',
+        'file': 'with space.cc',
+      },
+      {
+        'directory': tmp_dir,
+        'arguments': [ 'clang', '-Wextra', 'thé.c' ],
+        'file': os.path.join( tmp_dir, 'thé.c' ),
+      },
+      {
+        'directory': tmp_dir,
+        'command': 'clang -Wunused thé.c',
+        'file': os.path.join( tmp_dir, 'thé.c' ),
+      },
+    ]
+    # Non-ASCII characters are not escaped, so that offsets in bytes and in
+    # characters differ.
+    with io.open( os.path.join( tmp_dir, 'compile_commands.json' ),
+                  'w',
+                  encoding = 'utf-8' ) as database_file:
+      database_file.write( ToUnicode( json.dumps( compile_commands,
+                                                  ensure_ascii = False ) ) )
+
+    database = _Database( tmp_dir )
+    assert_that( database.DatabaseSuccessfullyLoaded(), equal_to( True ) )
+    assert_that(
+      database.GetCompileCommand( os.path.join( tmp_dir, 'with space.cc' ) ),
+      has_properties( {
+        'directory': tmp_dir,
+        'arguments': contains( 'clang++',
+                               '-DNAME=été',
+                               '-Wall',
+                               'with space.cc' )
+      } ) )
+    # The first command of a file is used.
+    assert_that(
+      database.GetCompileCommand( os.path.join( tmp_dir, 'thé.c' ) ),
+      has_properties( {
+        'arguments': contains( 'clang', '-Wextra', 'thé.c' )
+      } ) )
+    assert_that(
+      database.GetCompileCommand( os.path.join( tmp_dir, 'other.c' ) ),
+      none() )
+    assert_that(
+      database.FilenamesInDirectory( tmp_dir ),
+      contains_inanyorder( os.path.join( tmp_dir, 'with space.cc' ),
+                           os.path.join( tmp_dir, 'thé.c' ) ) )
+
+
+def CompilationDatabase_IndexReusedUntilDatabaseChanges_test():
+  with TemporaryTestDir() as tmp_dir:
+    compile_commands = [
+      {
+        'directory': tmp_dir,
+        'command': 'clang++ -Wall test.cc',
+        'file': 'test.cc',
+      },
+    ]
+    with TemporaryClangProject( tmp_dir, compile_commands ):
+      _Database( tmp_dir )
+      assert_that( os.path.isfile( os.path.join( tmp_dir, INDEX_FILENAME ) ),
+                   equal_to( True ) )
+
+      with patch( 'ycmd.completers.cpp.compilation_database._IndexDatabase',
+                  side_effect = RuntimeError ) as index_database:
+        database = _Database( tmp_dir )
+        assert_that( index_database.called, equal_to( False ) )
+        assert_that(
+          database.GetCompileCommand( os.path.join( tmp_dir, 'test.cc' ) ),
+          has_properties( { 'arguments': contains( 'clang++',
+                                                   '-Wall',
+                                                   'test.cc' ) } ) )
+
+      path = os.path.join( tmp_dir, 'compile_commands.json' )
+      with open( path, 'a' ) as database_file:
+        database_file.write( '\n' )
+      with patch( 'ycmd.completers.cpp.compilation_database._IndexDatabase',
+                  return_value = {} ) as index_database:
+        _Database( tmp_dir )
+        assert_that( index_database.called, equal_to( True ) )
+
+
+def CompilationDatabase_ModifiedSinceIndexed_test():
+  with TemporaryTestDir() as tmp_dir:
+    compile_commands = [
+      {
+        'directory': tmp_dir,
+        'command': 'clang++ -Wall a.cc',
+        'file': 'a.cc',
+      },
+      {
+        'directory': tmp_dir,
+        'command': 'clang++ -Wall b.cc',
+        'file': 'b.cc',
+      },
+    ]
+    path = os.path.join( tmp_dir, 'compile_commands.json' )
+    with open( path, 'w' ) as database_file:
+      json.dump( compile_commands, database_file )
+    database = _Database( tmp_dir )
+
+    # The command of b.cc is now where the command of a.cc was.
+    with open( path, 'w' ) as database_file:
+      json.dump( compile_commands[ 1: ], database_file )
+    a = os.path.join( tmp_dir, 'a.cc' )
+    assert_that( database.GetCompileCommand( a ), none() )
+
+    # The database is indexed again.
+    assert_that( database.WaitUntilIndexed( 5 ), equal_to( True ) )
+    assert_that( database.GetCompileCommand( a ), none() )
+    assert_that(
+      database.GetCompileCommand( os.path.join( tmp_dir, 'b.cc' ) ),
+      has_properties( { 'arguments': contains( 'clang++',
+                                               '-Wall',
+                                               'b.cc' ) } ) )
+
+
+def CompilationDatabase_InvalidDatabase_test():
+  with TemporaryTestDir() as tmp_dir:
+    with TemporaryClangProject( tmp_dir, 'this is junk' ):
+      database = _Database( tmp_dir )
+      assert_that( database.DatabaseSuccessfullyLoaded(), equal_to( False ) )
+
+    path = os.path.join( tmp_dir, 'compile_commands.json' )
+    with open( path, 'w' ) as database_file:
+      database_file.write( '[ { "directory": "/", "file": "a.c" }, junk' )
+    database = _Database( tmp_dir )
+    assert_that( database.GetCompileCommand( '/a.c' ), none() )
+
+
+def FindCompilationDatabaseDirectory_CachedForEveryLevel_test():
+  with TemporaryTestDir() as tmp_dir:
+    os.makedirs( os.path.join( tmp_dir, 'a', 'b', 'c' ) )
+    os.makedirs( os.path.join( tmp_dir, 'a', 'd' ) )
+
+    with patch( 'ycmd.completers.cpp.compilation_database._CheckDirectory',
+                wraps = compilation_database._CheckDirectory ) as check:
+      assert_that( FindCompilationDatabaseDirectory(
+                     os.path.join( tmp_dir, 'a', 'b', 'c', 'test.cc' ) ),
+                   none() )
+      assert_that( check.call_count, greater_than( 3 ) )
+
+      # Only the new directory is looked into; its parent is known to have no
+      # database.
+      check.reset_mock()
+      assert_that( FindCompilationDatabaseDirectory(
+                     os.path.join( tmp_dir, 'a', 'd', 'test.cc' ) ),
+                   none() )
+      assert_that( check.call_args_list, contains(
+        call( os.path.join( tmp_dir, 'a', 'd' ), None ) ) )
+
+
+def FindCompilationDatabaseDirectory_InvalidatedByDirectoryChange_test():
+  with TemporaryTestDir() as tmp_dir:
+    folder = os.path.join( tmp_dir, 'a' )
+    os.makedirs( os.path.join( folder, 'b' ) )
+    os.utime( folder, ( 1000, 1000 ) )
+    filename = os.path.join( folder, 'b', 'test.cc' )
+    assert_that( FindCompilationDatabaseDirectory( filename ), none() )
+
+    with TemporaryClangProject( folder, [] ):
+      # The cached result is trusted until the revalidation interval elapses.
+      assert_that( FindCompilationDatabaseDirectory( filename ), none() )
+
+      with patch( 'ycmd.completers.cpp.compilation_database.'
+                  'DIRECTORY_REVALIDATION_INTERVAL', 0 ):
+        assert_that( FindCompilationDatabaseDirectory( filename ),
+                     equal_to( folder ) )
+        assert_that( FindCompilationDatabaseDirectory( folder ),
+                     equal_to( folder ) )
+
+    with patch( 'ycmd.completers.cpp.compilation_database.'
+                'DIRECTORY_REVALIDATION_INTERVAL', 0 ):
+      os.utime( folder, ( 2000, 2000 ) )
+      assert_that( FindCompilationDatabaseDirectory( filename ), none() )
@@ -31,6 +31,39 @@ from ycmd.tests.test_utils import ( BuildRequest, TemporaryTestDir,
                                     TemporaryClangProject )
 
 
+def TranslationUnitItems():
+  return [
+    has_entries( {
+      'key': 'translation units',
+      'value': instance_of( int )
+    } ),
+    has_entries( {
+      'key': 'translation units memory usage',
+      'value': matches_regexp( '^\\d+\\.\\d MB$' )
+    } ),
+    has_entries( {
+      'key': 'translation unit evictions',
+      'value': instance_of( int )
+    } ),
+    has_entries( {
+      'key': 'translation unit re-creations',
+      'value': instance_of( int )
+    } ),
+    has_entries( {
+      'key': 'parse queue depth',
+      'value': instance_of( int )
+    } ),
+    has_entries( {
+      'key': 'parse workers',
+      'value': matches_regexp( '^\\d+ of \\d+ busy$' )
+    } ),
+    has_entries( {
+      'key': 'parse wait time',
+      'value': matches_regexp( '^mean \\d+ ms, max \\d+ ms$' )
+    } )
+  ]
+
+
 @SharedYcmd
 def DebugInfo_FlagsWhenExtraConfLoadedAndNoCompilationDatabase_test( app ):
   app.post_json( '/load_extra_conf_file',
@@ -54,7 +87,8 @@ def DebugInfo_FlagsWhenExtraConfLoadedAndNoCompilationDatabase_test( app ):
         has_entries( {
           'key': 'translation unit',
           'value': PathToTestFile( 'basic.cpp' )
-        } )
+        } ),
+        *TranslationUnitItems()
       )
     } ) )
   )
@@ -81,7 +115,8 @@ def DebugInfo_FlagsWhenNoExtraConfAndNoCompilationDatabase_test( app ):
         has_entries( {
           'key': 'translation unit',
           'value': instance_of( str )
-        } )
+        } ),
+        *TranslationUnitItems()
       )
     } ) )
   )
@@ -103,7 +138,8 @@ def DebugInfo_FlagsWhenNoExtraConfAndNoCompilationDatabase_test( app ):
         has_entries( {
           'key': 'translation unit',
           'value': instance_of( str )
-        } )
+        } ),
+        *TranslationUnitItems()
       )
     } ) )
   )
@@ -132,7 +168,8 @@ def DebugInfo_FlagsWhenExtraConfNotLoadedAndNoCompilationDatabase_test(
         has_entries( {
           'key': 'translation unit',
           'value': PathToTestFile( 'basic.cpp' )
-        } )
+        } ),
+        *TranslationUnitItems()
       )
     } ) )
   )
@@ -172,7 +209,8 @@ def DebugInfo_FlagsWhenNoExtraConfAndCompilationDatabaseLoaded_test( app ):
             has_entries( {
               'key': 'translation unit',
               'value': os.path.join( tmp_dir, 'test.cc' ),
-            } )
+            } ),
+            *TranslationUnitItems()
           )
         } ) )
       )
@@ -204,7 +242,8 @@ def DebugInfo_FlagsWhenNoExtraConfAndInvalidCompilationDatabase_test( app ):
             has_entries( {
               'key': 'translation unit',
               'value': os.path.join( tmp_dir, 'test.cc' )
-            } )
+            } ),
+            *TranslationUnitItems()
           )
         } ) )
       )
@@ -245,7 +284,8 @@ def DebugInfo_FlagsWhenGlobalExtraConfAndCompilationDatabaseLoaded_test( app ):
             has_entries( {
               'key': 'translation unit',
               'value': os.path.join( tmp_dir, 'test.cc' ),
-            } )
+            } ),
+            *TranslationUnitItems()
           )
         } ) )
       )
@@ -273,7 +313,8 @@ def DebugInfo_FlagsWhenGlobalExtraConfAndNoCompilationDatabase_test( app ):
         has_entries( {
           'key': 'translation unit',
           'value': PathToTestFile( 'basic.cpp' )
-        } )
+        } ),
+        *TranslationUnitItems()
       )
     } ) )
   )
@@ -305,7 +346,8 @@ def DebugInfo_Unity_test( app ):
           has_entries( {
             'key': 'translation unit',
             'value': PathToTestFile( 'unity.cc' )
-          } )
+          } ),
+          *TranslationUnitItems()
         )
       } ) )
     )
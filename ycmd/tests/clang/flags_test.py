@@ -23,6 +23,7 @@ from __future__ import absolute_import
 from builtins import *  # noqa
 
 import contextlib
+import json
 import os
 from hamcrest import ( assert_that,
                        calling,
@@ -49,7 +50,7 @@ def MockExtraConfModule( settings_function ):
   setattr( module, settings_function.__name__, settings_function )
   with patch( 'ycmd.extra_conf_store.ModuleForSourceFile',
               return_value = module ):
-    yield
+    yield module
 
 
 def FlagsForFile_NothingReturned_test():
@@ -160,6 +161,74 @@ def FlagsForFile_FlagsCachedWhenDoCacheIsTrue_test():
     assert_that( flags_list, contains( '-x', 'c' ) )
 
 
+def _Touch( path, mtime ):
+  open( path, 'a' ).close()
+  os.utime( path, ( mtime, mtime ) )
+
+
+@patch( 'ycmd.completers.cpp.flags.FLAGS_REVALIDATION_INTERVAL', 0 )
+def FlagsForFile_FlagsReloadedWhenExtraConfModified_test():
+  flags_object = flags.Flags()
+
+  def Settings( **kwargs ):
+    return {
+      'flags': [ '-x', 'c' ]
+    }
+
+  with TemporaryTestDir() as tmp_dir:
+    extra_conf = os.path.join( tmp_dir, '.ycm_extra_conf.py' )
+    _Touch( extra_conf, 1000 )
+
+    with MockExtraConfModule( Settings ) as module:
+      module.__file__ = extra_conf
+      module.ycm_extra_conf_mtime = 1000
+      flags_list, _ = flags_object.FlagsForFile( '/foo', False )
+      assert_that( flags_list, contains( '-x', 'c' ) )
+
+    def Settings( **kwargs ):
+      return {
+        'flags': [ '-x', 'c++' ]
+      }
+
+    with MockExtraConfModule( Settings ) as module:
+      module.__file__ = extra_conf
+      module.ycm_extra_conf_mtime = 2000
+      flags_list, _ = flags_object.FlagsForFile( '/foo', False )
+      assert_that( flags_list, contains( '-x', 'c' ) )
+
+      _Touch( extra_conf, 2000 )
+      with patch( 'ycmd.extra_conf_store.ReloadIfModified' ) as reload:
+        flags_list, _ = flags_object.FlagsForFile( '/foo', False )
+      assert_that( flags_list, contains( '-x', 'c++' ) )
+      reload.assert_called_once_with( extra_conf )
+
+
+def FlagsForFile_RevalidationThrottledPerDirectory_test():
+  flags_object = flags.Flags()
+
+  def Settings( **kwargs ):
+    return {
+      'flags': [ '-x', 'c' ]
+    }
+
+  with TemporaryTestDir() as tmp_dir:
+    extra_conf = os.path.join( tmp_dir, '.ycm_extra_conf.py' )
+    _Touch( extra_conf, 1000 )
+
+    with MockExtraConfModule( Settings ) as module:
+      module.__file__ = extra_conf
+      module.ycm_extra_conf_mtime = 1000
+      flags_object.FlagsForFile( '/foo', False )
+      flags_object.FlagsForFile( '/foo', False )
+
+      # The modification is only seen once the interval has elapsed.
+      _Touch( extra_conf, 2000 )
+      with patch( 'ycmd.completers.cpp.flags.GetModificationTime',
+                  return_value = 2000 ) as get_mtime:
+        flags_object.FlagsForFile( '/foo', False )
+        assert_that( get_mtime.called, equal_to( False ) )
+
+
 def FlagsForFile_DoNotMakeRelativePathsAbsoluteByDefault_test():
   flags_object = flags.Flags()
 
@@ -1606,3 +1675,47 @@ def MakeRelativePathsInFlagsAbsolute_NoWorkingDir_test():
     'expect': [ 'list', 'of', 'flags', 'not', 'changed', '-Itest' ],
     'wd': ''
   }
+
+
+@patch( 'ycmd.completers.cpp.flags.FLAGS_REVALIDATION_INTERVAL', 0 )
+def CompilationDatabase_ReloadedWhenModified_test():
+  with TemporaryTestDir() as tmp_dir:
+    compile_commands = [
+      {
+        'directory': tmp_dir,
+        'command': 'clang++ -x c++ -Wall',
+        'file': os.path.join( tmp_dir, 'test.cc' ),
+      },
+    ]
+
+    with TemporaryClangProject( tmp_dir, compile_commands ):
+      f = flags.Flags()
+      assert_that(
+        f.FlagsForFile( os.path.join( tmp_dir, 'test.cc' ),
+                        add_extra_clang_flags = False )[ 0 ],
+        contains( 'clang++',
+                  '-x',
+                  'c++',
+                  '--driver-mode=g++',
+                  '-x',
+                  'c++',
+                  '-Wall' ) )
+
+      # Regenerate the database, e.g. after a build reconfiguration.
+      compile_commands[ 0 ][ 'command' ] = 'clang++ -x c++ -Wextra'
+      path = os.path.join( tmp_dir, 'compile_commands.json' )
+      with open( path, 'w' ) as database:
+        database.write( json.dumps( compile_commands ) )
+      mtime = os.path.getmtime( path ) + 10
+      os.utime( path, ( mtime, mtime ) )
+
+      assert_that(
+        f.FlagsForFile( os.path.join( tmp_dir, 'test.cc' ),
+                        add_extra_clang_flags = False )[ 0 ],
+        contains( 'clang++',
+                  '-x',
+                  'c++',
+                  '--driver-mode=g++',
+                  '-x',
+                  'c++',
+                  '-Wextra' ) )
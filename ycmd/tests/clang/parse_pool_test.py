@@ -0,0 +1,132 @@
+# Copyright (C) 2020 ycmd contributors
+#
+# This file is part of ycmd.
+#
+# ycmd is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ycmd is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ycmd.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+# Not installing aliases from python-future; it's unreliable and slow.
+from builtins import *  # noqa
+
+import threading
+
+from hamcrest import ( assert_that, calling, contains, equal_to, has_entries,
+                       raises, same_instance )
+
+from ycmd.completers.cpp.parse_pool import ( ParsePool,
+                                             PRIORITY_BACKGROUND,
+                                             PRIORITY_CURRENT_BUFFER )
+
+
+class BlockingParse( object ):
+  """Records its calls. Parsing '/block' waits until Release is called."""
+
+  def __init__( self ):
+    self.calls = []
+    self.blocked = threading.Event()
+    self._release = threading.Event()
+    self._lock = threading.Lock()
+
+
+  def Release( self ):
+    self._release.set()
+
+
+  def __call__( self, filename, *args ):
+    with self._lock:
+      self.calls.append( ( filename, ) + args )
+    if filename == '/block':
+      self.blocked.set()
+      self._release.wait( 5 )
+    if filename == '/error':
+      raise RuntimeError( 'parse failed' )
+    return filename
+
+
+def _BlockedPool( max_workers = 1 ):
+  parse = BlockingParse()
+  pool = ParsePool( parse, max_workers )
+  blocking = pool.Submit( '/block', PRIORITY_BACKGROUND )
+  assert_that( parse.blocked.wait( 5 ), equal_to( True ) )
+  return pool, parse, blocking
+
+
+def ParsePool_CurrentBufferFirst_test():
+  pool, parse, blocking = _BlockedPool()
+  background = pool.Submit( '/background', PRIORITY_BACKGROUND )
+  current = pool.Submit( '/current', PRIORITY_CURRENT_BUFFER )
+  assert_that( pool.Statistics(), has_entries( { 'queued': 2,
+                                                 'running': 1,
+                                                 'workers': 1 } ) )
+
+  parse.Release()
+  assert_that( background.result( 5 ), equal_to( '/background' ) )
+  assert_that( current.result( 5 ), equal_to( '/current' ) )
+  assert_that( parse.calls, contains( ( '/block', ),
+                                      ( '/current', ),
+                                      ( '/background', ) ) )
+
+
+def ParsePool_CoalesceQueuedJobs_test():
+  pool, parse, blocking = _BlockedPool()
+  first = pool.Submit( '/foo', PRIORITY_BACKGROUND, 1 )
+  second = pool.Submit( '/foo', PRIORITY_CURRENT_BUFFER, 2 )
+  assert_that( second, same_instance( first ) )
+  assert_that( pool.Statistics(), has_entries( { 'queued': 1 } ) )
+
+  parse.Release()
+  assert_that( first.result( 5 ), equal_to( '/foo' ) )
+  assert_that( parse.calls, contains( ( '/block', ), ( '/foo', 2 ) ) )
+
+
+def ParsePool_FileNotParsedTwiceAtOnce_test():
+  pool, parse, blocking = _BlockedPool( max_workers = 2 )
+  again = pool.Submit( '/block', PRIORITY_CURRENT_BUFFER )
+  other = pool.Submit( '/other', PRIORITY_BACKGROUND )
+
+  # The second worker skips the file being parsed.
+  assert_that( other.result( 5 ), equal_to( '/other' ) )
+  assert_that( again.done(), equal_to( False ) )
+
+  parse.Release()
+  assert_that( again.result( 5 ), equal_to( '/block' ) )
+  assert_that( pool.Statistics(), has_entries( { 'queued': 0,
+                                                 'running': 0,
+                                                 'workers': 2 } ) )
+
+
+def ParsePool_ParseError_test():
+  pool = ParsePool( BlockingParse(), 1 )
+  future = pool.Submit( '/error', PRIORITY_CURRENT_BUFFER )
+  assert_that( calling( future.result ).with_args( 5 ),
+               raises( RuntimeError, 'parse failed' ) )
+
+  # The worker is still alive.
+  assert_that( pool.Submit( '/foo', PRIORITY_CURRENT_BUFFER ).result( 5 ),
+               equal_to( '/foo' ) )
+
+
+def ParsePool_Cancel_test():
+  pool, parse, blocking = _BlockedPool()
+  cancelled = pool.Submit( '/foo', PRIORITY_BACKGROUND )
+  pool.Cancel( '/foo' )
+  pool.Cancel( '/block' )
+
+  parse.Release()
+  assert_that( blocking.result( 5 ), equal_to( '/block' ) )
+  assert_that( cancelled.cancelled(), equal_to( True ) )
+  assert_that( parse.calls, contains( ( '/block', ) ) )
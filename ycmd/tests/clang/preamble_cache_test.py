@@ -0,0 +1,351 @@
+# Copyright (C) 2020 ycmd contributors
+#
+# This file is part of ycmd.
+#
+# ycmd is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ycmd is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ycmd.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+# Not installing aliases from python-future; it's unreliable and slow.
+from builtins import *  # noqa
+
+import json
+import os
+from hamcrest import ( assert_that, contains, contains_string, equal_to,
+                       has_length, is_not, none, not_none )
+from mock import patch
+
+from ycmd.completers.cpp.preamble_cache import ( IncludePrefix,
+                                                 MakePrivateDirectory,
+                                                 PreambleCache )
+from ycmd.tests.test_utils import TemporaryTestDir, UnixOnly
+from ycmd.utils import ReadFile
+
+FLAGS = [ '-x', 'c++', '-Wall' ]
+CONTENTS = '#include <vector>\n#include "foo.h"\n\nint main() {}\n'
+START_THREAD = 'ycmd.completers.cpp.preamble_cache.StartThread'
+REVALIDATION_INTERVAL = (
+  'ycmd.completers.cpp.preamble_cache.REVALIDATION_INTERVAL' )
+FAILED_BUILD_RETRY_INTERVAL = (
+  'ycmd.completers.cpp.preamble_cache.FAILED_BUILD_RETRY_INTERVAL' )
+
+
+class FakeBuild( object ):
+  """Writes an empty precompiled header that includes |dependencies|."""
+
+  def __init__( self, dependencies, error = None ):
+    self.calls = []
+    self.error = error
+    self._dependencies = dependencies
+
+
+  def __call__( self, header, pch, flags ):
+    self.calls.append( ( ReadFile( header ), flags ) )
+    if self.error:
+      raise self.error
+    open( pch, 'w' ).close()
+    return self._dependencies
+
+
+class DeferredThreads( object ):
+  """Replaces StartThread; the started functions run when Run is called."""
+
+  def __init__( self ):
+    self.calls = []
+
+
+  def __call__( self, func, *args ):
+    self.calls.append( ( func, args ) )
+
+
+  def Run( self ):
+    calls, self.calls = self.calls, []
+    for func, args in calls:
+      func( *args )
+
+
+def _Touch( path, mtime = 1000 ):
+  open( path, 'a' ).close()
+  os.utime( path, ( mtime, mtime ) )
+  return path
+
+
+def IncludePrefix_test():
+  assert_that( IncludePrefix( '// Copyright\n'
+                              '#pragma once\n'
+                              '\n'
+                              '#  include   <vector>\n'
+                              '#import "Foo.h"\n'
+                              'int a;\n'
+                              '#include <map>\n' ),
+               contains( '#include <vector>', '#import "Foo.h"' ) )
+  assert_that( IncludePrefix( 'int a;\n#include <map>\n' ), has_length( 0 ) )
+
+
+def PreambleCache_SharedBetweenFilesWithSameFlags_test():
+  with TemporaryTestDir() as tmp_dir:
+    build = FakeBuild( [ _Touch( os.path.join( tmp_dir, 'vector' ) ) ] )
+    cache = PreambleCache( build, os.path.join( tmp_dir, 'cache' ) )
+
+    first = os.path.join( tmp_dir, 'first.cpp' )
+    second = os.path.join( tmp_dir, 'second.cpp' )
+    with patch( START_THREAD, DeferredThreads() ) as threads:
+      assert_that( cache.PrecompiledPreambleForFile( first, CONTENTS, FLAGS ),
+                   none() )
+      # The preamble is precompiled in the background.
+      assert_that( cache.PrecompiledPreambleForFile( second, CONTENTS, FLAGS ),
+                   none() )
+      assert_that( build.calls, has_length( 0 ) )
+      threads.Run()
+    assert_that( build.calls, contains(
+      ( '#include <vector>\n#include "foo.h"\n',
+        [ '-Wall', '-x', 'c++-header', '-iquote', tmp_dir ] ) ) )
+
+    # The first two files keep the translation units they were given no
+    # precompiled header for, but a third file uses it without building it
+    # again.
+    assert_that( cache.PrecompiledPreambleForFile( first, CONTENTS, FLAGS ),
+                 none() )
+    assert_that( cache.PrecompiledPreambleForFile( second, CONTENTS, FLAGS ),
+                 none() )
+    third = os.path.join( tmp_dir, 'third.cpp' )
+    pch = cache.PrecompiledPreambleForFile( third, CONTENTS, FLAGS )
+    assert_that( pch, not_none() )
+    assert_that( os.path.isfile( pch ), equal_to( True ) )
+    assert_that( build.calls, has_length( 1 ) )
+
+    # A file whose translation unit was deleted uses it too.
+    cache.RemoveFile( second )
+    assert_that( cache.PrecompiledPreambleForFile( second, CONTENTS, FLAGS ),
+                 equal_to( pch ) )
+
+    # The precompiled header is reused by another cache.
+    other_cache = PreambleCache( build, os.path.join( tmp_dir, 'cache' ) )
+    other_cache.PrecompiledPreambleForFile( first, CONTENTS, FLAGS )
+    assert_that(
+      other_cache.PrecompiledPreambleForFile( second, CONTENTS, FLAGS ),
+      equal_to( pch ) )
+    assert_that( build.calls, has_length( 1 ) )
+
+
+def PreambleCache_PrecompiledPreambleInUse_test():
+  with TemporaryTestDir() as tmp_dir:
+    cache = PreambleCache( FakeBuild( [] ), tmp_dir )
+    with patch( START_THREAD, DeferredThreads() ) as threads:
+      cache.PrecompiledPreambleForFile( '/foo.cpp', CONTENTS, FLAGS )
+      cache.PrecompiledPreambleForFile( '/bar.cpp', CONTENTS, FLAGS )
+      threads.Run()
+    pch = cache.PrecompiledPreambleForFile( '/baz.cpp', CONTENTS, FLAGS )
+
+    with patch( 'ycmd.completers.cpp.preamble_cache.IncludePrefix' ) as prefix:
+      assert_that( cache.PrecompiledPreambleInUse( '/baz.cpp', FLAGS ),
+                   equal_to( pch ) )
+      assert_that( prefix.called, equal_to( False ) )
+    assert_that( cache.PrecompiledPreambleInUse( '/baz.cpp',
+                                                 FLAGS + [ '-DBAZ' ] ),
+                 none() )
+    assert_that( cache.PrecompiledPreambleInUse( '/bar.cpp', FLAGS ), none() )
+    assert_that( cache.PrecompiledPreambleInUse( '/qux.cpp', FLAGS ), none() )
+
+
+def PreambleCache_NotSharedBetweenDifferentFlags_test():
+  with TemporaryTestDir() as tmp_dir:
+    build = FakeBuild( [] )
+    cache = PreambleCache( build, tmp_dir )
+    cache.PrecompiledPreambleForFile( '/foo.cpp', CONTENTS, FLAGS )
+    assert_that( cache.PrecompiledPreambleForFile( '/bar.cpp',
+                                                   CONTENTS,
+                                                   FLAGS + [ '-DBAR' ] ),
+                 none() )
+    assert_that( build.calls, has_length( 0 ) )
+
+
+def PreambleCache_QuotedIncludesNotSharedAcrossDirectories_test():
+  with TemporaryTestDir() as tmp_dir:
+    build = FakeBuild( [] )
+    cache = PreambleCache( build, tmp_dir )
+    with patch( START_THREAD, DeferredThreads() ) as threads:
+      cache.PrecompiledPreambleForFile( '/foo/foo.cpp', CONTENTS, FLAGS )
+      cache.PrecompiledPreambleForFile( '/bar/bar.cpp', CONTENTS, FLAGS )
+      threads.Run()
+    assert_that( cache.PrecompiledPreambleForFile( '/baz/baz.cpp',
+                                                   CONTENTS,
+                                                   FLAGS ),
+                 not_none() )
+    assert_that( build.calls, contains(
+      ( '#include <vector>\n', [ '-Wall', '-x', 'c++-header' ] ) ) )
+
+
+@patch( REVALIDATION_INTERVAL, 0 )
+def PreambleCache_NotUsedOnceDependencyModified_test():
+  with TemporaryTestDir() as tmp_dir:
+    header = _Touch( os.path.join( tmp_dir, 'vector' ) )
+    build = FakeBuild( [ header ] )
+    cache = PreambleCache( build, tmp_dir )
+    with patch( START_THREAD, DeferredThreads() ) as threads:
+      cache.PrecompiledPreambleForFile( '/foo.cpp', CONTENTS, FLAGS )
+      cache.PrecompiledPreambleForFile( '/bar.cpp', CONTENTS, FLAGS )
+      threads.Run()
+      old_pch = cache.PrecompiledPreambleForFile( '/baz.cpp', CONTENTS, FLAGS )
+      cache.PrecompiledPreambleForFile( '/qux.cpp', CONTENTS, FLAGS )
+
+      # libclang refuses an outdated precompiled header: it isn't used while
+      # it is rebuilt.
+      _Touch( header, mtime = 2000 )
+      assert_that( cache.PrecompiledPreambleForFile( '/baz.cpp',
+                                                     CONTENTS,
+                                                     FLAGS ),
+                   none() )
+      assert_that( cache.PrecompiledPreambleInUse( '/qux.cpp', FLAGS ),
+                   none() )
+      threads.Run()
+
+    new_pch = cache.PrecompiledPreambleForFile( '/new.cpp', CONTENTS, FLAGS )
+    assert_that( new_pch, not_none() )
+    assert_that( new_pch, is_not( equal_to( old_pch ) ) )
+    assert_that( build.calls, has_length( 2 ) )
+    # Files which used the old header don't use the new one until they are
+    # unloaded. The old header is deleted once no file uses it.
+    assert_that( os.path.exists( old_pch ), equal_to( True ) )
+    assert_that( cache.PrecompiledPreambleForFile( '/qux.cpp',
+                                                   CONTENTS,
+                                                   FLAGS ),
+                 none() )
+    assert_that( os.path.exists( old_pch ), equal_to( False ) )
+
+
+def PreambleCache_NotUsedWhenDependencyIsOpen_test():
+  with TemporaryTestDir() as tmp_dir:
+    header = _Touch( os.path.join( tmp_dir, 'vector' ) )
+    cache = PreambleCache( FakeBuild( [ header ] ), tmp_dir )
+    with patch( START_THREAD, DeferredThreads() ) as threads:
+      cache.PrecompiledPreambleForFile( '/foo.cpp', CONTENTS, FLAGS )
+      cache.PrecompiledPreambleForFile( '/bar.cpp', CONTENTS, FLAGS )
+      threads.Run()
+    assert_that( cache.PrecompiledPreambleForFile( '/baz.cpp',
+                                                   CONTENTS,
+                                                   FLAGS,
+                                                   open_files = [ header ] ),
+                 none() )
+
+
+@patch( REVALIDATION_INTERVAL, 0 )
+def PreambleCache_BuildFailure_test():
+  with TemporaryTestDir() as tmp_dir:
+    build = FakeBuild( [], RuntimeError( 'vector is not guarded' ) )
+    cache = PreambleCache( build, tmp_dir )
+    with patch( START_THREAD, DeferredThreads() ) as threads:
+      cache.PrecompiledPreambleForFile( '/foo.cpp', CONTENTS, FLAGS )
+      cache.PrecompiledPreambleForFile( '/bar.cpp', CONTENTS, FLAGS )
+      threads.Run()
+      assert_that( cache.PrecompiledPreambleForFile( '/baz.cpp',
+                                                     CONTENTS,
+                                                     FLAGS ),
+                   none() )
+      assert_that( threads.calls, has_length( 0 ) )
+      assert_that( build.calls, has_length( 1 ) )
+      assert_that( build.calls[ 0 ][ 0 ], contains_string( '<vector>' ) )
+
+      # The files included by the failed build are unknown: it is retried
+      # after some time.
+      build.error = None
+      with patch( FAILED_BUILD_RETRY_INTERVAL, 0 ):
+        cache.PrecompiledPreambleForFile( '/qux.cpp', CONTENTS, FLAGS )
+      threads.Run()
+    assert_that( build.calls, has_length( 2 ) )
+    assert_that( cache.PrecompiledPreambleForFile( '/new.cpp',
+                                                   CONTENTS,
+                                                   FLAGS ),
+                 not_none() )
+
+
+@patch( REVALIDATION_INTERVAL, 0 )
+def PreambleCache_BuildRetriedWhenDependencyModified_test():
+  with TemporaryTestDir() as tmp_dir:
+    header = _Touch( os.path.join( tmp_dir, 'vector' ) )
+    build = FakeBuild( [ header ] )
+    cache = PreambleCache( build, tmp_dir )
+    with patch( START_THREAD, DeferredThreads() ) as threads:
+      cache.PrecompiledPreambleForFile( '/foo.cpp', CONTENTS, FLAGS )
+      cache.PrecompiledPreambleForFile( '/bar.cpp', CONTENTS, FLAGS )
+      threads.Run()
+
+      # The header is saved in the middle of an edit.
+      _Touch( header, mtime = 2000 )
+      build.error = RuntimeError( 'syntax error' )
+      cache.PrecompiledPreambleForFile( '/baz.cpp', CONTENTS, FLAGS )
+      threads.Run()
+      assert_that( cache.PrecompiledPreambleForFile( '/qux.cpp',
+                                                     CONTENTS,
+                                                     FLAGS ),
+                   none() )
+      assert_that( threads.calls, has_length( 0 ) )
+
+      # It is fixed and saved again.
+      _Touch( header, mtime = 3000 )
+      build.error = None
+      cache.PrecompiledPreambleForFile( '/quux.cpp', CONTENTS, FLAGS )
+      threads.Run()
+    assert_that( build.calls, has_length( 3 ) )
+    assert_that( cache.PrecompiledPreambleForFile( '/new.cpp',
+                                                   CONTENTS,
+                                                   FLAGS ),
+                 not_none() )
+
+
+def PreambleCache_ManifestWithPathNotLoaded_test():
+  with TemporaryTestDir() as tmp_dir:
+    cache_directory = os.path.join( tmp_dir, 'cache' )
+    build = FakeBuild( [] )
+    cache = PreambleCache( build, cache_directory )
+    with patch( START_THREAD, DeferredThreads() ) as threads:
+      cache.PrecompiledPreambleForFile( '/foo.cpp', CONTENTS, FLAGS )
+      cache.PrecompiledPreambleForFile( '/bar.cpp', CONTENTS, FLAGS )
+      threads.Run()
+
+      manifest, = [ os.path.join( cache_directory, name )
+                    for name in os.listdir( cache_directory )
+                    if name.endswith( '.json' ) ]
+      _Touch( os.path.join( tmp_dir, 'other.pch' ) )
+      with open( manifest, 'w' ) as manifest_file:
+        json.dump( { 'pch': os.path.join( os.pardir, 'other.pch' ),
+                     'dependencies': {} }, manifest_file )
+
+      other_cache = PreambleCache( build, cache_directory )
+      other_cache.PrecompiledPreambleForFile( '/foo.cpp', CONTENTS, FLAGS )
+      assert_that( other_cache.PrecompiledPreambleForFile( '/bar.cpp',
+                                                           CONTENTS,
+                                                           FLAGS ),
+                   none() )
+      # It is built again instead.
+      assert_that( threads.calls, has_length( 1 ) )
+
+
+@UnixOnly
+def MakePrivateDirectory_test():
+  with TemporaryTestDir() as tmp_dir:
+    private = os.path.join( tmp_dir, 'private' )
+    assert_that( MakePrivateDirectory( private ), equal_to( True ) )
+    assert_that( MakePrivateDirectory( private ), equal_to( True ) )
+
+    shared = os.path.join( tmp_dir, 'shared' )
+    os.mkdir( shared )
+    os.chmod( shared, 0o777 )
+    assert_that( MakePrivateDirectory( shared ), equal_to( False ) )
+
+    symlink = os.path.join( tmp_dir, 'symlink' )
+    os.symlink( private, symlink )
+    assert_that( MakePrivateDirectory( symlink ), equal_to( False ) )
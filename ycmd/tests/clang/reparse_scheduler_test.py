@@ -0,0 +1,101 @@
+# Copyright (C) 2020 ycmd contributors
+#
+# This file is part of ycmd.
+#
+# ycmd is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ycmd is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ycmd.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+# Not installing aliases from python-future; it's unreliable and slow.
+from builtins import *  # noqa
+
+import threading
+from time import sleep
+
+from hamcrest import assert_that, contains, empty, equal_to
+
+from ycmd.completers.cpp.reparse_scheduler import ReparseScheduler
+
+
+class RecordingReparse( object ):
+  def __init__( self, failures = 0 ):
+    self.calls = []
+    self.called = threading.Event()
+    self._failures = failures
+
+
+  def __call__( self, filename, *args ):
+    if self._failures:
+      self._failures -= 1
+      raise RuntimeError( 'reparse failed' )
+    self.calls.append( ( filename, ) + args )
+    self.called.set()
+
+
+def ReparseScheduler_ReparsesLatestArgsOnceIdle_test():
+  reparse = RecordingReparse()
+  scheduler = ReparseScheduler( reparse, 0.1 )
+  scheduler.Schedule( '/foo', 1 )
+  scheduler.Schedule( '/foo', 2 )
+  assert_that( scheduler.IsPending( '/foo' ), equal_to( True ) )
+
+  assert_that( reparse.called.wait( 5 ), equal_to( True ) )
+  sleep( 0.2 )
+  assert_that( reparse.calls, contains( ( '/foo', 2 ) ) )
+  assert_that( scheduler.IsPending( '/foo' ), equal_to( False ) )
+
+
+def ReparseScheduler_ScheduleDelaysReparse_test():
+  reparse = RecordingReparse()
+  scheduler = ReparseScheduler( reparse, 0.3 )
+  for _ in range( 3 ):
+    scheduler.Schedule( '/foo' )
+    sleep( 0.2 )
+  assert_that( reparse.calls, empty() )
+
+  assert_that( reparse.called.wait( 5 ), equal_to( True ) )
+  assert_that( reparse.calls, contains( ( '/foo', ) ) )
+
+
+def ReparseScheduler_Cancel_test():
+  reparse = RecordingReparse()
+  scheduler = ReparseScheduler( reparse, 0.1 )
+  scheduler.Schedule( '/foo' )
+  scheduler.Cancel( '/foo' )
+  scheduler.Schedule( '/bar' )
+
+  assert_that( reparse.called.wait( 5 ), equal_to( True ) )
+  sleep( 0.2 )
+  assert_that( reparse.calls, contains( ( '/bar', ) ) )
+
+
+def ReparseScheduler_Disabled_test():
+  reparse = RecordingReparse()
+  scheduler = ReparseScheduler( reparse, 0 )
+  scheduler.Schedule( '/foo' )
+  assert_that( scheduler.IsPending( '/foo' ), equal_to( False ) )
+  assert_that( reparse.called.wait( 0.2 ), equal_to( False ) )
+
+
+def ReparseScheduler_SurvivesReparseFailure_test():
+  reparse = RecordingReparse( failures = 1 )
+  scheduler = ReparseScheduler( reparse, 0.05 )
+  scheduler.Schedule( '/foo' )
+  sleep( 0.2 )
+  scheduler.Schedule( '/bar' )
+
+  assert_that( reparse.called.wait( 5 ), equal_to( True ) )
+  assert_that( reparse.calls, contains( ( '/bar', ) ) )
@@ -27,7 +27,8 @@ from hamcrest import ( assert_that,
                        empty,
                        has_entries,
                        has_entry,
-                       has_items )
+                       has_items,
+                       instance_of )
 
 from ycmd.tests.clangd import ( IsolatedYcmd, PathToTestFile, SharedYcmd,
                                 RunAfterInitialized )
@@ -64,6 +65,10 @@ def DebugInfo_NotInitialized_test( app ):
             'key': 'Settings',
             'value': '{}',
           } ),
+          has_entries( {
+            'key': 'Requests',
+            'value': instance_of( str ),
+          } ),
           has_entries( {
             'key': 'Compilation Command',
             'value': False,
@@ -101,6 +106,10 @@ def DebugInfo_Initialized_test( app ):
             'key': 'Settings',
             'value': '{}',
           } ),
+          has_entries( {
+            'key': 'Requests',
+            'value': instance_of( str ),
+          } ),
           has_entries( {
             'key': 'Compilation Command',
             'value': False,
@@ -140,6 +149,10 @@ def DebugInfo_ExtraConf_ReturningFlags_test( app ):
             'key': 'Settings',
             'value': '{}',
           } ),
+          has_entries( {
+            'key': 'Requests',
+            'value': instance_of( str ),
+          } ),
           has_entries( {
             'key': 'Compilation Command',
             'value': has_items( '-I', 'include', '-DFOO' ),
@@ -180,6 +193,10 @@ def DebugInfo_ExtraConf_NotReturningFlags_test( app ):
             'key': 'Settings',
             'value': '{}',
           } ),
+          has_entries( {
+            'key': 'Requests',
+            'value': instance_of( str ),
+          } ),
           has_entries( {
             'key': 'Compilation Command',
             'value': False
@@ -222,6 +239,10 @@ def DebugInfo_ExtraConf_Global_test( app ):
             'key': 'Settings',
             'value': '{}',
           } ),
+          has_entries( {
+            'key': 'Requests',
+            'value': instance_of( str ),
+          } ),
           has_entries( {
             'key': 'Compilation Command',
             'value': has_items( '-I', 'test' ),
@@ -265,6 +286,10 @@ def DebugInfo_ExtraConf_LocalOverGlobal_test( app ):
             'key': 'Settings',
             'value': '{}',
           } ),
+          has_entries( {
+            'key': 'Requests',
+            'value': instance_of( str ),
+          } ),
           has_entries( {
             'key': 'Compilation Command',
             'value': has_items( '-I', 'include', '-DFOO' ),
@@ -315,6 +340,10 @@ def DebugInfo_ExtraConf_Database_test():
                   'key': 'Settings',
                   'value': '{}',
                 } ),
+                has_entries( {
+                  'key': 'Requests',
+                  'value': instance_of( str ),
+                } ),
                 has_entries( {
                   'key': 'Compilation Command',
                   'value': False
@@ -375,6 +404,10 @@ def Settings( **kwargs ):
                     'key': 'Settings',
                     'value': '{}',
                   } ),
+                  has_entries( {
+                    'key': 'Requests',
+                    'value': instance_of( str ),
+                  } ),
                   has_entries( {
                     'key': 'Compilation Command',
                     'value': has_items( '-x', 'c++', '-I', 'ycm' )
@@ -432,6 +465,10 @@ def DebugInfo_ExtraConf_UseDatabaseOverGlobal_test():
                   'key': 'Settings',
                   'value': '{}',
                 } ),
+                has_entries( {
+                  'key': 'Requests',
+                  'value': instance_of( str ),
+                } ),
                 has_entries( {
                   'key': 'Compilation Command',
                   'value': False
@@ -474,6 +511,10 @@ def DebugInfo_ExtraConf_MacIncludeFlags_test( app ):
             'key': 'Settings',
             'value': '{}',
           } ),
+          has_entries( {
+            'key': 'Requests',
+            'value': instance_of( str ),
+          } ),
           has_entries( {
             'key': 'Compilation Command',
             'value': has_items( '-isystem', '-iframework' )
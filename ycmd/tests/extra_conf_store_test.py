@@ -23,10 +23,11 @@ from __future__ import absolute_import
 from builtins import *  # noqa
 
 import inspect
+import sys
 from mock import patch
 
 from hamcrest import ( assert_that, calling, equal_to, has_length, has_property,
-                       none, raises, same_instance )
+                       is_not, none, raises, same_instance )
 from ycmd import extra_conf_store
 from ycmd.responses import UnknownExtraConf
 from ycmd.tests import IsolatedYcmd, PathToTestFile
@@ -250,6 +251,75 @@ def Load_DoNotReloadExtraConf_ForceEqualsTrue_test( app ):
     )
 
 
+@IsolatedYcmd()
+def ReloadIfModified_NotLoaded_test( app ):
+  assert_that( extra_conf_store.ReloadIfModified( PROJECT_EXTRA_CONF ), none() )
+
+
+@IsolatedYcmd()
+def ReloadIfModified_ReloadModifiedExtraConf_test( app ):
+  with patch( 'ycmd.extra_conf_store._ShouldLoad', return_value = True ):
+    module = extra_conf_store.Load( PROJECT_EXTRA_CONF )
+    assert_that( extra_conf_store.ReloadIfModified( PROJECT_EXTRA_CONF ),
+                 same_instance( module ) )
+
+    with patch( 'ycmd.extra_conf_store.GetModificationTime',
+                return_value = module.ycm_extra_conf_mtime + 1 ):
+      reloaded = extra_conf_store.ReloadIfModified( PROJECT_EXTRA_CONF )
+    assert_that( reloaded, is_not( same_instance( module ) ) )
+    assert_that( inspect.getfile( reloaded ), equal_to( PROJECT_EXTRA_CONF ) )
+    assert_that( extra_conf_store.Load( PROJECT_EXTRA_CONF ),
+                 same_instance( reloaded ) )
+
+
+@IsolatedYcmd()
+def ReloadIfModified_KeepModuleOnError_test( app ):
+  with patch( 'ycmd.extra_conf_store._ShouldLoad', return_value = True ):
+    module = extra_conf_store.Load( PROJECT_EXTRA_CONF )
+    with patch( 'ycmd.extra_conf_store.GetModificationTime',
+                return_value = module.ycm_extra_conf_mtime + 1 ):
+      with patch( 'ycmd.extra_conf_store.LoadPythonSource',
+                  side_effect = SyntaxError ) as load_python_source:
+        sys_path = list( sys.path )
+        assert_that( extra_conf_store.ReloadIfModified( PROJECT_EXTRA_CONF ),
+                     same_instance( module ) )
+        assert_that( sys.path, equal_to( sys_path ) )
+        # The broken file isn't loaded again until it is modified again.
+        assert_that( extra_conf_store.ReloadIfModified( PROJECT_EXTRA_CONF ),
+                     same_instance( module ) )
+        assert_that( load_python_source.call_count, equal_to( 1 ) )
+    assert_that( extra_conf_store.Load( PROJECT_EXTRA_CONF ),
+                 same_instance( module ) )
+
+
+@IsolatedYcmd()
+def ReloadIfModified_ModifiedExtraConfMustBeConfirmed_test( app ):
+  with patch( 'ycmd.extra_conf_store._ShouldLoad', return_value = True ):
+    module = extra_conf_store.Load( PROJECT_EXTRA_CONF )
+
+  with patch( 'ycmd.extra_conf_store.GetModificationTime',
+              return_value = module.ycm_extra_conf_mtime + 1 ):
+    assert_that(
+      calling( extra_conf_store.ReloadIfModified ).with_args(
+        PROJECT_EXTRA_CONF ),
+      raises( UnknownExtraConf ) )
+    # Neither the previous module nor the modified one is used until the user
+    # confirms it.
+    assert_that( calling( extra_conf_store.Load ).with_args(
+                   PROJECT_EXTRA_CONF ),
+                 raises( UnknownExtraConf ) )
+
+
+@IsolatedYcmd( { 'extra_conf_globlist': [ '!' + PROJECT_EXTRA_CONF ] } )
+def ReloadIfModified_ModifiedExtraConfBlacklisted_test( app ):
+  module = extra_conf_store.Load( PROJECT_EXTRA_CONF, force = True )
+
+  with patch( 'ycmd.extra_conf_store.GetModificationTime',
+              return_value = module.ycm_extra_conf_mtime + 1 ):
+    assert_that( extra_conf_store.ReloadIfModified( PROJECT_EXTRA_CONF ),
+                 none() )
+
+
 def ExtraConfStore_IsGlobalExtraConfStore_NotAExtraConf_test():
   assert_that( calling( extra_conf_store.IsGlobalExtraConfModule ).with_args(
     extra_conf_store ), raises( AttributeError ) )
@@ -68,6 +68,10 @@ def DebugInfo_test( app ):
             'value': matches_regexp( '{\n  "fuzzyMatching": false,\\s?\n'
                                      '  "hoverKind": "Structured"\n}' )
           } ),
+          has_entries( {
+            'key': 'Requests',
+            'value': instance_of( str ),
+          } ),
         )
       } ) ),
     } ) )
@@ -107,6 +111,10 @@ def DebugInfo_ProjectDirectory_test( app ):
             'value': matches_regexp( '{\n  "fuzzyMatching": false,\\s?\n'
                                      '  "hoverKind": "Structured"\n}' )
           } ),
+          has_entries( {
+            'key': 'Requests',
+            'value': instance_of( str ),
+          } ),
         )
       } ) ),
     } ) )
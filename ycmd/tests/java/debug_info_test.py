@@ -106,6 +106,10 @@ def DebugInfo_test( app ):
               indent = 2,
               sort_keys = True )
           } ),
+          has_entries( {
+            'key': 'Requests',
+            'value': instance_of( str ),
+          } ),
           has_entries( { 'key': 'Startup Status',
                          'value': 'Ready' } ),
           has_entries( { 'key': 'Java Path',
@@ -160,6 +164,10 @@ def Subcommands_ExtraConf_SettingsValid_test( app ):
               indent = 2,
               sort_keys = True )
           } ),
+          has_entries( {
+            'key': 'Requests',
+            'value': instance_of( str ),
+          } ),
           has_entries( { 'key': 'Startup Status',
                          'value': 'Ready' } ),
           has_entries( { 'key': 'Java Path',
@@ -263,6 +263,10 @@ def GenericLSPCompleter_DebugInfo_CustomRoot_test( app, *args ):
             'key': 'Settings',
             'value': '{}'
           } ),
+          has_entries( {
+            'key': 'Requests',
+            'value': instance_of( str ),
+          } ),
         )
       } ) ),
     } ) )
@@ -49,7 +49,8 @@ from ycmd.tests.test_utils import ( BuildRequest,
                                     ChunkMatcher,
                                     DummyCompleter,
                                     LocationMatcher,
-                                    RangeMatcher )
+                                    RangeMatcher,
+                                    TemporaryTestDir )
 from ycmd.tests.language_server import IsolatedYcmd, PathToTestFile
 from ycmd import handlers, utils, responses
 import os
@@ -689,6 +690,43 @@ def LanguageServerCompleter_GetCompletions_List_test():
       )
 
 
+def LanguageServerCompleter_GetCompletions_CancelSuperseded_test():
+  completer = MockCompleter()
+  request_data = RequestWrap( BuildRequest() )
+  connection = completer.GetConnection()
+
+  # A completion request still in flight for the same file.
+  superseded = connection.GetResponseAsync(
+    1, lsp.Completion( 1, request_data, 1 ) )
+  completer._pending_completions[ request_data[ 'filepath' ] ] = 1
+
+  completion_response = { 'result': [ { 'label': 'test' } ] }
+
+  with patch.object( completer, '_is_completion_provider', True ):
+    with patch.object( connection,
+                       'GetResponse',
+                       return_value = completion_response ):
+      completer.ComputeCandidatesInner( request_data, 1 )
+
+  assert_that( calling( superseded.AwaitResponse ).with_args( 10 ),
+               raises( lsc.ResponseCancelledException ) )
+  assert_that( completer._pending_completions, empty() )
+
+
+def LanguageServerCompleter_GetCompletions_Superseded_test():
+  completer = MockCompleter()
+  request_data = RequestWrap( BuildRequest() )
+
+  with patch.object( completer, '_is_completion_provider', True ):
+    with patch.object( completer.GetConnection(),
+                       'GetResponse',
+                       side_effect = lsc.ResponseCancelledException ):
+      # No result, and none to be reused by the next request.
+      assert_that( completer.ComputeCandidatesInner( request_data, 1 ),
+                   contains( empty(), True ) )
+  assert_that( completer._pending_completions, empty() )
+
+
 def LanguageServerCompleter_GetCompletions_UnsupportedKinds_test():
   completer = MockCompleter()
   request_data = RequestWrap( BuildRequest() )
@@ -1297,6 +1335,51 @@ def LanguageServerCompleter_Diagnostics_Code_test():
     )
 
 
+def LanguageServerCompleter_Diagnostics_PositionEncoding_test():
+  def Test( capabilities, expected_encoding, expected_column ):
+    completer = MockCompleter()
+    filepath = os.path.realpath( '/foo.cpp' )
+    uri = lsp.FilePathToUri( filepath )
+    request_data = RequestWrap( BuildRequest( line_num = 1,
+                                              column_num = 1,
+                                              filepath = filepath,
+                                              contents = 'é😉 = x;' ) )
+    notification = {
+      'jsonrpc': '2.0',
+      'method': 'textDocument/publishDiagnostics',
+      'params': {
+        'uri': uri,
+        'diagnostics': [ {
+          'range': {
+            'start': { 'line': 0, 'character': 6 },
+            'end': { 'line': 0, 'character': 6 }
+          },
+          'severity': 1,
+          'message': 'Error'
+        } ]
+      }
+    }
+
+    completer._HandleInitializeInPollThread( {
+      'result': { 'capabilities': capabilities }
+    } )
+    assert_that( completer._position_encoding, equal_to( expected_encoding ) )
+
+    completer.HandleNotificationInPollThread( notification )
+    with patch.object( completer, 'ServerIsReady', return_value = True ):
+      assert_that( completer.OnFileReadyToParse( request_data ), contains(
+        has_entries( {
+          'location': LocationMatcher( filepath, 1, expected_column )
+        } )
+      ) )
+
+  # The same character offset is the start of 'x' in UTF-16 code units, of the
+  # space after the emoji in bytes and of the semicolon in codepoints.
+  yield Test, {}, 'utf-16', 10
+  yield Test, { 'positionEncoding': 'utf-8' }, 'utf-8', 7
+  yield Test, { 'positionEncoding': 'utf-32' }, 'utf-32', 11
+
+
 def LanguageServerCompleter_Diagnostics_PercentEncodeCannonical_test():
   completer = MockCompleter()
   filepath = os.path.realpath( '/foo?' )
@@ -1412,6 +1495,117 @@ def LanguageServerCompleter_OnFileReadyToParse_InvalidURI_test():
       uri_to_filepath.assert_called()
 
 
+def LanguageServerCompleter_Diagnostics_ConvertedOnce_test():
+  completer = MockCompleter()
+  filepath = os.path.realpath( '/foo' )
+  uri = lsp.FilePathToUri( filepath )
+  request_data = RequestWrap( BuildRequest( line_num = 1,
+                                            column_num = 1,
+                                            filepath = filepath,
+                                            contents = 'line1\nline2' ) )
+  notification = {
+    'jsonrpc': '2.0',
+    'method': 'textDocument/publishDiagnostics',
+    'params': {
+      'uri': uri,
+      'diagnostics': [ {
+        'range': {
+          'start': { 'line': 1, 'character': 0 },
+          'end': { 'line': 1, 'character': 5 }
+        },
+        'severity': 1,
+        'message': 'First error'
+      } ]
+    }
+  }
+  completer.GetConnection()._notifications.put( notification )
+  completer.HandleNotificationInPollThread( notification )
+  completer._HandleInitializeInPollThread(
+    { 'result': { 'capabilities': {} } } )
+
+  diagnostics = contains( has_entries( {
+    'location': LocationMatcher( filepath, 2, 1 ),
+    'text': equal_to( 'First error' )
+  } ) )
+
+  with patch.object( lsc,
+                     '_BuildDiagnostic',
+                     wraps = lsc._BuildDiagnostic ) as build_diagnostic:
+    # Diagnostics are converted once and reused by the poll.
+    assert_that( completer.OnFileReadyToParse( request_data ), diagnostics )
+    assert_that( completer.OnFileReadyToParse( request_data ), diagnostics )
+    assert_that( completer.PollForMessages( request_data ),
+                 contains( has_entries( { 'diagnostics': diagnostics } ) ) )
+    eq_( build_diagnostic.call_count, 1 )
+
+    # They are converted again when the file changes.
+    request_data = RequestWrap( BuildRequest( line_num = 1,
+                                              column_num = 1,
+                                              filepath = filepath,
+                                              contents = 'line1\nline 2' ) )
+    assert_that( completer.OnFileReadyToParse( request_data ), diagnostics )
+    eq_( build_diagnostic.call_count, 2 )
+
+    # And when new diagnostics are published.
+    notification[ 'params' ][ 'diagnostics' ] = list(
+      notification[ 'params' ][ 'diagnostics' ] )
+    completer.HandleNotificationInPollThread( notification )
+    assert_that( completer.OnFileReadyToParse( request_data ), diagnostics )
+    eq_( build_diagnostic.call_count, 3 )
+
+
+def LanguageServerCompleter_UpdateSavedFiles_RereadOnlyWhenStatChanges_test():
+  completer = MockCompleter()
+  request_data = RequestWrap( BuildRequest( filepath = '/foo', contents = '' ) )
+
+  with TemporaryTestDir() as tmp_dir:
+    saved_file = os.path.join( tmp_dir, 'saved.foo' )
+    with open( saved_file, 'w' ) as f:
+      f.write( 'saved' )
+
+    # The file was opened as a dirty buffer and is no longer dirty.
+    completer._server_file_state[ saved_file ].ChangeContents( 'dirty' )
+
+    with patch.object( lsc,
+                       'GetFileContents',
+                       wraps = lsc.GetFileContents ) as get_file_contents:
+      with patch.object( completer.GetConnection(),
+                         'SendNotification' ) as send_notification:
+        # The on-disk contents are read the first time only.
+        completer._UpdateSavedFilesUnderLock( request_data )
+        completer._UpdateSavedFilesUnderLock( request_data )
+        eq_( get_file_contents.call_count, 1 )
+        eq_( send_notification.call_count, 1 )
+
+        # Changing the file on disk triggers a new read.
+        with open( saved_file, 'w' ) as f:
+          f.write( 'saved again' )
+        completer._UpdateSavedFilesUnderLock( request_data )
+        eq_( get_file_contents.call_count, 2 )
+        eq_( send_notification.call_count, 2 )
+
+    # A file that can no longer be accessed must be purged.
+    os.remove( saved_file )
+    assert_that( completer._UpdateSavedFilesUnderLock( request_data ),
+                 contains( saved_file ) )
+
+
+def LanguageServerCompleter_UpdateSavedFiles_RemovedWhileReading_test():
+  completer = MockCompleter()
+  request_data = RequestWrap( BuildRequest( filepath = '/foo', contents = '' ) )
+
+  with TemporaryTestDir() as tmp_dir:
+    saved_file = os.path.join( tmp_dir, 'saved.foo' )
+    with open( saved_file, 'w' ) as f:
+      f.write( 'saved' )
+    completer._server_file_state[ saved_file ].ChangeContents( 'dirty' )
+
+    # The file is removed after its stat is read.
+    with patch.object( lsc, 'GetFileContents', side_effect = IOError ):
+      assert_that( completer._UpdateSavedFilesUnderLock( request_data ),
+                   contains( saved_file ) )
+
+
 def _TupleToLSPRange( tuple ):
   return { 'line': tuple[ 0 ], 'character': tuple[ 1 ] }
 
@@ -24,9 +24,19 @@ from builtins import *  # noqa
 
 from mock import patch, MagicMock
 from ycmd.completers.language_server import language_server_completer as lsc
-from hamcrest import assert_that, calling, equal_to, raises
+from ycmd.completers.language_server import language_server_protocol as lsp
+from hamcrest import ( assert_that,
+                       calling,
+                       contains,
+                       equal_to,
+                       has_entries,
+                       instance_of,
+                       raises )
 from ycmd.tests.language_server import MockConnection
+from ycmd.tests.test_utils import TemporaryTestDir
 
+import json
+import os
 import queue
 
 
@@ -89,6 +99,81 @@ def LanguageServerConnection_RequestAbortAwait_test():
                  raises( lsc.ResponseAbortedException ) )
 
 
+def LanguageServerConnection_RequestTimeout_Cancelled_test():
+  connection = MockConnection()
+
+  with patch.object( connection, 'WriteData' ) as write_data:
+    request = lsp.BuildRequest( 1, 'textDocument/completion', {} )
+    assert_that(
+      calling( connection.GetResponse ).with_args(
+        1, request, 0, method = 'textDocument/completion' ),
+      raises( lsc.ResponseTimeoutException ) )
+    write_data.assert_called_with( lsp.CancelRequest( 1 ) )
+
+  # The late response is ignored.
+  connection._DispatchMessage( { 'id': 1, 'result': [] } )
+  assert_that( connection._responses, equal_to( {} ) )
+  assert_that( connection.RequestStatistics(), equal_to( {
+    'textDocument/completion': { 'completed': 0, 'cancelled': 1 }
+  } ) )
+
+
+def LanguageServerConnection_CancelRequest_test():
+  connection = MockConnection()
+
+  response = connection.GetResponseAsync(
+    1,
+    lsp.BuildRequest( 1, 'textDocument/hover', {} ),
+    method = 'textDocument/hover' )
+  assert_that( connection.CancelRequest( 1 ), equal_to( True ) )
+  assert_that( calling( response.AwaitResponse ).with_args( 10 ),
+               raises( lsc.ResponseCancelledException ) )
+
+  connection.GetResponseAsync(
+    2,
+    lsp.BuildRequest( 2, 'textDocument/hover', {} ),
+    method = 'textDocument/hover' )
+  connection._DispatchMessage( { 'id': 2, 'result': None } )
+  # Requests issued without a method are not counted.
+  connection.GetResponseAsync( 3, lsp.BuildRequest( 3, 'shutdown', None ) )
+  connection._DispatchMessage( { 'id': 3, 'result': None } )
+  # Already completed.
+  assert_that( connection.CancelRequest( 2 ), equal_to( False ) )
+
+  assert_that( connection.RequestStatistics(), equal_to( {
+    'textDocument/hover': { 'completed': 1, 'cancelled': 1 }
+  } ) )
+
+
+def LanguageServerConnection_Recording_test():
+  connection = MockConnection()
+
+  with TemporaryTestDir() as tmp_dir:
+    recording = os.path.join( tmp_dir, 'recording.jsonl' )
+    connection.StartRecording( recording )
+    connection.SendNotification( lsp.Exit() )
+    connection._DispatchMessage( { 'method': 'window/logMessage' } )
+    connection.StopRecording()
+    # Not recorded.
+    connection.SendNotification( lsp.Exit() )
+
+    with open( recording ) as f:
+      entries = [ json.loads( line ) for line in f ]
+
+  assert_that( entries, contains(
+    has_entries( {
+      'time': instance_of( float ),
+      'sender': 'client',
+      'message': { 'jsonrpc': '2.0', 'method': 'exit', 'params': None }
+    } ),
+    has_entries( {
+      'time': instance_of( float ),
+      'sender': 'server',
+      'message': { 'method': 'window/logMessage' }
+    } )
+  ) )
+
+
 def LanguageServerConnection_ServerConnectionDies_test():
   connection = MockConnection()
 
@@ -161,6 +246,40 @@ def LanguageServerConnection_AddNotificationToQueue_RingBuffer_test():
   assert_that( calling( notifications.get_nowait ), raises( queue.Empty ) )
 
 
+@patch.object( lsc, 'MAX_QUEUED_MESSAGES', 3 )
+def LanguageServerConnection_AddNotificationToQueue_CoalesceDiagnostics_test():
+  connection = MockConnection()
+  notifications = connection._notifications
+
+  def Diagnostics( uri, message ):
+    return {
+      'method': 'textDocument/publishDiagnostics',
+      'params': { 'uri': uri, 'diagnostics': [ { 'message': message } ] }
+    }
+
+  connection._AddNotificationToQueue( Diagnostics( 'file:/a', 'a1' ) )
+  connection._AddNotificationToQueue( 'one' )
+  connection._AddNotificationToQueue( Diagnostics( 'file:/b', 'b1' ) )
+
+  # The queue is full, but newer diagnostics replace the pending ones for the
+  # same file without discarding anything.
+  connection._AddNotificationToQueue( Diagnostics( 'file:/a', 'a2' ) )
+  connection._AddNotificationToQueue( Diagnostics( 'file:/b', 'b2' ) )
+
+  assert_that( notifications.get_nowait(),
+               equal_to( Diagnostics( 'file:/a', 'a2' ) ) )
+  assert_that( notifications.get_nowait(), equal_to( 'one' ) )
+  assert_that( notifications.get_nowait(),
+               equal_to( Diagnostics( 'file:/b', 'b2' ) ) )
+  assert_that( calling( notifications.get_nowait ), raises( queue.Empty ) )
+
+  # Once polled, diagnostics for the same file are queued again.
+  connection._AddNotificationToQueue( Diagnostics( 'file:/a', 'a3' ) )
+  assert_that( notifications.get_nowait(),
+               equal_to( Diagnostics( 'file:/a', 'a3' ) ) )
+  assert_that( calling( notifications.get_nowait ), raises( queue.Empty ) )
+
+
 def LanguageServerConnection_RejectUnsupportedRequest_test():
   connection = MockConnection()
 
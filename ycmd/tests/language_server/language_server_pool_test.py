@@ -0,0 +1,152 @@
+# Copyright (C) 2020 ycmd contributors
+#
+# This file is part of ycmd.
+#
+# ycmd is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ycmd is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ycmd.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+# Not installing aliases from python-future; it's unreliable and slow.
+from builtins import *  # noqa
+
+from hamcrest import ( assert_that, contains, equal_to, has_length,
+                       instance_of, is_not )
+from mock import MagicMock, patch
+import os
+
+from ycmd.completers.language_server.language_server_pool import (
+  LanguageServerPool )
+from ycmd.request_wrap import RequestWrap
+from ycmd.server_state import ServerState
+from ycmd.tests.test_utils import BuildRequest
+from ycmd.user_options_store import DefaultOptions
+
+
+def _BuildPool( **options ):
+  user_options = DefaultOptions()
+  user_options.update( options )
+
+  resolver = MagicMock()
+  resolver.SupportedFiletypes.return_value = [ 'foo' ]
+  resolver.ProjectDirectoryForFile.side_effect = (
+    lambda request_data: os.path.dirname( request_data[ 'filepath' ] ) )
+
+  created = []
+
+  def Factory():
+    completer = MagicMock()
+    created.append( completer )
+    return completer
+
+  return LanguageServerPool( user_options, Factory, resolver ), created
+
+
+def _Request( filepath ):
+  return RequestWrap( BuildRequest( filepath = filepath, filetype = 'foo' ) )
+
+
+def LanguageServerPool_InstancePerProject_test():
+  pool, created = _BuildPool( max_language_server_instances = 3 )
+
+  pool.OnFileReadyToParse( _Request( '/a/file1' ) )
+  pool.OnFileReadyToParse( _Request( '/b/file' ) )
+  pool.OnFileReadyToParse( _Request( '/a/file2' ) )
+
+  assert_that( created, has_length( 2 ) )
+  assert_that( created[ 0 ].OnFileReadyToParse.call_count, equal_to( 2 ) )
+  assert_that( created[ 1 ].OnFileReadyToParse.call_count, equal_to( 1 ) )
+
+
+@patch( 'ycmd.utils.StartThread', side_effect = lambda func: func() )
+def LanguageServerPool_EvictLeastRecentlyUsed_test( *args ):
+  pool, created = _BuildPool( max_language_server_instances = 2 )
+
+  pool.OnFileReadyToParse( _Request( '/a/file' ) )
+  pool.OnFileReadyToParse( _Request( '/b/file' ) )
+  pool.OnFileReadyToParse( _Request( '/a/file' ) )
+  pool.OnFileReadyToParse( _Request( '/c/file' ) )
+
+  assert_that( created, has_length( 3 ) )
+  assert_that( [ completer.Shutdown.called for completer in created ],
+               contains( False, True, False ) )
+
+  # Closing a file doesn't restart the server for its project.
+  pool.OnBufferUnload( _Request( '/b/file' ) )
+  assert_that( created, has_length( 3 ) )
+
+
+@patch( 'ycmd.utils.StartThread', side_effect = lambda func: func() )
+def LanguageServerPool_EvictIdle_test( *args ):
+  pool, created = _BuildPool( max_language_server_instances = 3,
+                              language_server_idle_timeout = 60 )
+
+  with patch( 'time.time', return_value = 1000 ):
+    pool.OnFileReadyToParse( _Request( '/a/file' ) )
+  with patch( 'time.time', return_value = 1050 ):
+    pool.OnFileReadyToParse( _Request( '/b/file' ) )
+  with patch( 'time.time', return_value = 1100 ):
+    pool.OnFileReadyToParse( _Request( '/b/file' ) )
+
+  assert_that( [ completer.Shutdown.called for completer in created ],
+               contains( True, False ) )
+
+
+def LanguageServerPool_ProjectDirectoryCachedUntilUnload_test():
+  pool, created = _BuildPool( max_language_server_instances = 3 )
+  resolver = pool._resolver
+
+  pool.OnFileReadyToParse( _Request( '/a/file' ) )
+  pool.PollForMessages( _Request( '/a/file' ) )
+  pool.DebugInfo( _Request( '/a/file' ) )
+  assert_that( resolver.ProjectDirectoryForFile.call_count, equal_to( 1 ) )
+
+  pool.OnBufferUnload( _Request( '/a/file' ) )
+  pool.OnFileReadyToParse( _Request( '/a/file' ) )
+  assert_that( resolver.ProjectDirectoryForFile.call_count, equal_to( 2 ) )
+
+
+def _ServerState( **options ):
+  user_options = DefaultOptions()
+  user_options.update( options )
+  user_options[ 'language_server' ] = [ {
+    'name': 'foo',
+    'cmdline': [ 'foo' ],
+    'filetypes': [ 'foo' ]
+  } ]
+  return ServerState( user_options )
+
+
+def LanguageServerPool_UsedByServerState_test():
+  server_state = _ServerState( max_language_server_instances = 2 )
+  completer = server_state.GetFiletypeCompleter( [ 'foo' ] )
+  assert_that( completer, instance_of( LanguageServerPool ) )
+
+  instances = []
+
+  def Factory():
+    instances.append( MagicMock() )
+    return instances[ -1 ]
+
+  with patch.object( completer, '_completer_factory', Factory ):
+    server_state.GetFiletypeCompleter( [ 'foo' ] ).OnFileReadyToParse(
+      _Request( '/a/file' ) )
+  assert_that( instances, has_length( 1 ) )
+  instances[ 0 ].OnFileReadyToParse.assert_called_once()
+
+  # Not pooled by default.
+  server_state = _ServerState()
+  assert_that( server_state.GetFiletypeCompleter( [ 'foo' ] ),
+               is_not( instance_of( LanguageServerPool ) ) )
@@ -25,7 +25,8 @@ from __future__ import absolute_import
 from builtins import *  # noqa
 
 from ycmd.completers.language_server import language_server_protocol as lsp
-from hamcrest import assert_that, equal_to, calling, is_not, raises
+from hamcrest import ( assert_that, calling, equal_to, has_entry, has_item,
+                       is_not, raises )
 from ycmd.tests.test_utils import UnixOnly, WindowsOnly
 
 
@@ -213,3 +214,147 @@ def CodepointsToUTF16CodeUnitsAndReverse_test():
 
   for test in tests:
     yield Test, test[ 0 ], test[ 1 ], test[ 2 ]
+
+
+def CodepointsToCodeUnitsAndReverse_test():
+  def Test( line_value, codepoints, encoding, code_units ):
+    assert_that( lsp.CodepointsToCodeUnits( line_value, codepoints, encoding ),
+                 equal_to( code_units ) )
+    assert_that( lsp.CodeUnitsToCodepoints( line_value, code_units, encoding ),
+                 equal_to( codepoints ) )
+
+  tests = (
+    ( 'abc', 2, 'utf-8', 2 ),
+    ( 'abc', 2, 'utf-32', 2 ),
+    ( 'abc', 2, 'utf-16', 2 ),
+    ( 'éa', 2, 'utf-8', 3 ),
+    ( 'éa', 2, 'utf-32', 2 ),
+    ( 'éa', 2, 'utf-16', 2 ),
+    ( 'a😉b', 3, 'utf-8', 6 ),
+    ( 'a😉b', 3, 'utf-32', 3 ),
+    ( 'a😉b', 4, 'utf-8', 7 ),
+    ( 'a😉b', 4, 'utf-32', 4 ),
+  )
+
+  for test in tests:
+    yield Test, test[ 0 ], test[ 1 ], test[ 2 ], test[ 3 ]
+
+
+def UTF16CodeUnitsToCodepoints_OffsetTableCached_test():
+  line_value = 'a😉b😉c'
+  assert_that( lsp.CodepointsToUTF16CodeUnits( line_value, 4 ), equal_to( 6 ) )
+  assert_that( lsp._utf16_offset_tables,
+               has_entry( line_value, equal_to( ( [ 1, 3 ], [ 3, 6 ] ) ) ) )
+  assert_that( lsp.UTF16CodeUnitsToCodepoints( line_value, 6 ), equal_to( 4 ) )
+  assert_that( lsp.UTF16CodeUnitsToCodepoints( line_value, 8 ), equal_to( 6 ) )
+
+  # Lines without surrogate pairs don't need a table.
+  assert_that( lsp.CodepointsToUTF16CodeUnits( 'aéb', 3 ), equal_to( 3 ) )
+  assert_that( lsp._utf16_offset_tables, has_entry( 'aéb', None ) )
+
+
+def Position_Encoding_test():
+  assert_that( lsp.Position( 2, 'é😉a', 3 ),
+               equal_to( { 'line': 1, 'character': 3 } ) )
+  assert_that( lsp.Position( 2, 'é😉a', 3, 'utf-8' ),
+               equal_to( { 'line': 1, 'character': 6 } ) )
+  assert_that( lsp.Position( 2, 'é😉a', 3, 'utf-32' ),
+               equal_to( { 'line': 1, 'character': 2 } ) )
+
+
+def Initialize_PositionEncodings_test():
+  message = lsp.Parse(
+    lsp.Initialize( 1, '/project', {} ).split( b'\r\n\r\n', 1 )[ 1 ] )
+  assert_that( message[ 'params' ][ 'capabilities' ],
+               has_entry( 'general', has_entry( 'positionEncodings',
+                                                has_item( 'utf-16' ) ) ) )
+
+
+def _ApplyContentChanges( contents, changes ):
+  for change in changes:
+    lines = contents.split( '\n' )
+
+    def Offset( position ):
+      line = lines[ position[ 'line' ] ].encode( 'utf-16-le' )
+      prefix = line[ : position[ 'character' ] * 2 ].decode( 'utf-16-le' )
+      before = lines[ : position[ 'line' ] ]
+      return sum( len( previous ) + 1 for previous in before ) + len( prefix )
+
+    start = Offset( change[ 'range' ][ 'start' ] )
+    end = Offset( change[ 'range' ][ 'end' ] )
+    contents = contents[ : start ] + change[ 'text' ] + contents[ end : ]
+  return contents
+
+
+def ServerFileState_ChangeContents_Incremental_test():
+  def Test( old_contents, new_contents, expected_changes ):
+    file_state = lsp.ServerFileState( 'file' )
+    assert_that( file_state.ChangeContents( old_contents ),
+                 equal_to( ( lsp.ServerFileState.OPEN_FILE, None ) ) )
+
+    action, changes = file_state.ChangeContents( new_contents )
+    assert_that( action, equal_to( lsp.ServerFileState.CHANGE_FILE ) )
+    assert_that( changes, equal_to( expected_changes ) )
+    assert_that( _ApplyContentChanges( old_contents, changes ),
+                 equal_to( new_contents ) )
+
+  def Range( start_line, start_character, end_line, end_character ):
+    return {
+      'start': { 'line': start_line, 'character': start_character },
+      'end': { 'line': end_line, 'character': end_character }
+    }
+
+  # Change within a line.
+  yield Test, 'a\nbcd\ne', 'a\nbXd\ne', [
+    { 'range': Range( 1, 1, 1, 2 ), 'text': 'X' } ]
+  # UTF-16 offsets.
+  yield Test, 'a\n𐐀bcd\ne', 'a\n𐐀bXd\ne', [
+    { 'range': Range( 1, 3, 1, 4 ), 'text': 'X' } ]
+  # Lines inserted and removed.
+  yield Test, 'a\nb\nc\n', 'a\nx\ny\nb\nc\n', [
+    { 'range': Range( 1, 0, 1, 0 ), 'text': 'x\ny\n' } ]
+  yield Test, 'a\nb\nc\nd', 'a\nd', [
+    { 'range': Range( 1, 0, 3, 0 ), 'text': '' } ]
+  # Edits at both ends of the file are sent as separate changes, last first.
+  yield Test, 'a\nb\nc\nd\ne\nf', 'A\nb\nc\nd\ne\nF', [
+    { 'range': Range( 5, 0, 5, 1 ), 'text': 'F' },
+    { 'range': Range( 0, 0, 0, 1 ), 'text': 'A' } ]
+  # Trailing newline added and removed.
+  yield Test, 'a\nb', 'a\nb\n', [
+    { 'range': Range( 1, 1, 1, 1 ), 'text': '\n' } ]
+  yield Test, 'a\nb\n', 'a\nb', [
+    { 'range': Range( 1, 1, 2, 0 ), 'text': '' } ]
+  yield Test, 'a\nb\n', 'a\nb\nc', [
+    { 'range': Range( 2, 0, 2, 0 ), 'text': 'c' } ]
+  yield Test, '', 'a\nb', [
+    { 'range': Range( 0, 0, 0, 0 ), 'text': 'a\nb' } ]
+
+
+def ServerFileState_ChangeContents_Encoding_test():
+  def Test( encoding, start_character, end_character ):
+    file_state = lsp.ServerFileState( 'file' )
+    file_state.ChangeContents( 'a\n𐐀bcd\ne' )
+    action, changes = file_state.ChangeContents( 'a\n𐐀bXd\ne',
+                                                 encoding = encoding )
+    assert_that( changes, equal_to( [ {
+      'range': {
+        'start': { 'line': 1, 'character': start_character },
+        'end': { 'line': 1, 'character': end_character }
+      },
+      'text': 'X'
+    } ] ) )
+
+  yield Test, 'utf-8', 5, 6
+  yield Test, 'utf-32', 2, 3
+  yield Test, 'utf-16', 3, 4
+
+
+def ServerFileState_ChangeContents_Full_test():
+  file_state = lsp.ServerFileState( 'file' )
+  file_state.ChangeContents( 'a', incremental = False )
+  assert_that( file_state.ChangeContents( 'a', incremental = False ),
+               equal_to( ( lsp.ServerFileState.NO_ACTION, None ) ) )
+  assert_that( file_state.ChangeContents( 'b', incremental = False ),
+               equal_to( ( lsp.ServerFileState.CHANGE_FILE, None ) ) )
+  assert_that( file_state.version, equal_to( 2 ) )
+  assert_that( file_state.contents, equal_to( 'b' ) )
@@ -0,0 +1,284 @@
+# Copyright (C) 2020 ycmd contributors
+#
+# This file is part of ycmd.
+#
+# ycmd is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ycmd is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ycmd.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Benchmark of the language server completer against a recorded session.
+
+The session recorded with the record_language_server_traffic option is played
+back by replay_server.py, while the client side of the session (initialize,
+opened and changed files, completion requests and the diagnostics received
+after them) is replayed through the completer. Completion item resolution is
+measured as part of completion. With --time-scale 0, the server replies
+immediately and the reported latencies are ycmd's own overhead.
+
+Run with the PYTHONPATH printed by run_tests.py --dump-path:
+  python -m ycmd.tests.language_server.replay_benchmark [--time-scale SCALE]
+      [--repeat N] RECORDING"""
+
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+# Not installing aliases from python-future; it's unreliable and slow.
+from builtins import *  # noqa
+
+import argparse
+import collections
+import os
+import sys
+import time
+
+from ycmd import user_options_store, utils
+from ycmd.completers.language_server import language_server_protocol as lsp
+from ycmd.completers.language_server.simple_language_server_completer import (
+  SimpleLSPCompleter )
+from ycmd.request_wrap import RequestWrap
+from ycmd.tests.language_server.replay_server import ( BuildReplies,
+                                                       LoadRecording )
+
+PATH_TO_REPLAY_SERVER = os.path.join(
+  os.path.dirname( os.path.abspath( __file__ ) ), 'replay_server.py' )
+
+REPORT_HEADER_FORMAT = '{:<25} {:>7} {:>10} {:>10} {:>10} {:>10} {:>10}'
+REPORT_LINE_FORMAT = (
+  '{:<25} {:>7} {:>10.2f} {:>10.2f} {:>10.2f} {:>10.2f} {:>10.1f}' )
+
+# All timeout values are in seconds
+INITIALIZE_TIMEOUT  = 30
+DIAGNOSTICS_TIMEOUT = 10
+
+
+class ReplayCompleter( SimpleLSPCompleter ):
+  def __init__( self, user_options, recording, filetypes, time_scale ):
+    self._recording = recording
+    self._filetypes = filetypes
+    self._time_scale = time_scale
+    super( ReplayCompleter, self ).__init__( user_options )
+
+
+  def GetServerName( self ):
+    return 'Replay Language Server'
+
+
+  def GetCommandLine( self ):
+    return [ sys.executable,
+             PATH_TO_REPLAY_SERVER,
+             '--time-scale', str( self._time_scale ),
+             self._recording ]
+
+
+  def SupportedFiletypes( self ):
+    return self._filetypes
+
+
+class Session( object ):
+  """Replays the client side of a recording through a ReplayCompleter and
+  records the latency of each operation."""
+
+  def __init__( self, recording, time_scale ):
+    self._entries = LoadRecording( recording )
+    self._client_messages = [ entry[ 'message' ] for entry in self._entries
+                              if entry[ 'sender' ] == 'client' ]
+    _, self._replies = BuildReplies( self._entries )
+
+    opened = [ message[ 'params' ][ 'textDocument' ]
+               for message in self._client_messages
+               if message.get( 'method' ) == 'textDocument/didOpen' ]
+    if not opened:
+      raise ValueError( 'No file is opened in {}'.format( recording ) )
+    self._filetypes = list( { document[ 'languageId' ]
+                              for document in opened } )
+    self._first_document = opened[ 0 ]
+
+    options = user_options_store.DefaultOptions()
+    # Don't load the extra conf files found next to the recorded files.
+    options[ 'extra_conf_globlist' ] = [ '!*' ]
+    user_options_store.SetAll( options )
+    self._completer = ReplayCompleter( options,
+                                       recording,
+                                       self._filetypes,
+                                       time_scale )
+    self._buffers = {}
+    self.latencies = collections.defaultdict( list )
+
+
+  def Run( self ):
+    try:
+      self._Initialize()
+
+      occurrences = collections.Counter()
+      for message in self._client_messages:
+        method = message.get( 'method', 'response' )
+        replies = self._replies.get( ( method, occurrences[ method ] ), [] )
+        occurrences[ method ] += 1
+
+        if method in ( 'textDocument/didOpen', 'textDocument/didChange' ):
+          self._FileChanged( method, message[ 'params' ], replies )
+        elif method == 'textDocument/completion':
+          self._Complete( message[ 'params' ] )
+    finally:
+      self._completer.Shutdown()
+
+
+  def _Initialize( self ):
+    filepath = lsp.UriToFilePath( self._first_document[ 'uri' ] )
+    self._buffers[ filepath ] = self._first_document[ 'text' ]
+
+    start = time.time()
+    self._completer.OnFileReadyToParse( self._BuildRequest( filepath ) )
+    if not self._completer._initialize_event.wait( INITIALIZE_TIMEOUT ):
+      raise RuntimeError( 'The replayed server was not initialized' )
+    self.latencies[ 'initialize' ].append( time.time() - start )
+
+
+  def _FileChanged( self, method, params, replies ):
+    filepath = lsp.UriToFilePath( params[ 'textDocument' ][ 'uri' ] )
+    if method == 'textDocument/didOpen':
+      self._buffers[ filepath ] = params[ 'textDocument' ][ 'text' ]
+    else:
+      for change in params[ 'contentChanges' ]:
+        self._buffers[ filepath ] = _ApplyChange(
+          self._buffers[ filepath ],
+          change,
+          self._completer._position_encoding )
+
+    request_data = self._BuildRequest( filepath )
+    start = time.time()
+    self._completer.OnFileReadyToParse( request_data )
+    self.latencies[ method ].append( time.time() - start )
+
+    if any( reply.get( 'method' ) == 'textDocument/publishDiagnostics' and
+            reply[ 'params' ][ 'uri' ] == params[ 'textDocument' ][ 'uri' ]
+            for _, _, reply in replies ):
+      self._AwaitDiagnostics( request_data, start )
+
+
+  def _AwaitDiagnostics( self, request_data, start ):
+    deadline = start + DIAGNOSTICS_TIMEOUT
+    while time.time() < deadline:
+      messages = self._completer.PollForMessagesInner(
+        request_data, deadline - time.time() )
+      if messages is False:
+        return
+      if messages is True:
+        continue
+      if any( 'diagnostics' in message and
+              message[ 'filepath' ] == request_data[ 'filepath' ]
+              for message in messages ):
+        self.latencies[ 'diagnostics' ].append( time.time() - start )
+        return
+
+
+  def _Complete( self, params ):
+    filepath = lsp.UriToFilePath( params[ 'textDocument' ][ 'uri' ] )
+    position = params[ 'position' ]
+    line = utils.SplitLines( self._buffers[ filepath ] )[ position[ 'line' ] ]
+    codepoint = lsp.CodeUnitsToCodepoints( line,
+                                           position[ 'character' ] + 1,
+                                           self._completer._position_encoding )
+    request_data = self._BuildRequest(
+      filepath,
+      line_num = position[ 'line' ] + 1,
+      column_num = utils.CodepointOffsetToByteOffset( line, codepoint ),
+      force_semantic = True )
+
+    # Every recorded completion request must be sent to the server.
+    self._completer._completions_cache.Invalidate()
+    start = time.time()
+    self._completer.ComputeCandidates( request_data )
+    self.latencies[ 'completion' ].append( time.time() - start )
+
+
+  def _BuildRequest( self, filepath, **kwargs ):
+    request = {
+      'line_num': 1,
+      'column_num': 1,
+      'filepath': filepath,
+      'filetypes': self._filetypes,
+      'file_data': {
+        path: { 'contents': contents, 'filetypes': self._filetypes }
+        for path, contents in self._buffers.items()
+      }
+    }
+    request.update( kwargs )
+    return RequestWrap( request )
+
+
+def _ApplyChange( contents, change, encoding ):
+  if 'range' not in change:
+    return change[ 'text' ]
+
+  lines = utils.SplitLines( contents )
+
+  def Offset( position ):
+    line = ( lines[ position[ 'line' ] ]
+             if position[ 'line' ] < len( lines ) else '' )
+    codepoint = lsp.CodeUnitsToCodepoints( line,
+                                           position[ 'character' ] + 1,
+                                           encoding )
+    return ( sum( len( previous ) + 1 for previous in
+                  lines[ : position[ 'line' ] ] ) + codepoint - 1 )
+
+  start = Offset( change[ 'range' ][ 'start' ] )
+  end = Offset( change[ 'range' ][ 'end' ] )
+  return contents[ : start ] + change[ 'text' ] + contents[ end : ]
+
+
+def _Percentile( values, percentile ):
+  return values[ min( len( values ) - 1,
+                      int( len( values ) * percentile / 100 ) ) ]
+
+
+def PrintReport( latencies ):
+  print( REPORT_HEADER_FORMAT.format(
+    'operation', 'count', 'mean ms', 'p50 ms', 'p90 ms', 'max ms', 'ops/s' ) )
+  for operation, values in sorted( latencies.items() ):
+    values = sorted( values )
+    total = sum( values )
+    print( REPORT_LINE_FORMAT.format(
+      operation,
+      len( values ),
+      total / len( values ) * 1000,
+      _Percentile( values, 50 ) * 1000,
+      _Percentile( values, 90 ) * 1000,
+      values[ -1 ] * 1000,
+      len( values ) / total if total else float( 'inf' ) ) )
+
+
+def Main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument( '--time-scale', type = float, default = 0.0,
+                       help = 'Multiply the recorded server delays by this '
+                              'factor (default: %(default)s, i.e. reply '
+                              'immediately).' )
+  parser.add_argument( '--repeat', type = int, default = 1,
+                       help = 'Number of times to replay the session '
+                              '(default: %(default)s).' )
+  parser.add_argument( 'recording', help = 'The recording to replay.' )
+  args = parser.parse_args()
+
+  latencies = collections.defaultdict( list )
+  for _ in range( args.repeat ):
+    session = Session( args.recording, args.time_scale )
+    session.Run()
+    for operation, values in session.latencies.items():
+      latencies[ operation ].extend( values )
+
+  PrintReport( latencies )
+
+
+if __name__ == '__main__':
+  Main()
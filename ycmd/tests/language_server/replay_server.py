@@ -0,0 +1,187 @@
+# Copyright (C) 2020 ycmd contributors
+#
+# This file is part of ycmd.
+#
+# ycmd is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ycmd is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ycmd.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Fake language server replaying a recording made with
+LanguageServerConnection.StartRecording over stdio.
+
+Each message received from the client is matched with the message of the same
+method (and the same number of previous messages with that method) in the
+recording. The server messages which followed it in the recording are then sent
+back with their original delay, multiplied by --time-scale. Responses get the id
+of the request received instead of the recorded one. Requests missing from the
+recording get a null result.
+
+Usage: python replay_server.py [--time-scale SCALE] RECORDING"""
+
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+
+import argparse
+import collections
+import json
+import sys
+import threading
+
+
+def LoadRecording( file_path ):
+  with open( file_path ) as recording:
+    return [ json.loads( line ) for line in recording if line.strip() ]
+
+
+def _MessageKey( message ):
+  """Key under which client messages are matched: their method, or 'response'
+  for the client's responses to server requests."""
+  return message.get( 'method', 'response' )
+
+
+def BuildReplies( entries ):
+  """Returns a tuple ( initial, replies ) where |initial| is the list of server
+  messages sent before the first client message and |replies| maps
+  ( key, occurrence ) of each client message to the list of
+  ( delay, recorded client message id, server message ) sent in reply."""
+  initial = []
+  replies = {}
+  occurrences = collections.Counter()
+  current = initial
+  client_time = 0
+  client_id = None
+
+  for entry in entries:
+    message = entry[ 'message' ]
+    if entry[ 'sender' ] == 'client':
+      key = _MessageKey( message )
+      current = replies.setdefault( ( key, occurrences[ key ] ), [] )
+      occurrences[ key ] += 1
+      client_time = entry[ 'time' ]
+      client_id = message.get( 'id' )
+    else:
+      current.append( ( entry[ 'time' ] - client_time, client_id, message ) )
+
+  return initial, replies
+
+
+class ReplayServer( object ):
+  def __init__( self, entries, time_scale, output ):
+    self._initial, self._replies = BuildReplies( entries )
+    self._occurrences = collections.Counter()
+    self._time_scale = time_scale
+    self._output = output
+    self._output_mutex = threading.Lock()
+    self._timers = []
+
+
+  def Start( self ):
+    for delay, _, message in self._initial:
+      self._Schedule( delay, message )
+
+
+  def MessageReceived( self, message ):
+    key = _MessageKey( message )
+    occurrence = self._occurrences[ key ]
+    self._occurrences[ key ] += 1
+
+    responded = False
+    for delay, recorded_id, reply in self._replies.get( ( key, occurrence ),
+                                                        [] ):
+      if ( 'method' not in reply and
+           recorded_id is not None and
+           reply.get( 'id' ) == recorded_id ):
+        reply = dict( reply, id = message[ 'id' ] )
+        responded = True
+      self._Schedule( delay, reply )
+
+    # Don't leave the client waiting for requests missing from the recording,
+    # e.g. shutdown.
+    if 'id' in message and 'method' in message and not responded:
+      self._Schedule( 0, { 'jsonrpc': '2.0',
+                           'id': message[ 'id' ],
+                           'result': None } )
+
+
+  def Stop( self ):
+    for timer in self._timers:
+      timer.cancel()
+
+
+  def _Schedule( self, delay, message ):
+    delay = max( delay * self._time_scale, 0 )
+    if not delay:
+      self._Write( message )
+      return
+
+    timer = threading.Timer( delay, self._Write, args = ( message, ) )
+    timer.daemon = True
+    timer.start()
+    self._timers.append( timer )
+
+
+  def _Write( self, message ):
+    data = json.dumps( message, separators = ( ',', ':' ) ).encode( 'utf-8' )
+    with self._output_mutex:
+      self._output.write(
+        'Content-Length: {0}\r\n\r\n'.format( len( data ) ).encode( 'utf-8' ) )
+      self._output.write( data )
+      self._output.flush()
+
+
+def ReadMessage( stream ):
+  """Reads a framed message from |stream|. Returns None at the end of the
+  stream."""
+  content_length = None
+  while True:
+    line = stream.readline()
+    if not line:
+      return None
+    line = line.strip()
+    if not line:
+      break
+    name, _, value = line.partition( b':' )
+    if name.strip().lower() == b'content-length':
+      content_length = int( value )
+
+  return json.loads( stream.read( content_length ).decode( 'utf-8' ) )
+
+
+def Main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument( '--time-scale', type = float, default = 1.0,
+                       help = 'Multiply the recorded delays by this factor. '
+                              'Use 0 to reply immediately.' )
+  parser.add_argument( 'recording', help = 'The recording to replay.' )
+  args = parser.parse_args()
+
+  stdin = getattr( sys.stdin, 'buffer', sys.stdin )
+  stdout = getattr( sys.stdout, 'buffer', sys.stdout )
+
+  server = ReplayServer( LoadRecording( args.recording ),
+                         args.time_scale,
+                         stdout )
+  server.Start()
+
+  while True:
+    message = ReadMessage( stdin )
+    if message is None or message.get( 'method' ) == 'exit':
+      break
+    server.MessageReceived( message )
+
+  server.Stop()
+
+
+if __name__ == '__main__':
+  Main()
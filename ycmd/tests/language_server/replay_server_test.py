@@ -0,0 +1,64 @@
+# Copyright (C) 2020 ycmd contributors
+#
+# This file is part of ycmd.
+#
+# ycmd is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# ycmd is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with ycmd.  If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import unicode_literals
+from __future__ import print_function
+from __future__ import division
+from __future__ import absolute_import
+# Not installing aliases from python-future; it's unreliable and slow.
+from builtins import *  # noqa
+
+from hamcrest import assert_that, contains, has_entries
+from io import BytesIO
+
+from ycmd.tests.language_server.replay_server import ReadMessage, ReplayServer
+
+
+def _ReadAll( output ):
+  stream = BytesIO( output.getvalue() )
+  messages = []
+  while True:
+    message = ReadMessage( stream )
+    if message is None:
+      return messages
+    messages.append( message )
+
+
+def ReplayServer_RepliesInRecordedOrder_test():
+  entries = [
+    { 'time': 0.0, 'sender': 'client',
+      'message': { 'id': 1, 'method': 'initialize' } },
+    { 'time': 0.1, 'sender': 'server',
+      'message': { 'id': 1, 'result': { 'capabilities': {} } } },
+    { 'time': 0.2, 'sender': 'client',
+      'message': { 'method': 'textDocument/didOpen' } },
+    { 'time': 0.3, 'sender': 'server',
+      'message': { 'method': 'textDocument/publishDiagnostics' } },
+  ]
+  output = BytesIO()
+  server = ReplayServer( entries, 0, output )
+
+  server.MessageReceived( { 'id': 7, 'method': 'initialize' } )
+  server.MessageReceived( { 'method': 'textDocument/didOpen' } )
+  server.MessageReceived( { 'id': 8, 'method': 'shutdown' } )
+
+  assert_that( _ReadAll( output ), contains(
+    has_entries( { 'id': 7, 'result': { 'capabilities': {} } } ),
+    has_entries( { 'method': 'textDocument/publishDiagnostics' } ),
+    # Not in the recording.
+    has_entries( { 'id': 8, 'result': None } )
+  ) )
@@ -61,6 +61,10 @@ def DebugInfo_RlsVersion_test( app ):
             'key': 'Settings',
             'value': '{}'
           } ),
+          has_entries( {
+            'key': 'Requests',
+            'value': instance_of( str ),
+          } ),
           has_entries( {
             'key': 'Project State',
             'value': instance_of( str )
@@ -107,6 +111,10 @@ def DebugInfo_NoRlsVersion_test( app, *args ):
             'key': 'Settings',
             'value': '{}'
           } ),
+          has_entries( {
+            'key': 'Requests',
+            'value': instance_of( str ),
+          } ),
           has_entries( {
             'key': 'Project State',
             'value': instance_of( str )